@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Benchmark bvh parsers                        ##
+    ##################################################
+
+    Compares the former line by line parse of bvh_importer._read_bvh (Maya calls left out)
+    with the two-phase read_bvh from bvh_parser.py.
+    Runs without Maya. A synthetic bvh is written if none is given.
+
+    Usage:
+    python bench_bvh_parser.py
+    python bench_bvh_parser.py -i <your_bvh_file>.bvh
+    python bench_bvh_parser.py -j 60 -f 100000
+'''
+
+
+## INIT
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from bvh_parser import read_bvh
+
+
+## FUNCTIONS
+def write_synthetic_bvh(bvh_path, nb_joints=60, nb_frames=20000, frame_time=1/120.):
+    '''
+    Write a random bvh file: a root with 4 chains of joints, each ending with an End Site
+    '''
+    lines = ['HIERARCHY', 'ROOT Hips', '{', '\tOFFSET 0.00 0.00 0.00',
+             '\tCHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation']
+    nb_chains = 4
+    for c in range(nb_chains):
+        length = (nb_joints-1) // nb_chains + (1 if c < (nb_joints-1) % nb_chains else 0)
+        for d in range(length):
+            tab = '\t' * (d+1)
+            lines += [tab + 'JOINT Chain%d_%d' % (c, d), tab + '{', tab + '\tOFFSET %.2f %.2f 0.00' % (c-1.5, 10.),
+                      tab + '\tCHANNELS 3 Zrotation Xrotation Yrotation']
+        tab = '\t' * (length+1)
+        lines += [tab + 'End Site', tab + '{', tab + '\tOFFSET 0.00 5.00 0.00', tab + '}']
+        lines += ['\t' * (d+1) + '}' for d in reversed(range(length))]
+    lines += ['}', 'MOTION', 'Frames: %d' % nb_frames, 'Frame Time: %f' % frame_time]
+
+    nb_channels = 6 + 3*(nb_joints-1)
+    with open(bvh_path, 'w') as bvh_o:
+        bvh_o.write('\n'.join(lines) + '\n')
+        for f in range(0, nb_frames, 1000):
+            motion = np.random.uniform(-180, 180, (min(1000, nb_frames-f), nb_channels))
+            np.savetxt(bvh_o, motion, fmt='%.4f', delimiter=' ')
+
+
+def read_bvh_legacy(bvh_path):
+    '''
+    Text parsing of the former bvh_importer._read_bvh, without the Maya calls
+    '''
+    safeClose = False
+    motion = False
+    channels, offsets, rows = [], [], []
+    myParent = []
+    with open(bvh_path) as f:
+        f.readline()
+        for line in f:
+            line = line.replace("	"," ") # force spaces
+            if not motion:
+                if line.startswith("ROOT"):
+                    myParent += [line[5:].rstrip()]
+                if "JOINT" in line:
+                    myParent += [line.split(" ")[-1].rstrip()]
+                if "End Site" in line:
+                    safeClose = True
+                if "}" in line:
+                    if safeClose:
+                        safeClose = False
+                        continue
+                    myParent = myParent[:-1]
+                if "CHANNELS" in line:
+                    chan = line.strip().split(" ")
+                    for i in range(int(chan[1])):
+                        channels.append("%s.%s" % ('|'.join(myParent), chan[2 + i]))
+                if "OFFSET" in line:
+                    offset = line.strip().split(" ")
+                    offsets.append([float(offset[1]), float(offset[2]), float(offset[3])])
+                if "MOTION" in line:
+                    motion = True
+            else:
+                if "Frame" in line:
+                    continue
+                data = line.split(" ")
+                rows.append([float(data[x]) for x in range(0, len(channels))])
+    return channels, offsets, rows
+
+
+def timeit(func, *args, **kwargs):
+    '''
+    Best of n runs
+    '''
+    n = kwargs.pop('n', 3)
+    best = float('inf')
+    for _ in range(n):
+        t0 = time.perf_counter()
+        out = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def bench(bvh_path, n=3):
+    '''
+    Time both parsers and check results agree
+    '''
+    t_legacy, (channels, _, rows) = timeit(read_bvh_legacy, bvh_path, n=n)
+    t_np, clip = timeit(read_bvh, bvh_path, n=n)
+
+    assert len(channels) == clip.nb_channels
+    assert np.allclose(np.array(rows), clip.motion)
+
+    size = os.path.getsize(bvh_path) / 1e6
+    print('%s: %.1f MB, %d frames, %d joints, %d channels' % (os.path.basename(bvh_path), size, len(clip), len(clip.names), clip.nb_channels))
+    print('former line by line parse: %.3f s (%.1f MB/s)' % (t_legacy, size / t_legacy))
+    print('bvh_parser.read_bvh: %.3f s (%.1f MB/s)' % (t_np, size / t_np))
+    print('parse speed-up: x%.1f' % (t_legacy / t_np))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=False, help='bvh input file name (synthetic if not provided)')
+    parser.add_argument('-j', '--joints', type=int, default=60, help='number of joints of the synthetic bvh')
+    parser.add_argument('-f', '--frames', type=int, default=20000, help='number of frames of the synthetic bvh')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='number of runs per parser')
+    args = vars(parser.parse_args())
+
+    if args['input'] is None:
+        bvh_path = os.path.join(tempfile.mkdtemp(), 'synthetic.bvh')
+        write_synthetic_bvh(bvh_path, args['joints'], args['frames'])
+        bench(bvh_path, args['repeat'])
+        os.remove(bvh_path)
+    else:
+        bench(args['input'], args['repeat'])
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Benchmark c3d to trc conversion              ##
+    ##################################################
+    
+    Reports frames per second of the former c3d2trc_func 
+    (list of frames, per-frame concatenation and str formatting)
+    and of the current one (preallocated array, column mask, bulk formatted write).
+    A synthetic 1000 Hz c3d is written if none is given.
+    
+    Usage: 
+    python bench_c3d2trc.py
+    python bench_c3d2trc.py -i <your_c3d_file>.c3d
+    python bench_c3d2trc.py -m 60 -f 20000
+'''
+
+
+## INIT
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import c3d
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from c3d2trc import c3d2trc_func
+
+
+## FUNCTIONS
+def write_synthetic_c3d(c3d_path, nb_markers=60, nb_frames=20000, rate=1000):
+    '''
+    Write a random c3d file, with a few computed channels (angles, powers) to filter out
+    '''
+    labels = ['Marker%d' % m for m in range(nb_markers)] + ['LKneeAngles', 'RHipPower', 'LGRF']
+    writer = c3d.Writer(point_rate=rate)
+    pts = np.zeros((len(labels), 5), dtype=np.float32)
+    for _ in range(nb_frames):
+        pts[:, :3] = np.random.rand(len(labels), 3) * 1000
+        writer.add_frames([(pts.copy(), np.zeros((0, 0), dtype=np.float32))])
+    writer.set_point_labels(labels)
+    with open(c3d_path, 'wb') as f:
+        writer.write(f)
+
+
+def c3d2trc_legacy(c3d_path, trc_path):
+    '''
+    Former c3d2trc_func (data part)
+    '''
+    reader = c3d.Reader(open(c3d_path, 'rb'))
+    items_header = str(reader.header).split('\n')
+    items_header_list = [item.strip().split(': ') for item in items_header]
+    header_c3d = dict(zip([item[0] for item in items_header_list], [item[1] for item in items_header_list]))
+    labels = reader.point_labels
+    index_labels_markers = [i for i, s in enumerate(labels) if 'Angle' not in s and 'Power' not in s and 'Force' not in s and 'Moment' not in s and 'GRF' not in s]
+    with open(trc_path, 'w') as trc_o:
+        index_data_markers = np.sort(np.concatenate([np.array(index_labels_markers)*3, np.array(index_labels_markers)*3+1, np.array(index_labels_markers)*3+2]))
+        t0 = int(float(header_c3d['first_frame'])) / int(float(header_c3d['frame_rate']))
+        tf = int(float(header_c3d['last_frame'])) / int(float(header_c3d['frame_rate']))
+        trc_time = np.linspace(t0, tf, num=(int(header_c3d['last_frame']) - int(header_c3d['first_frame']) + 1))
+        for n, (i, points, _) in enumerate(list(reader.read_frames())):
+            c3d_line = np.concatenate([item[:3] for item in points])
+            c3d_line_markers = c3d_line[index_data_markers]
+            trc_line = '{i}\t{t}\t'.format(i=i, t=trc_time[n]) + '\t'.join(map(str,c3d_line_markers))
+            trc_o.write(trc_line+'\n')
+
+
+def bench(c3d_path, precision=6):
+    '''
+    Time both conversions
+    '''
+    out_dir = tempfile.mkdtemp()
+    with open(c3d_path, 'rb') as f:
+        reader = c3d.Reader(f)
+        nb_frames, nb_points = reader.last_frame - reader.first_frame + 1, reader.point_used
+    
+    t0 = time.perf_counter()
+    c3d2trc_legacy(c3d_path, os.path.join(out_dir, 'legacy.trc'))
+    t_legacy = time.perf_counter() - t0
+    
+    t0 = time.perf_counter()
+    c3d2trc_func({'input': c3d_path, 'output': os.path.join(out_dir, 'new.trc'), 'precision': precision})
+    t_new = time.perf_counter() - t0
+    
+    shutil.rmtree(out_dir)
+    print('%s: %d frames, %d points' % (os.path.basename(c3d_path), nb_frames, nb_points))
+    print('before: %.2f s, %.0f frames/s' % (t_legacy, nb_frames / t_legacy))
+    print('after: %.2f s, %.0f frames/s (x%.1f)' % (t_new, nb_frames / t_new, t_legacy / t_new))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=False, help='c3d input file name (synthetic if not provided)')
+    parser.add_argument('-m', '--markers', type=int, default=60, help='number of markers of the synthetic c3d')
+    parser.add_argument('-f', '--frames', type=int, default=20000, help='number of frames of the synthetic c3d')
+    parser.add_argument('-p', '--precision', type=int, default=6, help='number of decimals of coordinates')
+    args = vars(parser.parse_args())
+    
+    if args['input'] is None:
+        tmp_dir = tempfile.mkdtemp()
+        c3d_path = os.path.join(tmp_dir, 'synthetic.c3d')
+        write_synthetic_c3d(c3d_path, args['markers'], args['frames'])
+        bench(c3d_path, args['precision'])
+        shutil.rmtree(tmp_dir)
+    else:
+        bench(args['input'], args['precision'])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Benchmark levels of detail of obj sequences  ##
+    ##################################################
+
+    Times make_lods from mesh_lod.py on an obj sequence, and checks that each level keeps
+    the same topology over all frames of a constant topology sequence, across task chunks.
+    Runs without Maya. A synthetic sequence of a deforming grid is written if no sequence is given.
+
+    Usage:
+    python bench_mesh_lod.py
+    python bench_mesh_lod.py -i <folder>/model_%05d.obj -j 8
+    python bench_mesh_lod.py -v 200000 -n 40 -c 4
+'''
+
+
+## INIT
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from obj_parser import read_obj
+from mesh_lod import make_lods
+from mesh_sequence import sequence_format, sequence_files, open_sequence
+
+
+## FUNCTIONS
+def write_synthetic_sequence(folder, nb_frames=20, nb_vertices=50000):
+    '''
+    Write a triangulated grid of about nb_vertices vertices with one uv per vertex, waving over nb_frames frames
+    Returns the sequence format
+    '''
+    side = int(np.sqrt(nb_vertices))
+    u, v = np.meshgrid(np.linspace(0, 1, side), np.linspace(0, 1, side))
+    uvs = np.column_stack([u.ravel(), v.ravel()])
+    ids = np.arange(side*side).reshape(side, side) + 1
+    a, b, c, d = ids[:-1, :-1].ravel(), ids[:-1, 1:].ravel(), ids[1:, 1:].ravel(), ids[1:, :-1].ravel()
+    triangles = np.concatenate([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+    fname_format = os.path.join(folder, 'model_%05d.obj')
+    for f in range(nb_frames):
+        z = 0.1 * np.sin(2*np.pi * (u.ravel() + f / nb_frames))
+        with open(fname_format % f, 'w') as obj_o:
+            np.savetxt(obj_o, np.column_stack([u.ravel(), v.ravel(), z]), fmt='v %.6f %.6f %.6f')
+            np.savetxt(obj_o, uvs, fmt='vt %.6f %.6f')
+            np.savetxt(obj_o, np.repeat(triangles, 2, axis=1), fmt='f %d/%d %d/%d %d/%d')
+    return fname_format
+
+
+def bench(fname_format, jobs=None, chunk_size=10):
+    '''
+    Time make_lods (obj files and container), and check topology stability of the levels
+    '''
+    fname_format = sequence_format(fname_format)
+    obj_files = sequence_files(fname_format)
+    source_keys = set(read_obj(obj_path).topology_key() for _, obj_path in obj_files)
+
+    t0 = time.perf_counter()
+    lod_formats = make_lods(fname_format, jobs=jobs, chunk_size=chunk_size)
+    t_obj = time.perf_counter() - t0
+    out_path = os.path.join(tempfile.mkdtemp(), 'lod.objseq')
+    t0 = time.perf_counter()
+    make_lods(fname_format, jobs=jobs, pack=True, out_path=out_path, chunk_size=chunk_size)
+    t_pack = time.perf_counter() - t0
+
+    sequence = open_sequence(out_path)
+    for level, lod_format in enumerate(lod_formats, 1):
+        lod_keys = set(read_obj(lod_format % frame).topology_key() for frame, _ in obj_files)
+        packed_keys = set(sequence.frame(frame, level).topology_key() for frame, _ in obj_files)
+        assert len(lod_keys) == len(packed_keys) == len(source_keys)
+        meshes = [read_obj(lod_format % frame) for frame, _ in obj_files[:1]]
+        print('level %d: %s, %d topologies' % (level, meshes[0], len(lod_keys)))
+        for frame, _ in obj_files:
+            os.remove(lod_format % frame)
+    shutil.rmtree(os.path.dirname(out_path))
+
+    print('%d frames, %d source topologies, chunks of %d frames' % (len(obj_files), len(source_keys), chunk_size))
+    print('mesh_lod.make_lods obj files: %.2f s (%.1f frames/s)' % (t_obj, len(obj_files) / t_obj))
+    print('mesh_lod.make_lods container: %.2f s (%.1f frames/s)' % (t_pack, len(obj_files) / t_pack))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=False, help='obj sequence: format (e.g. model_%%05d.obj) or any of its files (synthetic if not provided)')
+    parser.add_argument('-v', '--vertices', type=int, default=50000, help='number of vertices of the synthetic frames')
+    parser.add_argument('-n', '--frames', type=int, default=20, help='number of synthetic frames')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-c', '--chunk', type=int, default=3, help='frames per task (small to test several chunks)')
+    args = vars(parser.parse_args())
+
+    if args['input'] is None:
+        folder = tempfile.mkdtemp()
+        bench(write_synthetic_sequence(folder, args['frames'], args['vertices']), args['jobs'], args['chunk'])
+        shutil.rmtree(folder)
+    else:
+        bench(args['input'], args['jobs'], args['chunk'])
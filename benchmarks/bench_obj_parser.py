@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Benchmark obj parsers                        ##
+    ##################################################
+
+    Compares the former line by line parse of objStreamNode.compute (Maya calls left out)
+    with read_obj from obj_parser.py.
+    Runs without Maya. A synthetic triangulated grid with uvs is written if no obj is given
+    (the former parse only reads v/vt triangles).
+
+    Usage:
+    python bench_obj_parser.py
+    python bench_obj_parser.py -i <your_obj_file>.obj
+    python bench_obj_parser.py -v 200000
+'''
+
+
+## INIT
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from obj_parser import read_obj
+
+
+## FUNCTIONS
+def write_synthetic_obj(obj_path, nb_vertices=200000):
+    '''
+    Write a noisy triangulated grid of about nb_vertices vertices, with one uv per vertex
+    '''
+    side = int(np.sqrt(nb_vertices))
+    u, v = np.meshgrid(np.linspace(0, 1, side), np.linspace(0, 1, side))
+    positions = np.column_stack([u.ravel(), v.ravel(), np.random.rand(side*side)*0.01])
+    uvs = np.column_stack([u.ravel(), v.ravel()])
+    ids = np.arange(side*side).reshape(side, side) + 1
+    a, b, c, d = ids[:-1, :-1].ravel(), ids[:-1, 1:].ravel(), ids[1:, 1:].ravel(), ids[1:, :-1].ravel()
+    triangles = np.concatenate([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+    with open(obj_path, 'w') as obj_o:
+        np.savetxt(obj_o, positions, fmt='v %.6f %.6f %.6f')
+        np.savetxt(obj_o, uvs, fmt='vt %.6f %.6f')
+        np.savetxt(obj_o, np.repeat(triangles, 2, axis=1), fmt='f %d/%d %d/%d %d/%d')
+
+
+def read_obj_legacy(fname):
+    '''
+    Text parsing of the former objStreamNode.compute, without the Maya calls
+    '''
+    pts = []
+    uvs = []
+    ptsIds = []
+    uvsIds = []
+    pcount = []
+    lines = [ line for line in open(fname) ]
+    for line in lines :
+        if line[:2]=='v ' :
+            pts += [ list(map(float, line[2:].split())) ]
+        if line[:3]=='vt ' :
+            uvs += [ list(map(float, line[3:].split())) ]
+        elif line[:2]=='f ' :
+            ids = [ list(map(int,tok.split('/'))) for tok in line[2:].split() ]
+            [va,ta],[vb,tb],[vc,tc] = ids
+            ptsIds += va,vb,vc
+            uvsIds += ta,tb,tc
+            pcount += [ 3 ]
+    return pts, uvs, np.array(ptsIds)-1, np.array(uvsIds)-1, pcount
+
+
+def timeit(func, *args, **kwargs):
+    '''
+    Best of n runs
+    '''
+    n = kwargs.pop('n', 3)
+    best = float('inf')
+    for _ in range(n):
+        t0 = time.perf_counter()
+        out = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def bench(obj_path, n=3):
+    '''
+    Time both parsers and check results agree
+    '''
+    t_legacy, (pts, uvs, ptsIds, uvsIds, pcount) = timeit(read_obj_legacy, obj_path, n=n)
+    t_np, mesh = timeit(read_obj, obj_path, n=n)
+
+    assert np.allclose(np.array(pts, dtype=np.float32), mesh.positions)
+    assert np.allclose(np.array(uvs, dtype=np.float32), mesh.uvs)
+    assert np.array_equal(ptsIds, mesh.vertex_ids) and np.array_equal(uvsIds, mesh.uv_ids)
+    assert np.array_equal(pcount, mesh.face_counts)
+
+    size = os.path.getsize(obj_path) / 1e6
+    print('%s: %.1f MB, %d vertices, %d faces' % (os.path.basename(obj_path), size, mesh.nb_vertices, mesh.nb_faces))
+    print('former line by line parse: %.3f s (%.1f MB/s)' % (t_legacy, size / t_legacy))
+    print('obj_parser.read_obj: %.3f s (%.1f MB/s)' % (t_np, size / t_np))
+    print('parse speed-up: x%.1f' % (t_legacy / t_np))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=False, help='obj input file name, with v/vt triangles (synthetic if not provided)')
+    parser.add_argument('-v', '--vertices', type=int, default=200000, help='number of vertices of the synthetic obj')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='number of runs per parser')
+    args = vars(parser.parse_args())
+
+    if args['input'] is None:
+        obj_path = os.path.join(tempfile.mkdtemp(), 'synthetic.obj')
+        write_synthetic_obj(obj_path, args['vertices'])
+        bench(obj_path, args['repeat'])
+        os.remove(obj_path)
+    else:
+        bench(args['input'], args['repeat'])
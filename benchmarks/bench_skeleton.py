@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Benchmark skeleton joint trajectories        ##
+    ##################################################
+    
+    Compares the former per-frame joint lookups of set_skeleton 
+    (re.sub + data.loc for each joint on each frame)
+    with the index tables of motion_clip.skeleton_index and joint_coords.
+    Only the data preparation is timed: Maya commands are left aside.
+    
+    Usage: 
+    python bench_skeleton.py
+    python bench_skeleton.py -f 30000 -s body_25b body_25
+'''
+
+
+## INIT
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import skeletons_config
+from anytree import PreOrderIter
+from motion_clip import MotionClip, skeleton_index, joint_coords
+
+
+## FUNCTIONS
+def synthetic_clip(root, nb_frames):
+    '''
+    Random clip with one marker per joint (except root)
+    '''
+    labels = [node.name[:-1] for node in PreOrderIter(root) if node is not root]
+    points = np.random.rand(nb_frames, len(labels), 3)
+    frames = np.arange(1, nb_frames+1)
+    return MotionClip(points, frames, frames/60., labels, {'DataRate': 60})
+
+
+def coords_legacy(data, root, jointsJ, rangeFrames):
+    '''
+    Former set_skeleton loop, without the Maya calls
+    '''
+    coords = np.empty((len(rangeFrames), len(jointsJ), 3))
+    firstFrame = rangeFrames[0]
+    for i in rangeFrames:
+        for j in range(len(jointsJ)):
+            if j == 0 and not root.name[:-1] in data.columns:
+                RHip, LHip = root.children[0].name[:-1], root.children[1].name[:-1]
+                jointCoordX = np.add(data.loc[i-firstFrame,RHip+'_Z'], data.loc[i-firstFrame,LHip+'_Z']) / 2
+                jointCoordY = np.add(data.loc[i-firstFrame,RHip+'_X'], data.loc[i-firstFrame,LHip+'_X']) / 2
+                jointCoordZ = np.add(data.loc[i-firstFrame,RHip+'_Y'], data.loc[i-firstFrame,LHip+'_Y']) / 2
+            else:
+                jnt =  re.sub(r'[0-9]', '', jointsJ[j])[:-1]
+                jointCoordX = data.loc[i-firstFrame,jnt+'_Z']
+                jointCoordY = data.loc[i-firstFrame,jnt+'_X']
+                jointCoordZ = data.loc[i-firstFrame,jnt+'_Y']
+            coords[i-firstFrame, j] = jointCoordX, jointCoordY, jointCoordZ
+    return coords
+
+
+def coords_indexed(clip, root, rangeFrames):
+    '''
+    New set_skeleton preparation
+    '''
+    _, _, index = skeleton_index(root, clip.labels)
+    return joint_coords(clip.points[:len(rangeFrames)], index)[:, :, [2, 0, 1]]
+
+
+def bench(skel, nb_frames):
+    '''
+    Time both paths on one skeleton and check they agree
+    '''
+    root = getattr(skeletons_config, 'root_'+skel)
+    clip = synthetic_clip(root, nb_frames)
+    rangeFrames = range(clip.frames[0], clip.frames[-1]+1)
+    jointsJ = [node.name+'1' for node in PreOrderIter(root)]
+    data = clip.to_dataframe()
+    
+    t0 = time.perf_counter()
+    legacy = coords_legacy(data, root, jointsJ, rangeFrames)
+    t_legacy = time.perf_counter() - t0
+    
+    t0 = time.perf_counter()
+    indexed = coords_indexed(clip, root, rangeFrames)
+    t_indexed = time.perf_counter() - t0
+    
+    assert np.allclose(legacy, indexed, atol=1e-6)
+    print('%s (%d joints, %d frames): per-frame lookups %.2f s, index tables %.4f s (x%.0f)' 
+        % (skel, len(jointsJ), nb_frames, t_legacy, t_indexed, t_legacy / t_indexed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--frames', type=int, default=10000, help='number of frames of the synthetic trial')
+    parser.add_argument('-s', '--skeletons', nargs='+', default=['body_25b', 'body_25'], help='skeletons from skeletons_config.py')
+    args = vars(parser.parse_args())
+    
+    for skel in args['skeletons']:
+        bench(skel, args['frames'])
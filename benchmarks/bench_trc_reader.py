@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Benchmark trc readers                        ##
+    ##################################################
+    
+    Compares the former pandas parse of df_from_trc (3 passes) 
+    with the single-pass read_trc from motion_clip.py.
+    Runs without Maya. A synthetic trc is written if none is given.
+    
+    Usage: 
+    python bench_trc_reader.py
+    python bench_trc_reader.py -i <your_trc_file>.trc
+    python bench_trc_reader.py -m 135 -f 30000
+'''
+
+
+## INIT
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+import pandas as pd
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from motion_clip import read_trc
+
+
+## FUNCTIONS
+def write_synthetic_trc(trc_path, nb_markers=135, nb_frames=30000, rate=60):
+    '''
+    Write a random trc file
+    '''
+    labels = ['Marker%d' % m for m in range(nb_markers)]
+    with open(trc_path, 'w') as trc_o:
+        trc_o.write('PathFileType\t4\t(X/Y/Z)\t' + trc_path + '\n')
+        trc_o.write('DataRate\tCameraRate\tNumFrames\tNumMarkers\tUnits\tOrigDataRate\tOrigDataStartFrame\tOrigNumFrames\n')
+        trc_o.write('\t'.join(map(str, [rate, rate, nb_frames, nb_markers, 'm', rate, 1, nb_frames])) + '\n')
+        trc_o.write('Frame#\tTime\t' + '\t\t\t'.join(labels) + '\t\t\t\n')
+        trc_o.write('\t\t' + '\t'.join(['X{i}\tY{i}\tZ{i}'.format(i=i+1) for i in range(nb_markers)]) + '\n')
+        data = np.random.rand(nb_frames, 3*nb_markers)
+        frames = np.arange(1, nb_frames+1)
+        body = np.column_stack([frames, frames/float(rate), data])
+        np.savetxt(trc_o, body, fmt=['%d', '%.6f'] + ['%.6f']*(3*nb_markers), delimiter='\t')
+
+
+def df_from_trc_pandas(trc_path):
+    '''
+    Former df_from_trc from maya_trc.py
+    '''
+    df_header = pd.read_csv(trc_path, sep="\t", skiprows=1, header=None, nrows=2, encoding="ISO-8859-1")
+    header = dict(zip(df_header.iloc[0].tolist(), df_header.iloc[1].tolist()))
+    
+    df_lab = pd.read_csv(trc_path, sep="\t", skiprows=3, nrows=1)
+    labels = df_lab.columns.tolist()[2:-1:3]
+    labels_XYZ = np.array([[labels[i]+'_X', labels[i]+'_Y', labels[i]+'_Z'] for i in range(len(labels))], dtype='object').flatten()
+    labels_FTXYZ = np.concatenate((['Frame#','Time'], labels_XYZ))
+    
+    data = pd.read_csv(trc_path, sep="\t", skiprows=5, index_col=False, header=None, names=labels_FTXYZ)
+    
+    return header, data
+
+
+def timeit(func, *args, **kwargs):
+    '''
+    Best of n runs
+    '''
+    n = kwargs.pop('n', 3)
+    best = float('inf')
+    for _ in range(n):
+        t0 = time.perf_counter()
+        out = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def read_cells_pandas(data, nb_frames):
+    '''
+    Per-cell access pattern of the former set_markers
+    '''
+    nb_markers = (data.shape[1]-2) // 3
+    for i in range(nb_frames):
+        for j in range(nb_markers):
+            data.iloc[i,3*j+2 +2], data.iloc[i,3*j +2], data.iloc[i,3*j+1 +2]
+
+
+def read_cells_clip(clip, nb_frames):
+    '''
+    Same access pattern on a MotionClip
+    '''
+    for i in range(nb_frames):
+        for j in range(len(clip.labels)):
+            clip.points[i,j,2], clip.points[i,j,0], clip.points[i,j,1]
+
+
+def bench(trc_path, n=3):
+    '''
+    Time both readers, compare memory footprints and check results agree
+    '''
+    t_pd, (_, data) = timeit(df_from_trc_pandas, trc_path, n=n)
+    t_np, clip = timeit(read_trc, trc_path, n=n)
+    
+    assert np.allclose(data.values[:, 2:].astype(float), clip.points.reshape(len(clip), -1), atol=1e-5, equal_nan=True)
+    
+    print('%s: %d frames, %d markers' % (os.path.basename(trc_path), len(clip), len(clip.labels)))
+    print('pandas df_from_trc: %.3f s, %.1f MB' % (t_pd, data.memory_usage(deep=True).sum() / 1e6))
+    print('motion_clip.read_trc: %.3f s, %.1f MB' % (t_np, clip.points.nbytes / 1e6))
+    print('parse speed-up: x%.1f' % (t_pd / t_np))
+    
+    nb_frames = min(len(clip), 200)
+    t_pd, _ = timeit(read_cells_pandas, data, nb_frames, n=1)
+    t_np, _ = timeit(read_cells_clip, clip, nb_frames, n=1)
+    print('cell access over %d frames: pandas %.3f s, motion_clip %.3f s (x%.1f)' % (nb_frames, t_pd, t_np, t_pd / t_np))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=False, help='trc input file name (synthetic if not provided)')
+    parser.add_argument('-m', '--markers', type=int, default=135, help='number of markers of the synthetic trc')
+    parser.add_argument('-f', '--frames', type=int, default=30000, help='number of frames of the synthetic trc')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='number of runs per reader')
+    args = vars(parser.parse_args())
+    
+    if args['input'] is None:
+        trc_path = os.path.join(tempfile.mkdtemp(), 'synthetic.trc')
+        write_synthetic_trc(trc_path, args['markers'], args['frames'])
+        bench(trc_path, args['repeat'])
+        os.remove(trc_path)
+    else:
+        bench(args['input'], args['repeat'])
@@ -21,6 +21,26 @@
     cmds.setAttr(n+'.fname',fname,type='string')
     cmds.connectAttr('time1.outTime', n+'.index')
     cmds.connectAttr(n+'.outMesh', outm+'.inMesh')
+    
+    Parsed frames are kept in memory (see scripts/mesh_cache.py), up to .cacheSize MB
+    shared by all nodes (default -1: MAYA_MOCAP_MESH_CACHE_SIZE environment variable, or 2048).
+    mesh_cache.cache_info() gives hit and miss counts.
+    The next .prefetchWindow frames (previous ones when playing backward) are read ahead
+    by .prefetchThreads worker threads (see scripts/mesh_prefetch.py).
+    .fname can also be an .objseq container packed by scripts/mesh_sequence.py, which is memory-mapped.
+    When consecutive frames share the same faces, only vertex positions (and uvs) are updated:
+    .rebuildCount and .pointUpdateCount report how many frames were rebuilt or only updated.
+    The file frame is .index * .frameStride + .frameOffset, brought between .startFrame and .endFrame
+    according to .rangeMode (none, clamp, loop, pingPong). With .holdFrame, missing frames show the last
+    available one. Sequence folders are listed once (mesh_sequence.clear_listings() to list them again).
+    .lod streams a decimated level of detail made by scripts/mesh_lod.py (0: full resolution).
+    Renders use .renderLod instead (default 0), in batch mode with any renderer, and in the session with
+    Maya Software only (nodes are evaluated again before and after its renders). Other renderers started
+    from the session (Arnold, etc.) are not detected: use a render setup override of .lod for them.
+    Missing levels fall back to finer ones.
+    The node is evaluated in parallel by the evaluation manager (one stream per core) and supports
+    cached playback: shared caches are thread-safe, and the state kept between frames is locked per node.
+    Frames are only prefetched during normal (foreground) evaluation.
 '''
 
 
@@ -28,8 +48,17 @@
 import maya.cmds as cmds
 import sys
 import os
+import threading
 import maya.api.OpenMaya as om
-import numpy as np
+import maya.OpenMayaRender as omr1 # MRenderUtil.mayaRenderState is only in API 1.0
+try:
+    import mesh_cache
+except ImportError: # scripts folder not in PYTHONPATH
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+    import mesh_cache
+import mesh_prefetch
+import mesh_sequence
+from obj_parser import ObjMesh
 
 ## AUTHORSHIP INFORMATION
 __author__ = "Lionel Reveret"
@@ -49,6 +78,53 @@ def maya_useNewAPI():
     """
     pass
 
+def mesh_data(mesh, previous=None):
+    """
+    MFnMeshData holding an ObjMesh (empty mesh data if it has no vertex)
+    Arrays are handed to the Maya arrays as whole lists, without Python loops
+    previous: state returned for the previous frame. If the topology did not change,
+              its connectivity and uv assignment are copied and only points (and changed uvs) are set
+    Returns the mesh data, the state to pass for the next frame, and True if the mesh was rebuilt
+    """
+    dataCreator = om.MFnMeshData()
+    newOutputData = dataCreator.create()
+    if mesh.nb_vertices == 0:
+        return newOutputData, None, True
+
+    pts = om.MFloatPointArray(mesh.positions.tolist())
+    topology = mesh.topology_key()
+    uvsKey = mesh.uvs_key() if mesh.uv_ids is not None else None
+    if previous is not None and previous[0] == topology:
+        # SAME TOPOLOGY: POINT-ONLY UPDATE
+        newMesh = om.MFnMesh().copy(previous[3], newOutputData)
+        meshFn = om.MFnMesh(newMesh)
+        meshFn.setPoints(pts)
+        if uvsKey != previous[1]:
+            meshFn.setUVs(om.MFloatArray(mesh.uvs[:, 0].tolist()), om.MFloatArray(mesh.uvs[:, 1].tolist()))
+        return newOutputData, (topology, uvsKey, newOutputData, newMesh), False
+
+    pcount = om.MIntArray(mesh.face_counts.tolist())
+    ptsIds = om.MIntArray(mesh.vertex_ids.tolist())
+    meshFn = om.MFnMesh()
+    if mesh.uv_ids is not None:
+        uValues = om.MFloatArray(mesh.uvs[:, 0].tolist())
+        vValues = om.MFloatArray(mesh.uvs[:, 1].tolist())
+        newMesh = meshFn.create(pts, pcount, ptsIds, uValues=uValues, vValues=vValues, parent=newOutputData)
+        meshFn.assignUVs(pcount, om.MIntArray(mesh.uv_ids.tolist()))
+    else:
+        newMesh = meshFn.create(pts, pcount, ptsIds, parent=newOutputData)
+    return newOutputData, (topology, uvsKey, newOutputData, newMesh), True
+
+def copy_mesh_data(state):
+    """
+    New MFnMeshData holding a copy of the mesh of a state returned by mesh_data
+    Outputs never share their mesh data, e.g. with the cached playback copies of a held frame
+    """
+    newOutputData = om.MFnMeshData().create()
+    om.MFnMesh().copy(state[3], newOutputData)
+    return newOutputData
+
+
 #
 # MAIN CLASS DECLARATION FOR THE CUSTOM NODE:
 #
@@ -57,9 +133,63 @@ class objStreamNode(om.MPxNode):
     aOutMesh = None
     aIndex = None
     aFname = None
+    aCacheSize = None
+    aPrefetchWindow = None
+    aPrefetchThreads = None
+    aRebuildCount = None
+    aPointUpdateCount = None
+    aFrameOffset = None
+    aFrameStride = None
+    aStartFrame = None
+    aEndFrame = None
+    aRangeMode = None
+    aHoldFrame = None
+    aLod = None
+    aRenderLod = None
     
     def __init__(self):
         om.MPxNode.__init__(self)
+        self._lastIndex = None # playback direction for prefetching
+        self._previous = None # topology of the last mesh, see mesh_data
+        self._counts = [0, 0] # rebuilds, point-only updates
+        self._lastFrame = None # (fname, file frame, lod) of the last mesh
+        self._lock = threading.Lock() # guards the state above, evaluations may run in other threads
+        # THE STATE ABOVE ONLY FOLLOWS NORMAL (FOREGROUND) EVALUATIONS, BACKGROUND ONES ONLY READ IT
+        self._owner = None # node UUID owning the read-ahead window in mesh_prefetch
+        self._callbacks = []
+
+    # THE READ-AHEAD WINDOW OF THE NODE IS RELEASED WHEN IT IS DELETED
+    def postConstructor(self):
+        self._callbacks.append(om.MNodeMessage.addNodePreRemovalCallback(self.thisMObject(), self._release))
+
+    def __del__(self):
+        self._release()
+        if self._callbacks:
+            om.MMessage.removeCallbacks(self._callbacks)
+
+    def _release(self, *args):
+        with self._lock:
+            owner, self._owner = self._owner, None
+        if owner is not None:
+            mesh_prefetch.release(owner)
+
+    def _prefetchOwner(self):
+        # NODE UUID (STABLE FOR THE SESSION, UNLIKE id(self)), THE FORMER ONE IS RELEASED IF IT CHANGED ON FILE LOAD
+        owner = om.MFnDependencyNode(self.thisMObject()).uuid().asString()
+        with self._lock:
+            former, self._owner = self._owner, owner
+        if former is not None and former != owner:
+            mesh_prefetch.release(former)
+        return owner
+
+    # ONLY LOCKED NODE STATE AND THREAD-SAFE CACHES: EVALUATED CONCURRENTLY WITH OTHER NODES
+    def schedulingType(self):
+        return om.MPxNode.kParallel
+
+    # CACHED PLAYBACK: OUTPUT MESHES ARE CACHED BY DEFAULT
+    def getCacheSetup(self, evalNode, disablingInfo, cacheSetupInfo, monitoredAttributes):
+        om.MPxNode.getCacheSetup(self, evalNode, disablingInfo, cacheSetupInfo, monitoredAttributes)
+        cacheSetupInfo.setPreference(om.MCacheSetupInfo.kWantToCacheByDefault, True)
 
     # FOR CREATING AN INSTANCE OF THIS NODE:
     @staticmethod
@@ -94,9 +224,111 @@ class objStreamNode(om.MPxNode):
         objStreamNode.aFname = fnameAttrFn.create("fname", "f", om.MFnData.kString, defaultText)
         om.MPxNode.addAttribute(objStreamNode.aFname)
 
+        # CREATE AND ADD ".cacheSize" ATTRIBUTE (MB, SHARED BY ALL NODES, NEGATIVE: ENVIRONMENT VARIABLE):
+        cacheSizeAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aCacheSize = cacheSizeAttrFn.create("cacheSize", "cs", om.MFnNumericData.kFloat, -1.0)
+        cacheSizeAttrFn.storable = True
+        cacheSizeAttrFn.keyable = False
+        om.MPxNode.addAttribute(objStreamNode.aCacheSize)
+
+        # CREATE AND ADD ".prefetchWindow" AND ".prefetchThreads" ATTRIBUTES:
+        prefetchWindowAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aPrefetchWindow = prefetchWindowAttrFn.create("prefetchWindow", "pw", om.MFnNumericData.kInt, 8)
+        prefetchWindowAttrFn.storable = True
+        prefetchWindowAttrFn.keyable = False
+        prefetchWindowAttrFn.setMin(0)
+        om.MPxNode.addAttribute(objStreamNode.aPrefetchWindow)
+
+        prefetchThreadsAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aPrefetchThreads = prefetchThreadsAttrFn.create("prefetchThreads", "pt", om.MFnNumericData.kInt, 2)
+        prefetchThreadsAttrFn.storable = True
+        prefetchThreadsAttrFn.keyable = False
+        prefetchThreadsAttrFn.setMin(0)
+        om.MPxNode.addAttribute(objStreamNode.aPrefetchThreads)
+
+        # CREATE AND ADD FRAME REMAPPING ATTRIBUTES: FRAME = INDEX * STRIDE + OFFSET, THEN BROUGHT BETWEEN START AND END
+        frameOffsetAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aFrameOffset = frameOffsetAttrFn.create("frameOffset", "fo", om.MFnNumericData.kInt, 0)
+        frameOffsetAttrFn.storable = True
+        frameOffsetAttrFn.keyable = True
+        om.MPxNode.addAttribute(objStreamNode.aFrameOffset)
+
+        frameStrideAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aFrameStride = frameStrideAttrFn.create("frameStride", "fs", om.MFnNumericData.kInt, 1)
+        frameStrideAttrFn.storable = True
+        frameStrideAttrFn.keyable = True
+        frameStrideAttrFn.setMin(1)
+        om.MPxNode.addAttribute(objStreamNode.aFrameStride)
+
+        startFrameAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aStartFrame = startFrameAttrFn.create("startFrame", "sf", om.MFnNumericData.kInt, 0)
+        startFrameAttrFn.storable = True
+        startFrameAttrFn.keyable = True
+        om.MPxNode.addAttribute(objStreamNode.aStartFrame)
+
+        # END < START: FIRST AND LAST FILES OF THE SEQUENCE
+        endFrameAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aEndFrame = endFrameAttrFn.create("endFrame", "ef", om.MFnNumericData.kInt, -1)
+        endFrameAttrFn.storable = True
+        endFrameAttrFn.keyable = True
+        om.MPxNode.addAttribute(objStreamNode.aEndFrame)
+
+        rangeModeAttrFn = om.MFnEnumAttribute()
+        objStreamNode.aRangeMode = rangeModeAttrFn.create("rangeMode", "rm", 0)
+        for i, mode in enumerate(mesh_sequence.RANGE_MODES):
+            rangeModeAttrFn.addField(mode, i)
+        rangeModeAttrFn.storable = True
+        rangeModeAttrFn.keyable = True
+        om.MPxNode.addAttribute(objStreamNode.aRangeMode)
+
+        # MISSING FRAMES SHOW THE LAST AVAILABLE ONE BEFORE THEM
+        holdFrameAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aHoldFrame = holdFrameAttrFn.create("holdFrame", "hf", om.MFnNumericData.kBoolean, False)
+        holdFrameAttrFn.storable = True
+        holdFrameAttrFn.keyable = True
+        om.MPxNode.addAttribute(objStreamNode.aHoldFrame)
+
+        # CREATE AND ADD ".lod" ATTRIBUTE (0: FULL RESOLUTION, N: N-TH DECIMATED LEVEL OF scripts/mesh_lod.py):
+        lodAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aLod = lodAttrFn.create("lod", "lod", om.MFnNumericData.kInt, 0)
+        lodAttrFn.storable = True
+        lodAttrFn.keyable = True
+        lodAttrFn.setMin(0)
+        om.MPxNode.addAttribute(objStreamNode.aLod)
+
+        # CREATE AND ADD ".renderLod" ATTRIBUTE (LEVEL USED IN BATCH AND MAYA SOFTWARE RENDERS, FULL RESOLUTION BY DEFAULT):
+        renderLodAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aRenderLod = renderLodAttrFn.create("renderLod", "rlod", om.MFnNumericData.kInt, 0)
+        renderLodAttrFn.storable = True
+        renderLodAttrFn.keyable = False
+        renderLodAttrFn.setMin(0)
+        om.MPxNode.addAttribute(objStreamNode.aRenderLod)
+
+        # CREATE AND ADD ".rebuildCount" AND ".pointUpdateCount" DEBUG ATTRIBUTES (READ ONLY):
+        rebuildCountAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aRebuildCount = rebuildCountAttrFn.create("rebuildCount", "rc", om.MFnNumericData.kInt, 0)
+        rebuildCountAttrFn.storable = False
+        rebuildCountAttrFn.writable = False
+        om.MPxNode.addAttribute(objStreamNode.aRebuildCount)
+
+        pointUpdateCountAttrFn = om.MFnNumericAttribute()
+        objStreamNode.aPointUpdateCount = pointUpdateCountAttrFn.create("pointUpdateCount", "puc", om.MFnNumericData.kInt, 0)
+        pointUpdateCountAttrFn.storable = False
+        pointUpdateCountAttrFn.writable = False
+        om.MPxNode.addAttribute(objStreamNode.aPointUpdateCount)
+
         # DEPENDENCY RELATIONS FOR ".index":
         om.MPxNode.attributeAffects(objStreamNode.aIndex, objStreamNode.aOutMesh)
         om.MPxNode.attributeAffects(objStreamNode.aFname, objStreamNode.aOutMesh)
+        for inputAttr in (objStreamNode.aFrameOffset, objStreamNode.aFrameStride, objStreamNode.aStartFrame,
+                          objStreamNode.aEndFrame, objStreamNode.aRangeMode, objStreamNode.aHoldFrame, objStreamNode.aLod, objStreamNode.aRenderLod):
+            om.MPxNode.attributeAffects(inputAttr, objStreamNode.aOutMesh)
+        # COUNTERS FOLLOW THE MESH UPDATES: SAME INPUTS AS ".outMesh"
+        for countAttr in (objStreamNode.aRebuildCount, objStreamNode.aPointUpdateCount):
+            for inputAttr in (objStreamNode.aIndex, objStreamNode.aFname, objStreamNode.aFrameOffset, objStreamNode.aFrameStride,
+                              objStreamNode.aStartFrame, objStreamNode.aEndFrame, objStreamNode.aRangeMode,
+                              objStreamNode.aHoldFrame, objStreamNode.aLod, objStreamNode.aRenderLod):
+                om.MPxNode.attributeAffects(inputAttr, countAttr)
 
     # COMPUTE METHOD'S DEFINITION:
     def compute(self, plug, data):
@@ -113,69 +345,110 @@ class objStreamNode(om.MPxNode):
             indexDataHandle = data.inputValue(objStreamNode.aIndex)
             index = indexDataHandle.asInt()
 
-            fname = fname_format % index
-            nl = 0
-            pts = []
-            uvs = []
-            ptsIds = []
-            uvsIds = []
-            pcount = []
-            if os.path.isfile(fname) :
-                lines = [ line for line in open(fname) ]
-                nl = len(lines)
-                for line in lines :
-                    if line[:2]=='v ' :
-                        pts += [ list(map(float, line[2:].split())) ]
-                    if line[:3]=='vt ' :
-                        uvs += [ list(map(float, line[3:].split())) ]
-                    elif line[:2]=='f ' :
-                        ids = [ list(map(int,tok.split('/'))) for tok in line[2:].split() ]
-                        [va,ta],[vb,tb],[vc,tc] = ids
-                        ptsIds += va,vb,vc
-                        uvsIds += ta,tb,tc
-                        pcount += [ 3 ]
-            nv = len(pts)
-            nt = len(uvs)
-            npId = len(ptsIds)
-            print('fname=[%s] nl=%d nv=%d nt=%d npId=%d' % (fname, nl, nv, nt, npId))
-
-            dataCreator = om.MFnMeshData()
-            newOutputData = dataCreator.create()
-
-            if nv>0 :
-                ptsIds = np.array(ptsIds)-1
-                uvsIds = np.array(uvsIds)-1
-                uvs = np.array(uvs).T
-
-                pts = om.MFloatPointArray(pts)
-                uvs = [ om.MFloatArray(uvs[0]), om.MFloatArray(uvs[1]) ]
-                ptsIds = om.MIntArray(ptsIds)
-                uvsIds = om.MIntArray(uvsIds)
-                pcount = om.MIntArray(pcount)
-
-                if nv<100 :
-                    print('pts='),pts
-                    print('uvs='),uvs
-                    print('ptsIds='),ptsIds
-                    print('uvsIds='),uvsIds
-                    print('pcount='),pcount
-
-                meshFn = om.MFnMesh()
-                if nt>0 :
-                    newMesh = meshFn.create(pts, pcount, ptsIds, uValues=uvs[0], vValues=uvs[1], parent=newOutputData)
-                    meshFn.assignUVs(pcount, uvsIds)
-                else :
-                    newMesh = meshFn.create(pts, pcount, ptsIds, parent=newOutputData)
+            # BACKGROUND EVALUATION (CACHED PLAYBACK) HAS NO SIDE EFFECT ON THE SESSION OR PLAYBACK DIRECTION
+            foreground = data.context().isNormal()
+
+            # READ IN ".cacheSize" DATA:
+            cacheSize = data.inputValue(objStreamNode.aCacheSize).asFloat()
+            if foreground and cacheSize >= 0 and int(cacheSize * 1e6) != mesh_cache.cache_size_cap():
+                mesh_cache.set_cache_size(cacheSize)
+
+            # READ IN ".prefetchWindow" AND ".prefetchThreads" DATA:
+            prefetchWindow = data.inputValue(objStreamNode.aPrefetchWindow).asInt()
+            prefetchThreads = data.inputValue(objStreamNode.aPrefetchThreads).asInt()
+
+            # READ IN FRAME REMAPPING DATA:
+            remap = dict(offset=data.inputValue(objStreamNode.aFrameOffset).asInt(),
+                         stride=data.inputValue(objStreamNode.aFrameStride).asInt(),
+                         start=data.inputValue(objStreamNode.aStartFrame).asInt(),
+                         end=data.inputValue(objStreamNode.aEndFrame).asInt(),
+                         mode=mesh_sequence.RANGE_MODES[data.inputValue(objStreamNode.aRangeMode).asShort()],
+                         hold=data.inputValue(objStreamNode.aHoldFrame).asBool())
+
+            # READ IN ".lod" DATA (".renderLod" WHILE RENDERING):
+            lod = data.inputValue(objStreamNode.aRenderLod if rendering() else objStreamNode.aLod).asInt()
+            if lod > 0 and not mesh_sequence.is_sequence(fname_format):
+                # DECIMATED OBJ FILES BESIDE THE SOURCE: FINEST GENERATED LEVEL UP TO ".lod"
+                for level in range(lod, 0, -1):
+                    if mesh_sequence.available_frames(mesh_sequence.lod_format(fname_format, level)):
+                        fname_format = mesh_sequence.lod_format(fname_format, level)
+                        break
+                lod = 0
+
+            # FILE FRAME TO DISPLAY, CHECKED AGAINST A ONE-TIME LISTING OF THE SEQUENCE
+            frames = mesh_sequence.available_frames(fname_format)
+            frame = mesh_sequence.remap_frame(index, frames, **remap)
+
+            with self._lock:
+                previous = self._previous
+                held = frame is not None and (fname_format, frame, lod) == self._lastFrame and previous is not None
+            if held:
+                # SAME FILE AS THE LAST EVALUATION (HELD FRAME): NOTHING TO READ, ITS MESH IS COPIED
+                newOutputData = copy_mesh_data(previous)
+            else:
+                # READ OUTSIDE OF THE NODE LOCK (CACHES ARE THREAD-SAFE)
+                if frame is None:
+                    mesh = ObjMesh.empty()
+                elif mesh_sequence.is_sequence(fname_format):
+                    # PACKED SEQUENCE: MEMORY-MAPPED, NO PARSING
+                    mesh = mesh_sequence.open_sequence(fname_format).frame(frame, lod)
+                else:
+                    # ONLY BLOCKS IF THE FRAME WAS NOT PREFETCHED IN TIME:
+                    mesh = mesh_prefetch.get_mesh(fname_format % frame)
+                newOutputData, state, rebuilt = mesh_data(mesh, previous)
+                if foreground:
+                    with self._lock:
+                        self._previous = state
+                        self._counts[0 if rebuilt else 1] += 1
+                        self._lastFrame = (fname_format, frame, lod)
+
+            if foreground:
+                with self._lock:
+                    lastIndex, self._lastIndex = self._lastIndex, index
+                # READ-AHEAD WINDOW OF THIS NODE ONLY: OTHER NODES KEEP THEIRS
+                ahead = []
+                if not mesh_sequence.is_sequence(fname_format) and prefetchWindow > 0 and prefetchThreads > 0:
+                    ahead = [mesh_sequence.remap_frame(i, frames, **remap) for i in mesh_prefetch.window(index, lastIndex, prefetchWindow)]
+                    ahead = [f for i, f in enumerate(ahead) if f is not None and f != frame and f not in ahead[:i]]
+                mesh_prefetch.prefetch([fname_format % f for f in ahead], prefetchThreads, owner=self._prefetchOwner())
 
             # WRITE OUT ".position" DATA:
             outputHandle = data.outputValue(objStreamNode.aOutMesh)
             outputHandle.setMObject(newOutputData)
             data.setClean(plug)
 
+        elif plug == objStreamNode.aRebuildCount or plug == objStreamNode.aPointUpdateCount:
+            # DEBUG COUNTERS OF MESH UPDATES SINCE THE NODE WAS CREATED, ".outMesh" IS UPDATED FIRST
+            data.inputValue(objStreamNode.aOutMesh)
+            with self._lock:
+                count = self._counts[0 if plug == objStreamNode.aRebuildCount else 1]
+            data.outputValue(plug).setInt(count)
+            data.setClean(plug)
+
         else:
             return None # let Maya handle this attribute
 
 
+def rendering():
+    """
+    True in batch mode, or while Maya Software renders from the session (other renderers do not report it)
+    """
+    if om.MGlobal.mayaState() != om.MGlobal.kInteractive:
+        return True
+    return omr1.MRenderUtil.mayaRenderState() != omr1.MRenderUtil.kNotRendering
+
+
+def dirty_lod_nodes(*args):
+    """
+    Evaluate again the nodes whose .lod differs from their .renderLod (render callbacks)
+    """
+    nodes = [n for n in cmds.ls(type="objStreamNode") or [] if cmds.getAttr(n + ".lod") != cmds.getAttr(n + ".renderLod")]
+    if nodes:
+        cmds.dgdirty(nodes)
+
+_callbacks = []
+
+
 # INITIALIZES THE PLUGIN BY REGISTERING THE COMMAND AND NODE:
 #
 def initializePlugin(obj):
@@ -185,12 +458,20 @@ def initializePlugin(obj):
     except:
         sys.stderr.write("Failed to register node\n")
         raise
+    # MAYA SOFTWARE RENDERS STARTED FROM THE SESSION SWITCH NODES TO ".renderLod", THEN BACK TO ".lod"
+    for message in (om.MSceneMessage.kBeforeSoftwareRender, om.MSceneMessage.kAfterSoftwareRender,
+                    om.MSceneMessage.kSoftwareRenderInterrupted):
+        _callbacks.append(om.MSceneMessage.addCallback(message, dirty_lod_nodes))
 
 #
 # UNINITIALIZES THE PLUGIN BY DEREGISTERING THE COMMAND AND NODE:
 #
 def uninitializePlugin(obj):
     plugin = om.MFnPlugin(obj)
+    mesh_prefetch.shutdown()
+    if _callbacks:
+        om.MMessage.removeCallbacks(_callbacks)
+        del _callbacks[:]
     try:
         plugin.deregisterNode(objStreamNode.id)
     except:
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Chunked store of c3d analog channels         ##
+    ##################################################
+
+    Stores analog channels (force plates, EMG, etc) at their native rate,
+    in a folder of compressed chunks with one array per channel.
+    Independent from Maya.
+
+    Folder layout:
+    - meta.json: rate, number of samples, chunk size, and name, scale, offset and units of each channel
+    - chunk_00000.npz, chunk_00001.npz, ...: chunk_size samples of every channel, one compressed array per channel
+    Reading one channel only decompresses this channel.
+
+    Usage:
+    from analog_store import read_analog, analog_info
+    analog_info('<your_trial>.analog')
+    emg = read_analog('<your_trial>.analog', ['EMG1', 'EMG2'])
+'''
+
+
+## INIT
+import os
+import json
+import shutil
+import numpy as np
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+META_FILE = 'meta.json'
+ANALOG_CHUNK_SIZE = 100000 # samples per channel and per chunk file
+
+
+## CLASSES
+class AnalogWriter(object):
+    '''
+    Append analog samples and flush them to disk every chunk_size samples
+    Only one chunk is held in memory.
+    channels: list of dicts with at least a 'name' key (and scale, offset, units, etc)
+    rate: analog sample rate in Hz
+    '''
+    def __init__(self, store_path, channels, rate, chunk_size=ANALOG_CHUNK_SIZE, **meta):
+        self.store_path = store_path
+        self.channels = list(channels)
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.meta = meta
+        self.nb_samples = 0
+        self.nb_chunks = 0
+        self._buffer = np.empty((len(self.channels), chunk_size), dtype=np.float32)
+        self._filled = 0
+        if os.path.isdir(store_path):
+            shutil.rmtree(store_path)
+        os.makedirs(store_path)
+
+    def append(self, samples):
+        '''
+        Append (channels, samples) values, e.g. the analog block of one c3d frame
+        '''
+        samples = np.asarray(samples)
+        n = 0
+        while n < samples.shape[1]:
+            size = min(samples.shape[1] - n, self.chunk_size - self._filled)
+            self._buffer[:, self._filled:self._filled+size] = samples[:, n:n+size]
+            self._filled += size
+            n += size
+            if self._filled == self.chunk_size:
+                self._flush()
+
+    def _flush(self):
+        if self._filled == 0:
+            return
+        columns = dict(('c%d' % c, self._buffer[c, :self._filled]) for c in range(len(self.channels)))
+        np.savez_compressed(os.path.join(self.store_path, 'chunk_%05d.npz' % self.nb_chunks), **columns)
+        self.nb_samples += self._filled
+        self.nb_chunks += 1
+        self._filled = 0
+
+    def close(self):
+        '''
+        Write last chunk and metadata
+        '''
+        self._flush()
+        meta = dict(self.meta)
+        meta.update({'rate': self.rate, 'nb_samples': self.nb_samples, 'chunk_size': self.chunk_size,
+                     'nb_chunks': self.nb_chunks, 'channels': self.channels})
+        with open(os.path.join(self.store_path, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+## FUNCTIONS
+def analog_info(store_path):
+    '''
+    Metadata of an analog store: rate, nb_samples, channels (name, scale, offset, units), etc
+    '''
+    with open(os.path.join(store_path, META_FILE)) as f:
+        return json.load(f)
+
+
+def read_analog(store_path, channels=None, start=None, end=None):
+    '''
+    Read channels (names or indices, default all) of an analog store
+    Only samples start to end (excluded) are kept, and only the chunks they span are opened
+    Returns a dict of channel name: float32 array
+    '''
+    info = analog_info(store_path)
+    names = [c['name'] for c in info['channels']]
+    if channels is None:
+        channels = names
+    ids = [c if isinstance(c, int) else names.index(c) for c in channels]
+    start = 0 if start is None else max(start, 0)
+    end = info['nb_samples'] if end is None else min(end, info['nb_samples'])
+    chunk_size = info['chunk_size']
+
+    parts = dict((i, []) for i in ids)
+    for chunk in range(start // chunk_size, (max(end, start) + chunk_size - 1) // chunk_size):
+        c0 = chunk * chunk_size
+        with np.load(os.path.join(store_path, 'chunk_%05d.npz' % chunk)) as data:
+            for i in ids:
+                parts[i] += [data['c%d' % i][max(start-c0, 0):end-c0]]
+
+    return dict((names[i], np.concatenate(parts[i]) if parts[i] else np.empty(0, dtype=np.float32)) for i in ids)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Write whole animation curves at once         ##
+    ##################################################
+
+    Bulk keying backend: one animCurve per channel, all keys added in a single call
+    instead of one setKeyframe command per channel per frame.
+
+    The key building half only needs numpy, and can be used outside of Maya.
+    The writing half uses OpenMaya MFnAnimCurve.addKeys.
+    sample_channels reads whole channels back, with one key query per anim curve.
+
+    Usage:
+    channels = [(marker+'.translateX', frames, values), ...]
+    set_anim_curves(build_channels(channels))
+'''
+
+
+## INIT
+import numpy as np
+try:
+    import maya.api.OpenMaya as om
+    import maya.api.OpenMayaAnim as oma
+except ImportError:
+    om = oma = None # key building still works without Maya
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## FUNCTIONS
+def channel_keys(times, values):
+    '''
+    Build (times, values) key arrays of one channel
+    Frames where the value is nan (missing marker) get no key
+    '''
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if times.shape != values.shape:
+        raise ValueError('times and values must have the same shape: %s != %s' % (times.shape, values.shape))
+    valid = ~np.isnan(values)
+    if valid.all():
+        return np.ascontiguousarray(times), np.ascontiguousarray(values)
+    return times[valid], values[valid]
+
+
+def build_channels(channels):
+    '''
+    Build key arrays for a list of (node.attribute, times, values)
+    Returns a list of (node.attribute, times, values) with float64 arrays
+    '''
+    return [(node_attr,) + channel_keys(times, values) for node_attr, times, values in channels]
+
+
+def _get_plug(node_attr):
+    '''
+    MPlug from 'node.attribute'
+    '''
+    sel = om.MSelectionList()
+    sel.add(node_attr)
+    return sel.getPlug(0)
+
+
+def _anim_curve_sources(plug):
+    '''
+    Anim curve nodes driving plug (none or one)
+    '''
+    if plug.isDestination:
+        source = plug.source().node()
+        if source.hasFn(om.MFn.kAnimCurve):
+            return [source]
+    return []
+
+
+def delete_anim_curves(node_attrs):
+    '''
+    Delete the anim curves driving a list of node.attribute, in a single DG modifier
+    Other inputs (constraints, expressions) are left alone
+    Returns the number of deleted curves
+    '''
+    if om is None:
+        raise ImportError('delete_anim_curves needs Maya (maya.api.OpenMaya)')
+    modifier = om.MDGModifier()
+    nb_curves = 0
+    for node_attr in node_attrs:
+        for curve in _anim_curve_sources(_get_plug(node_attr)):
+            modifier.deleteNode(curve)
+            nb_curves += 1
+    if nb_curves:
+        modifier.doIt()
+    return nb_curves
+
+
+def _new_anim_curve(plug):
+    '''
+    Fresh anim curve connected to plug, replacing any previous one
+    '''
+    sources = _anim_curve_sources(plug)
+    if sources:
+        modifier = om.MDGModifier()
+        modifier.deleteNode(sources[0])
+        modifier.doIt()
+    curve_fn = oma.MFnAnimCurve()
+    curve_fn.create(plug)
+    return curve_fn
+
+
+def _ui_to_internal(curve_fn):
+    '''
+    Factor from UI units (as in setKeyframe) to the internal units of an anim curve
+    '''
+    curve_type = curve_fn.animCurveType
+    if curve_type in (oma.MFnAnimCurve.kAnimCurveTL, oma.MFnAnimCurve.kAnimCurveUL):
+        return om.MDistance.uiToInternal(1.0)
+    if curve_type in (oma.MFnAnimCurve.kAnimCurveTA, oma.MFnAnimCurve.kAnimCurveUA):
+        return om.MAngle.uiToInternal(1.0)
+    return 1.0
+
+
+def _add_keys(curve_fn, times, values, mtimes=None):
+    '''
+    Add (times, values) keys to an anim curve in a single call
+    '''
+    if mtimes is None:
+        unit = om.MTime.uiUnit()
+        mtimes = om.MTimeArray([om.MTime(t, unit) for t in times.tolist()])
+    values = om.MDoubleArray((values * _ui_to_internal(curve_fn)).tolist())
+    curve_fn.addKeys(mtimes, values, oma.MFnAnimCurve.kTangentGlobal, oma.MFnAnimCurve.kTangentGlobal)
+
+
+def set_anim_curve(node_attr, times, values, mtimes=None):
+    '''
+    Replace the keys of node.attribute with (times, values) in a single call
+    times are in frames, values in UI units, like with setKeyframe
+    Not undoable.
+    '''
+    if len(times) == 0:
+        return
+    _add_keys(_new_anim_curve(_get_plug(node_attr)), times, values, mtimes)
+
+
+def set_curve_keys(curve, times, values, mtimes=None):
+    '''
+    Replace all the keys of an existing anim curve node, e.g. the curve of an attribute in an animation layer
+    times are in frames, values in UI units
+    Not undoable.
+    '''
+    if om is None:
+        raise ImportError('set_curve_keys needs Maya (maya.api.OpenMaya)')
+    sel = om.MSelectionList()
+    sel.add(curve)
+    curve_fn = oma.MFnAnimCurve(sel.getDependNode(0))
+    for k in reversed(range(curve_fn.numKeys)):
+        curve_fn.remove(k)
+    if len(times):
+        _add_keys(curve_fn, times, values, mtimes)
+
+
+def set_anim_curves(channels):
+    '''
+    Write a list of (node.attribute, times, values), as returned by build_channels
+    Previous curves are all deleted at once, and time arrays shared by several channels are only converted once
+    '''
+    if om is None:
+        raise ImportError('set_anim_curves needs Maya (maya.api.OpenMaya)')
+    delete_anim_curves([node_attr for node_attr, times, _ in channels if len(times)])
+    unit = om.MTime.uiUnit()
+    mtimes_cache = {}
+    for node_attr, times, values in channels:
+        key = times.tobytes()
+        if key not in mtimes_cache:
+            mtimes_cache[key] = om.MTimeArray([om.MTime(t, unit) for t in times.tolist()])
+        set_anim_curve(node_attr, times, values, mtimes=mtimes_cache[key])
+
+
+def curve_samples(curve, times):
+    '''
+    Values of an anim curve node at times (frames), in UI units, without changing the current time
+    Keys are read at once (one query for their times, one for their values): samples on a key take its value,
+    and only samples between keys are evaluated one by one
+    '''
+    import maya.cmds as cmds
+    curve_fn = oma.MFnAnimCurve(curve)
+    name = om.MFnDependencyNode(curve).name()
+    times = np.asarray(times, dtype=np.float64)
+    key_times = np.array(cmds.keyframe(name, q=True, timeChange=True) or [], dtype=np.float64)
+    key_values = np.array(cmds.keyframe(name, q=True, valueChange=True) or [], dtype=np.float64)
+    k = np.clip(np.searchsorted(key_times, times), 0, max(len(key_times)-1, 0))
+    on_key = (np.abs(key_times[k] - times) < 1e-6) if len(key_times) else np.zeros(len(times), bool)
+    samples = np.where(on_key, key_values[k] if len(key_values) else 0., np.nan)
+    between = np.flatnonzero(~on_key)
+    if len(between):
+        unit = om.MTime.uiUnit()
+        samples[between] = [curve_fn.evaluate(om.MTime(t, unit)) for t in times[between].tolist()]
+        samples[between] /= _ui_to_internal(curve_fn)
+    return samples
+
+
+def sample_channels(node_attrs, times):
+    '''
+    Values of a list of node.attribute at times (frames), as a (times, channels) array in UI units
+    Channels driven by a time anim curve are read from the curve keys (see curve_samples).
+    Other channels are read once if they have no input, or frame by frame with getAttr(time=) otherwise.
+    '''
+    if om is None:
+        raise ImportError('sample_channels needs Maya (maya.api.OpenMaya)')
+    import maya.cmds as cmds
+    samples = np.empty((len(times), len(node_attrs)))
+    for c, node_attr in enumerate(node_attrs):
+        plug = _get_plug(node_attr)
+        curves = _anim_curve_sources(plug)
+        if curves and not oma.MFnAnimCurve(curves[0]).isUnitlessInput: # not a driven key
+            samples[:, c] = curve_samples(curves[0], times)
+        elif not plug.isDestination:
+            samples[:, c] = cmds.getAttr(node_attr)
+        else:
+            samples[:, c] = [cmds.getAttr(node_attr, time=t) for t in times]
+    return samples
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Export joint hierarchies to bvh              ##
+    ##################################################
+
+    write_bvh writes a BVHClip (numpy arrays) to a bvh file, and is independent from Maya.
+    export_bvh samples a Maya joint hierarchy (for example built by bvh_importer or maya_trc.set_skeleton)
+    over a frame range and writes it with write_bvh.
+    Channels are sampled all at once from their anim curves, without stepping through time.
+
+    - Every joint gets 3 rotation channels, in the order matching its rotateOrder.
+      Joint orients are baked into the rotations.
+    - The root and joints with animated translations also get 3 position channels.
+    - Leaf joints without animation are written as End Sites.
+
+    Usage:
+    from bvh_exporter import write_bvh, export_bvh
+    write_bvh('<your_bvh_file>.bvh', clip)
+    export_bvh('<root_joint>', '<your_bvh_file>.bvh') # in Maya, over the playback range
+'''
+
+
+## INIT
+import time
+import numpy as np
+from bvh_parser import BVHClip, TIP_SUFFIX
+from bvh_fk import euler_to_matrix, MAYA_ROTATE_ORDERS
+from bvh_resample import matrix_to_euler
+try:
+    import maya.cmds as cmds
+    import maya.mel as mel
+    from anim_curves import sample_channels
+except ImportError:
+    cmds = None # write_bvh still works without Maya
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+POSITION_CHANNELS = ['Xposition', 'Yposition', 'Zposition']
+
+
+## FUNCTIONS
+def _depth_first(parents):
+    '''
+    Joint indices in depth-first order (the order of the HIERARCHY section)
+    '''
+    children = [[] for _ in parents]
+    roots = []
+    for j, p in enumerate(parents):
+        (children[p] if p >= 0 else roots).append(j)
+    order, stack = [], list(reversed(roots))
+    while stack:
+        j = stack.pop()
+        order.append(j)
+        stack += reversed(children[j])
+    return order, children
+
+
+def hierarchy_lines(clip, precision=6):
+    '''
+    Lines of the HIERARCHY section of clip, and joint indices in the order of their CHANNELS lines
+    '''
+    order, children = _depth_first(clip.parents)
+    end_sites = clip.end_sites
+    offset_fmt = 'OFFSET ' + ' '.join(['%.{}f'.format(precision)]*3)
+
+    lines, depth_stack = ['HIERARCHY'], []
+    for j in order:
+        # close the blocks of the joints which are not ancestors of j
+        while depth_stack and depth_stack[-1] != clip.parents[j]:
+            depth_stack.pop()
+            lines.append('\t'*len(depth_stack) + '}')
+        tab = '\t'*len(depth_stack)
+        if end_sites[j]:
+            lines += [tab + 'End Site', tab + '{', tab + '\t' + offset_fmt % tuple(clip.offsets[j]), tab + '}']
+            continue
+        lines += [tab + ('ROOT ' if clip.parents[j] < 0 else 'JOINT ') + clip.names[j], tab + '{',
+                  tab + '\t' + offset_fmt % tuple(clip.offsets[j]),
+                  tab + '\tCHANNELS %d %s' % (len(clip.channels[j]), ' '.join(clip.channels[j]))]
+        if not children[j]: # a bvh leaf needs an End Site
+            lines += [tab + '\tEnd Site', tab + '\t{', tab + '\t\t' + offset_fmt % (0, 0, 0), tab + '\t}']
+        depth_stack.append(j)
+    while depth_stack:
+        depth_stack.pop()
+        lines.append('\t'*len(depth_stack) + '}')
+
+    return lines, [j for j in order if clip.channels[j]]
+
+
+def write_bvh(bvh_path, clip, precision=6, chunk_size=1000):
+    '''
+    Write a BVHClip to a bvh file
+    Motion rows are formatted by chunks with a single format operation
+    '''
+    lines, channel_joints = hierarchy_lines(clip, precision)
+    columns = np.arange(clip.nb_channels)
+    columns = np.concatenate([columns[clip.columns(j)] for j in channel_joints]) if channel_joints else columns
+    motion = clip.motion[:, columns]
+
+    lines += ['MOTION', 'Frames: %d' % len(clip), 'Frame Time: %.8f' % clip.frame_time]
+    row_fmt = ' '.join(['%.{}f'.format(precision)]*motion.shape[1]) + '\n'
+    with open(bvh_path, 'w') as bvh_o:
+        bvh_o.write('\n'.join(lines) + '\n')
+        for c in range(0, len(motion), chunk_size):
+            chunk = motion[c:c+chunk_size]
+            bvh_o.write((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def joint_hierarchy(root):
+    '''
+    Full paths of root and its descendant joints (depth first), and parent index of each
+    '''
+    paths, parents = [], []
+    stack = [(cmds.ls(root, long=True)[0], -1)]
+    while stack:
+        path, parent = stack.pop()
+        paths.append(path)
+        parents.append(parent)
+        children = cmds.listRelatives(path, children=True, type='joint', fullPath=True) or []
+        stack += [(child, len(paths)-1) for child in reversed(children)]
+    return paths, parents
+
+
+def _has_input(node_attr):
+    return bool(cmds.listConnections(node_attr, source=True, destination=False))
+
+
+def maya_to_clip(root, start=None, end=None):
+    '''
+    BVHClip of the joint hierarchy under root, sampled on every frame from start to end (default playback range)
+    '''
+    if cmds is None:
+        raise ImportError('maya_to_clip needs Maya (maya.cmds)')
+    start = cmds.playbackOptions(q=True, minTime=True) if start is None else start
+    end = cmds.playbackOptions(q=True, maxTime=True) if end is None else end
+    times = np.arange(int(start), int(end) + 1)
+
+    paths, parents = joint_hierarchy(root)
+    children = [0]*len(paths)
+    for p in parents:
+        if p >= 0:
+            children[p] += 1
+
+    # Channel layout of each joint
+    attrs, layout = [], []
+    for j, path in enumerate(paths):
+        translate = [path + '.translate' + a for a in 'XYZ']
+        rotate = [path + '.rotate' + a for a in 'XYZ']
+        animated_t = parents[j] < 0 or any(_has_input(a) for a in translate)
+        animated_r = any(_has_input(a) for a in rotate)
+        end_site = children[j] == 0 and not animated_t and not animated_r and parents[j] >= 0
+        layout.append((animated_t, end_site))
+        attrs += translate + rotate
+
+    # All channels over the whole range at once
+    samples = sample_channels(attrs, times).reshape(len(times), len(paths), 2, 3)
+    translations, rotations = samples[:, :, 0], samples[:, :, 1]
+
+    names, channels, offsets, motion = [], [], [], []
+    for j, path in enumerate(paths):
+        animated_t, end_site = layout[j]
+        name = path.split('|')[-1].split(':')[-1]
+        offsets.append(translations[0, j])
+        if end_site:
+            names.append((names[parents[j]] if parents[j] >= 0 else name) + TIP_SUFFIX)
+            channels.append([])
+            continue
+        names.append(name)
+
+        # rotate order xyz is applied x first: R = Rz.Ry.Rx, channels 'Zrotation Yrotation Xrotation'
+        maya_order = MAYA_ROTATE_ORDERS[cmds.getAttr(path + '.rotateOrder')]
+        order = maya_order[::-1].upper()
+        angles = rotations[:, j, ['XYZ'.index(a) for a in order]]
+        orient = cmds.getAttr(path + '.jointOrient')[0] if cmds.attributeQuery('jointOrient', node=path, exists=True) else (0, 0, 0)
+        if np.any(np.abs(orient) > 1e-9):
+            # local rotation = jointOrient (xyz) . rotate, baked in the joint rotation order
+            R = euler_to_matrix(np.array(orient)[[2, 1, 0]], 'ZYX') @ euler_to_matrix(angles, order)
+            angles = np.unwrap(matrix_to_euler(R, order), period=360., axis=0)
+
+        chans, values = [], []
+        if animated_t:
+            chans += POSITION_CHANNELS
+            values.append(translations[:, j])
+        chans += [a + 'rotation' for a in order]
+        values.append(angles)
+        channels.append(chans)
+        motion.append(np.hstack(values))
+
+    fps = mel.eval('currentTimeUnitToFPS()')
+    motion = np.hstack(motion) if motion else np.empty((len(times), 0))
+    return BVHClip(names, parents, offsets, channels, motion, 1. / fps)
+
+
+def export_bvh(root, bvh_path, start=None, end=None, precision=6):
+    '''
+    Export the joint hierarchy under root to a bvh file, from start to end (default playback range)
+    Returns the exported BVHClip
+    '''
+    t0 = time.time()
+    clip = maya_to_clip(root, start, end)
+    write_bvh(bvh_path, clip, precision=precision)
+    print('%s: %d joints, %d frames exported in %.2f s' % (bvh_path, len(clip.names), len(clip), time.time() - t0))
+    return clip
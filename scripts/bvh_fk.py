@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Forward kinematics of bvh skeletons          ##
+    ##################################################
+
+    World joint positions (and optionally world matrices) of a BVHClip, for all frames at once.
+    Rotations follow the order of each joint's CHANNELS line: 'Zrotation Xrotation Yrotation'
+    means R = Rz.Rx.Ry (column vectors), angles in degrees.
+    Position channels replace the OFFSET of their joint, as when keyed on a Maya rig.
+    Independent from Maya, except for check_against_maya.
+
+    Usage:
+    from bvh_parser import read_bvh
+    from bvh_fk import forward_kinematics
+    clip = read_bvh('<your_bvh_file>.bvh')
+    positions = forward_kinematics(clip) # (frames, joints, 3)
+    positions, matrices = forward_kinematics(clip, matrices=True) # and (frames, joints, 4, 4)
+
+    Check against Maya, on a rig imported with bvh_importer and rotation order "From file":
+    check_against_maya(clip, '_mocap_<your_bvh_file>_bvh_grp')
+'''
+
+
+## INIT
+import numpy as np
+try:
+    import maya.cmds as cmds
+except ImportError:
+    cmds = None # forward kinematics still work without Maya
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+MAYA_ROTATE_ORDERS = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx'] # rotateOrder enum
+AXES = {'X': 0, 'Y': 1, 'Z': 2}
+
+
+## FUNCTIONS
+def axis_matrices(angles, axis):
+    '''
+    (..., 3, 3) rotation matrices of angles (radians) about axis 'X', 'Y' or 'Z'
+    '''
+    c, s = np.cos(angles), np.sin(angles)
+    zero, one = np.zeros_like(c), np.ones_like(c)
+    if axis == 'X':
+        R = [one, zero, zero, zero, c, -s, zero, s, c]
+    elif axis == 'Y':
+        R = [c, zero, s, zero, one, zero, -s, zero, c]
+    else:
+        R = [c, -s, zero, s, c, zero, zero, zero, one]
+    return np.stack(R, axis=-1).reshape(np.shape(angles) + (3, 3))
+
+
+def euler_to_matrix(angles, order):
+    '''
+    (..., 3, 3) rotation matrices from (..., 3) Euler angles in degrees
+    angles are given in the order of the bvh channels, e.g. order='ZXY': R = Rz.Rx.Ry
+    '''
+    angles = np.radians(angles)
+    R = axis_matrices(angles[..., 0], order[0])
+    for a in (1, 2):
+        R = R @ axis_matrices(angles[..., a], order[a])
+    return R
+
+
+def maya_rotate_order(order):
+    '''
+    Maya rotateOrder index of a bvh channel order (R = Rz.Rx.Ry is applied Y first: 'yxz')
+    '''
+    return MAYA_ROTATE_ORDERS.index(order[::-1].lower())
+
+
+def local_transforms(clip, rows=None):
+    '''
+    Local rotations (joints, frames, 3, 3) and translations (joints, frames, 3) of each joint
+    Arrays are joint-major, so that the frames of a joint are contiguous
+    rows: motion rows to compute (default all)
+    '''
+    motion = clip.motion if rows is None else clip.motion[rows]
+    nb_frames, nb_joints = len(motion), len(clip.names)
+    rotations = np.empty((nb_joints, nb_frames, 3, 3))
+    rotations[:] = np.eye(3)
+    translations = np.empty((nb_joints, nb_frames, 3))
+    translations[:] = clip.offsets[:, np.newaxis, :]
+
+    # joints grouped by rotation order, so that each group is converted at once
+    by_order = {}
+    for j, chans in enumerate(clip.channels):
+        cols = range(clip.nb_channels)[clip.columns(j)]
+        rot = [(c[0], col) for c, col in zip(chans, cols) if c.endswith('rotation')]
+        pos = [(AXES[c[0]], col) for c, col in zip(chans, cols) if c.endswith('position')]
+        if rot:
+            order = ''.join(a for a, _ in rot)
+            by_order.setdefault(order, ([], []))
+            by_order[order][0].append(j)
+            by_order[order][1].append([col for _, col in rot])
+        for axis, col in pos:
+            translations[j, :, axis] = motion[:, col]
+    for order, (joints, cols) in by_order.items():
+        angles = motion[:, np.array(cols)].transpose(1, 0, 2) # (joints, frames, 3)
+        rotations[joints] = euler_to_matrix(angles, order)
+
+    return rotations, translations
+
+
+def depth_levels(parents):
+    '''
+    Joint indices grouped by depth in the hierarchy (roots first)
+    '''
+    depth = np.zeros(len(parents), dtype=np.int64)
+    for j, p in enumerate(parents): # parents come first in bvh order
+        depth[j] = depth[p] + 1 if p >= 0 else 0
+    return [np.flatnonzero(depth == d) for d in range(depth.max() + 1)] if len(parents) else []
+
+
+def forward_kinematics(clip, rows=None, matrices=False, scale=1.):
+    '''
+    World positions (frames, joints, 3) of all joints, End Sites included
+    All frames and all joints of a same depth are computed with one batched matrix product
+    rows: motion rows to compute (default all)
+    matrices: also return world matrices (frames, joints, 4, 4), column vector convention
+    scale: uniform scale of the rig (e.g. Rig scale of bvh_importer)
+    '''
+    world_R, world_t = local_transforms(clip, rows) # composed in place, parents first
+
+    for level in depth_levels(clip.parents):
+        parents = clip.parents[level]
+        children, parents = level[parents >= 0], parents[parents >= 0]
+        if len(children):
+            parent_R = world_R[parents]
+            world_t[children] = world_t[parents] + np.einsum('jfab,jfb->jfa', parent_R, world_t[children])
+            world_R[children] = parent_R @ world_R[children]
+
+    positions = world_t.transpose(1, 0, 2) * scale
+    if not matrices:
+        return positions
+    M = np.zeros(positions.shape[:2] + (4, 4))
+    M[..., :3, :3] = world_R.transpose(1, 0, 2, 3) * scale
+    M[..., :3, 3] = positions
+    M[..., 3, 3] = 1
+    return positions, M
+
+
+def check_against_maya(clip, top, frames=None, frame_offset=0, scale=1., tolerance=1e-3):
+    '''
+    Compare forward_kinematics with the world positions evaluated by Maya
+    on a rig imported by bvh_importer (rotation order "From file") under the group top
+    frames: bvh frames to check (default 10 frames spread over the clip)
+    frame_offset: Frame offset used at import
+    Returns the largest distance, and raises AssertionError above tolerance (in scene units)
+    '''
+    if cmds is None:
+        raise ImportError('check_against_maya needs Maya (maya.cmds)')
+    if frames is None:
+        frames = np.unique(np.linspace(0, len(clip)-1, 10).astype(int))
+    positions = forward_kinematics(clip, rows=frames, scale=scale)
+
+    # full path of each joint
+    paths = []
+    for j, name in enumerate(clip.names):
+        parent = clip.parents[j]
+        paths.append('%s|%s' % (top if parent < 0 else paths[parent], name))
+
+    current = cmds.currentTime(query=True)
+    worst = 0.
+    try:
+        for f, frame in enumerate(frames):
+            cmds.currentTime(frame + frame_offset, update=True)
+            for j, path in enumerate(paths):
+                if not cmds.objExists(path):
+                    continue
+                maya_pos = np.array(cmds.xform(path, query=True, worldSpace=True, translation=True))
+                worst = max(worst, np.linalg.norm(maya_pos - positions[f, j]))
+    finally:
+        cmds.currentTime(current, update=True)
+
+    if worst > tolerance:
+        raise AssertionError('Forward kinematics differ from Maya by %g (tolerance %g)' % (worst, tolerance))
+    return worst
@@ -34,7 +34,24 @@ __status__ 		= "Production"
 
 import pymel.core as pm
 import maya.cmds as mc
+import maya.mel as mel
+import numpy as np
 import os
+import re
+import sys
+import json
+import multiprocessing
+from bvh_parser import read_bvh, read_bvh_batch, window_rows
+from anim_curves import build_channels, set_anim_curves, set_curve_keys, delete_anim_curves
+from bvh_fk import maya_rotate_order
+from bvh_resample import resample_clip
+from bvh_exporter import export_bvh
+
+# Last entry of the Rotation Order menu: rotation order of each joint read from its CHANNELS line
+FROM_FILE = 6
+
+# Batch import: frames left between clips laid one after the other
+BATCH_GAP = 10
 
 # This maps the BVH naming convention to Maya
 translationDict = {
@@ -47,25 +64,12 @@ translationDict = {
 }
 
 
-class TinyDAG(object):
-	#
-	# Small helper class to keep track of parents
-	#
-	
-	def __init__(self, obj, pObj = None):
-		self.obj = obj
-		self.pObj = pObj
-		
-	def __str__(self):
-		# returns object name
-		return str(self.obj)
-		
-	def _fullPath(self):
-		# returns full object path 
-		if self.pObj is not None:
-			return "%s|%s" % (self.pObj._fullPath(), self.__str__())
-		return str(self.obj)
-		
+def _set_pool_executable():
+	# Worker processes have to run mayapy, not the Maya executable
+	mayapy = os.path.join(os.path.dirname(sys.executable), "mayapy.exe" if os.name == "nt" else "mayapy")
+	if os.path.isfile(mayapy):
+		multiprocessing.set_executable(mayapy)
+
 class BVHImporterDialog(object):
 	#
 	# Dialog class..
@@ -80,11 +84,17 @@ class BVHImporterDialog(object):
 		self._textfield = ""
 		self._scaleField = ""
 		self._frameField = ""
+		self._startField = ""
+		self._endField = ""
+		self._strideField = ""
 		self._rotationOrder = ""
+		self._batchMode = ""
+		self._resampleBox = ""
 		self._reload = ""
 		
 		# Other
 		self._rootNode = None # Used for targeting
+		self._rigMaps = {} # (targeted root, bvh joint names): joint paths, resolved once per rig
 		self._debug = debug
 		
 		# BVH specific stuff
@@ -116,7 +126,13 @@ class BVHImporterDialog(object):
 		mc.text("Rig scale")
 		self._scaleField = mc.floatField(minValue=0.01, maxValue=2, value=1)
 		mc.text("Frame offset")
-		self._frameField = mc.intField(minValue=0)
+		self._frameField = mc.intField(minValue=0, ann="Scene frame of bvh frame 0")
+		mc.text("Start frame")
+		self._startField = mc.intField(minValue=0, value=0, ann="First bvh frame to import (from 0)")
+		mc.text("End frame")
+		self._endField = mc.intField(minValue=0, value=0, ann="Last bvh frame to import (0 means last frame)")
+		mc.text("Stride")
+		self._strideField = mc.intField(minValue=1, value=1, ann="Only key every n frames")
 		mc.text("Rotation Order")
 		self._rotationOrder = mc.optionMenu()
 		mc.menuItem( label='XYZ' )
@@ -125,6 +141,13 @@ class BVHImporterDialog(object):
 		mc.menuItem( label='XZY' )
 		mc.menuItem( label='YXZ' )
 		mc.menuItem( label='ZYX' )
+		mc.menuItem( label='From file' )
+		mc.text("Batch mode")
+		self._batchMode = mc.optionMenu(ann="Import folder: clips one after the other on the timeline, or one animation layer per clip")
+		mc.menuItem( label='Sequence' )
+		mc.menuItem( label='Layers' )
+		mc.text("Frame rate")
+		self._resampleBox = mc.checkBox(label="Resample to scene", value=True, ann="Resample the bvh Frame Time to the scene frame rate (slerp of rotations)")
 		
 		mc.setParent("..")
 		mc.separator()
@@ -145,7 +168,9 @@ class BVHImporterDialog(object):
 		mc.setParent("..")
 		mc.separator()
 		mc.button("Import..", c=self._on_select_file)
+		mc.button("Import folder..", c=self._on_select_folder)
 		self._reload = mc.button("Reload", enable=False, c=self._read_bvh)
+		mc.button("Export..", ann="Export the selected root joint and its hierarchy over the playback range", c=self._on_export)
 		
 		# Sorry :)
 		mc.text("Created by Jeroen Hoolmans")
@@ -170,142 +195,226 @@ class BVHImporterDialog(object):
 		# Action!
 		self._read_bvh()
 		
+	def _on_select_folder(self, e):
+		dialog = mc.fileDialog2(dialogStyle=1, fm=3, cap="Folder of .bvh files")
+		if not dialog:
+			return
+		self._import_batch(dialog[0])
+	
+	def _read_options(self):
+		# Rig scale, frame offset, rotation order, start frame, end frame (None for last) and stride
+		# Start and end frames are counted at the scene rate when clips are resampled
+		rigScale = mc.floatField(self._scaleField, q=True, value=True)
+		frame = mc.intField(self._frameField, q=True, value=True)
+		rotOrder = mc.optionMenu(self._rotationOrder, q=True, select=True) - 1
+		start = mc.intField(self._startField, q=True, value=True)
+		end = mc.intField(self._endField, q=True, value=True) or None
+		stride = mc.intField(self._strideField, q=True, value=True)
+		return rigScale, frame, rotOrder, start, end, stride
+	
+	def _resample(self, clip):
+		# Clip resampled to the scene frame rate, when demanded
+		if not mc.checkBox(self._resampleBox, q=True, value=True):
+			return clip
+		fps = mel.eval("currentTimeUnitToFPS()")
+		if self._debug:
+			print( "Resampling from %s to %s fps" % (clip.rate, fps))
+		return resample_clip(clip, fps)
+	
+	def _setup_rig(self, clip, mocapName, rigScale, rotOrder):
+		# Builds the rig in a new group, or maps it onto the targeted rig and clears its animation.
+		# Returns the node on top of the rig and the full path of each joint.
+		if self._rootNode is None:
+			# Create a group for the rig, easier to scale. (Freeze transform when ungrouping please..)
+			grp = pm.group(em=True,name="_mocap_%s_grp" % mocapName)
+			grp.scale.set(rigScale, rigScale, rigScale) 
+			top = grp.longName()
+			return top, self._build_rig(clip, top, rotOrder)
+		
+		# Retarget: joints are resolved once per rig, and previous curves deleted at once
+		top = self._rootNode.longName()
+		self._clear_animation(self._map_rig(clip, top))
+		return top, self._build_rig(clip, top, rotOrder, target=True)
+	
 	def _read_bvh(self, e=False):
-		# Safe close is needed for End Site part to keep from setting new parent.
-		safeClose = False
-		# Once motion is active, animate.
-		motion = False
 		# Clear channels before appending
 		self._channels = []
 		
 		# Scale the entire rig and animation
-		rigScale = mc.floatField(self._scaleField, q=True, value=True)
-		frame = mc.intField(self._frameField, q=True, value=True)
-		rotOrder = mc.optionMenu(self._rotationOrder, q=True, select=True) - 1
+		rigScale, frame, rotOrder, start, end, stride = self._read_options()
 		
-		with open(self._filename) as f:
-			# Check to see if the file is valid (sort of)
-			if not f.readline().startswith("HIERARCHY"):
-				mc.error("No valid .bvh file selected.")
+		# Hierarchy and motion are parsed first, without Maya (or read from cache)
+		try:
+			clip = read_bvh(self._filename, cache=True)
+		except ValueError as err:
+			mc.error("No valid .bvh file selected: %s" % err)
+			return False
+		clip = self._resample(clip)
+		if self._debug:
+			print(clip)
+		
+		top, paths = self._setup_rig(clip, os.path.basename(self._filename), rigScale, rotOrder)
+		
+		# Append the channels that are animated
+		self._channels = ["%s.%s" % (paths[j], translationDict[chan]) if paths[j] else None for j, chan in clip.channel_list()]
+		
+		# Animate! Frame range, stride and offset are applied to the motion arrays,
+		# then each channel gets a single anim curve write with all its keys
+		rows = window_rows(len(clip), start, end, stride)
+		times = frame + rows
+		data = clip.motion[rows]
+		if self._debug:
+			print( "Animating..")
+			print( "Data size: %d" % data.shape[1])
+			print( "Channels size: %d" % len(self._channels))
+			print( "Frames: %d (every %d from %d)" % (len(rows), stride, start))
+		channels = [(self._channels[x], times, data[:, x]) for x in range(0, min(data.shape[1], len(self._channels))) if self._channels[x]]
+		set_anim_curves(build_channels(channels))
+	
+	def _import_batch(self, folder):
+		# Parses all .bvh files of folder in a process pool (without Maya), checks that their hierarchies match,
+		# builds the rig once, then lays each clip on it:
+		# - Sequence: one after the other on the timeline, all clips written with one anim curve per channel
+		# - Layers: one animation layer per clip, all muted but the first one
+		rigScale, frame, rotOrder, start, end, stride = self._read_options()
+		layers = mc.optionMenu(self._batchMode, q=True, select=True) == 2
+		
+		bvhPaths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(".bvh"))
+		_set_pool_executable()
+		clips = []
+		for path, clip, error in read_bvh_batch(bvhPaths):
+			if error is None and clips and not clip.same_hierarchy(clips[0][1]):
+				error = "hierarchy differs from %s" % clips[0][0]
+			if error is not None:
+				print( "Skipped %s: %s" % (path, error))
+				continue
+			clips.append((os.path.basename(path), self._resample(clip)))
+		if not clips:
+			mc.error("No valid .bvh file in %s" % folder)
+			return False
+		print( "%d clips of %d files, %d joints" % (len(clips), len(bvhPaths), len(clips[0][1].names)))
+		
+		top, paths = self._setup_rig(clips[0][1], os.path.basename(folder.rstrip("/\\")), rigScale, rotOrder)
+		self._channels = ["%s.%s" % (paths[j], translationDict[chan]) if paths[j] else None for j, chan in clips[0][1].channel_list()]
+		columns = [x for x in range(len(self._channels)) if self._channels[x]]
+		attrs = [self._channels[x] for x in columns]
+		
+		ranges = []
+		if layers:
+			for i, (name, clip) in enumerate(clips):
+				rows = window_rows(len(clip), start, end, stride)
+				times = (frame + rows).astype(np.float64)
+				layer = mc.animLayer(re.sub(r"\W", "_", "bvh_" + os.path.splitext(name)[0]), override=True)
+				mc.animLayer(layer, e=True, attribute=attrs)
+				mc.setKeyframe(attrs, animLayer=layer, time=frame) # creates the curves of the layer
+				for x, attr in zip(columns, attrs):
+					curve = mc.animLayer(layer, q=True, findCurveForPlug=attr)[0]
+					set_curve_keys(curve, times, clip.motion[rows, x])
+				mc.animLayer(layer, e=True, mute=(i > 0))
+				ranges.append((name, layer, int(times[0]) if len(rows) else frame, int(times[-1]) if len(rows) else frame))
+		else:
+			cursor = frame
+			times, data = [], []
+			for name, clip in clips:
+				rows = window_rows(len(clip), start, end, stride)
+				if not len(rows):
+					continue
+				times.append(cursor + rows - rows[0])
+				data.append(clip.motion[rows])
+				ranges.append((name, None, int(times[-1][0]), int(times[-1][-1])))
+				cursor = int(times[-1][-1]) + BATCH_GAP + 1
+			if not ranges:
+				mc.error("No frame to import in this frame range")
 				return False
+			times, data = np.concatenate(times), np.concatenate(data)
+			set_anim_curves(build_channels([(attr, times, data[:, x]) for x, attr in zip(columns, attrs)]))
+		
+		# Keep track of where each clip is
+		if not mc.attributeQuery("bvhClips", node=top, exists=True):
+			mc.addAttr(top, longName="bvhClips", dataType="string")
+		mc.setAttr(top + ".bvhClips", json.dumps(ranges), type="string")
+		for name, layer, first, last in ranges:
+			print( "%s: frames %d to %d%s" % (name, first, last, " (layer %s)" % layer if layer else ""))
+		mc.playbackOptions(minTime=min(r[2] for r in ranges), maxTime=max(r[3] for r in ranges))
+	
+	def _build_rig(self, clip, top, rotOrder, target=False):
+		# Creates (or reuses) one joint per bvh joint, parents first, and sets its offset.
+		# top is the group of the rig, or the targeted root joint which then stands for the bvh root.
+		# rotOrder is a Maya rotateOrder, or FROM_FILE to follow the CHANNELS line of each joint.
+		# Returns the full path of each joint (None for End Sites missing from a targeted rig).
+		paths = self._map_rig(clip, top) if target else [None] * len(clip.names)
+		endSites = clip.end_sites
+		for j, name in enumerate(clip.names):
+			parent = clip.parents[j]
+			if paths[j] is None:
+				parentPath = top if parent == -1 else paths[parent]
+				if (target and endSites[j]) or parentPath is None:
+					# Do not add End Sites to a targeted rig
+					continue
+				paths[j] = mc.ls(mc.createNode("joint", name=name, parent=parentPath), long=True)[0]
+			if self._debug:
+				print( "joint: %s %s" % (paths[j], clip.offsets[j]))
 			
-			if self._rootNode is None:
-				# Create a group for the rig, easier to scale. (Freeze transform when ungrouping please..)
-				mocapName = os.path.basename(self._filename)
-				grp = pm.group(em=True,name="_mocap_%s_grp" % mocapName)
-				grp.scale.set(rigScale, rigScale, rigScale) 
-				
-				# The group is now the 'root'
-				myParent = TinyDAG(str(grp), None)
+			mc.setAttr(paths[j] + ".translate", *clip.offsets[j].tolist())
+			if rotOrder == FROM_FILE:
+				order = clip.rotation_order(j)
+				mc.setAttr(paths[j] + ".rotateOrder", maya_rotate_order(order) if order else 0)
 			else:
-				myParent = TinyDAG(str(self._rootNode), None)
-				self._clear_animation()
-			
-			for line in f:
-				line = line.replace("	"," ") # force spaces
-				if not motion:
-					# root joint
-					if line.startswith("ROOT"):
-						# Set the Hip joint as root
-						if self._rootNode:
-							myParent = TinyDAG(str(self._rootNode), None)
-						else:
-							myParent = TinyDAG(line[5:].rstrip(), myParent)
-					
-					if "JOINT" in line:
-						jnt = line.split(" ")
-						# Create the joint
-						myParent = TinyDAG(jnt[-1].rstrip(), myParent)
-	
-					if "End Site" in line:
-						# Finish up a hierarchy and ignore a closing bracket
-						safeClose = True
+				mc.setAttr(paths[j] + ".rotateOrder", rotOrder)
+		
+		if target:
+			self._rigMaps[(top, tuple(clip.names))] = paths
+		return paths
 	
-					if "}" in line:
-						# Ignore when safeClose is on
-						if safeClose:
-							safeClose = False
-							continue
-						
-						# Go up one level
-						if myParent is not None:
-							myParent = myParent.pObj
-							if myParent is not None:
-								mc.select(myParent._fullPath())
-							
-					if "CHANNELS" in line:
-						chan = line.strip().split(" ")
-						if self._debug:
-							print(chan)
-						
-						# Append the channels that are animated
-						for i in range(int(chan[1]) ):
-							self._channels.append("%s.%s" % (myParent._fullPath(), translationDict[chan[2 + i]] ) )
-						
-					if "OFFSET" in line:
-						offset = line.strip().split(" ")
-						if self._debug:
-							print( offset)
-						jntName = str(myParent)
-						
-						# When End Site is reached, name it "_tip"
-						if safeClose:
-							jntName += "_tip"
-						
-						# skip if exists
-						if mc.objExists(myParent._fullPath()):
-							jnt = pm.PyNode(myParent._fullPath())
-							jnt.rotateOrder.set(rotOrder)
-							jnt.translate.set([float(offset[1]), float(offset[2]), float(offset[3])])
-							continue
-						
-						# Build the joint and set its properties
-						jnt = pm.joint(name=jntName, p=(0,0,0))
-						jnt.translate.set([float(offset[1]), float(offset[2]), float(offset[3])])
-						jnt.rotateOrder.set(rotOrder)
-					
-					if "MOTION" in line:
-						# Animate!
-						motion = True
-					
-					if self._debug:
-						if myParent is not None:
-							print( "parent: %s" % myParent._fullPath())
-							
-				else:
-					# We don't really need to use Framecount and time(since Python handles file reads nicely)
-					if "Frame" not in line:
-						data = line.split(" ")
-						if len(data) > 0:
-							if data[0] == "": data.pop(0)
-						
-						if self._debug:
-							print( "Animating..")
-							print( "Data size: %d" % len(data))
-							print( "Channels size: %d" % len(self._channels))
-						# Set the values to channels
-						for x in range(0, len(data) - 1 ):
-							if self._debug:
-								print( "Set Attribute: %s %f" % (self._channels[x], float(data[x])))
-							mc.setKeyframe(self._channels[x], time=frame, value=float(data[x]))
-						
-						frame = frame + 1
+	def _map_rig(self, clip, root):
+		# Resolves bvh joint names to the joints under the targeted root, once per rig and hierarchy.
+		# The bvh root stands for the targeted root, other joints are matched by name (namespaces ignored).
+		# Returns the full path of each joint, None when the rig has no such joint.
+		key = (root, tuple(clip.names))
+		paths = self._rigMaps.get(key)
+		if paths is not None:
+			known = [p for p in paths if p is not None]
+			if len(mc.ls(known)) == len(known):
+				return list(paths)
+		
+		byName = {}
+		for path in mc.listRelatives(root, allDescendents=True, type="joint", fullPath=True) or []:
+			byName.setdefault(path.split("|")[-1].split(":")[-1], path)
+		paths = [root if clip.parents[j] == -1 else byName.get(name) for j, name in enumerate(clip.names)]
+		if self._debug:
+			print( "Rig map: %d of %d joints found" % (len([p for p in paths if p]), len(paths)))
+		self._rigMaps[key] = paths
+		return list(paths)
 	
-	def _clear_animation(self):
-		# select root joint
-		pm.select(str(self._rootNode), hi=True)
-		nodes = pm.ls(sl=True)
-		
-		trans_attrs = ["translateX", "translateY", "translateZ"]
-		rot_attrs = ["rotateX", "rotateY", "rotateZ"]
-		for node in nodes:
-			for attr in trans_attrs:
-				connections = node.attr(attr).inputs()
-				pm.delete(connections)
-			for attr in rot_attrs:
-				connections = node.attr(attr).inputs()
-				pm.delete(connections)
-				node.attr(attr).set(0)
+	def _clear_animation(self, paths):
+		# Frees the channels of the targeted rig, so that it can be animated again, and resets its rotations:
+		# - takes them out of animation layers (e.g. a previous Layers import), which gives their base curves back
+		# - deletes their anim curves at once
+		# - disconnects their other inputs (constraints, expressions..)
+		joints = [p for p in paths if p is not None]
+		if not joints:
+			return
+		attrs = mc.ls(["%s.%s" % (jnt, attr) for jnt in joints for attr in translationDict.values()], long=True)
+		rootLayer = mc.animLayer(q=True, root=True)
+		for layer in mc.ls(type="animLayer"):
+			if layer == rootLayer:
+				continue
+			layerAttrs = set(mc.ls(mc.animLayer(layer, q=True, attribute=True) or [], long=True))
+			inLayer = [attr for attr in attrs if attr in layerAttrs]
+			if inLayer:
+				mc.animLayer(layer, e=True, removeAttribute=inLayer)
+		delete_anim_curves(attrs)
+		
+		compounds = ["%s.%s" % (jnt, attr) for jnt in joints for attr in ("translate", "rotate")]
+		inputs = mc.listConnections(compounds + attrs, source=True, destination=False, plugs=True, connections=True) or []
+		for dst, src in zip(inputs[::2], inputs[1::2]):
+			if mc.isConnected(src, dst):
+				mc.disconnectAttr(src, dst)
+		
+		for jnt in joints:
+			for axis in "XYZ":
+				if not mc.connectionInfo(jnt + ".rotate" + axis, isDestination=True):
+					mc.setAttr(jnt + ".rotate" + axis, 0)
 	
 	def _on_select_root(self, e):
 		# When targeting, set the root joint (Hips)
@@ -316,6 +425,18 @@ class BVHImporterDialog(object):
 		else:
 			self._rootNode = selection[0]
 			mc.textField(self._textfield, e=True, text=str(self._rootNode))
+		self._rigMaps = {}
+	
+	def _on_export(self, e):
+		# Export the selected root joint (and its hierarchy) over the playback range
+		selection = mc.ls(sl=True, type="joint", long=True)
+		if not selection:
+			mc.warning("Select the root joint to export")
+			return
+		dialog = mc.fileDialog2(fileFilter="Motion Capture (*.bvh)", dialogStyle=1, fm=0)
+		if not dialog:
+			return
+		export_bvh(selection[0], dialog[0])
 		
 if __name__ == "__main__":
 	dialog = BVHImporterDialog()
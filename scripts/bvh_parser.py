@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Read bvh files into arrays                   ##
+    ##################################################
+
+    Two-phase bvh reader, independent from Maya.
+    The HIERARCHY section is parsed into joint names, parents, offsets and channel layouts,
+    then the whole MOTION section is parsed at once into a (frames, channels) float array.
+    Returns a BVHClip, from which bvh_importer builds the rig.
+
+    Usage:
+    from bvh_parser import read_bvh
+    clip = read_bvh('<your_bvh_file>.bvh')
+    clip.motion[:, clip.columns(clip.index('Hips'))]
+    clips = read_bvh_batch(['<take1>.bvh', '<take2>.bvh'], jobs=8)
+'''
+
+
+## INIT
+import io
+import os
+import warnings
+import multiprocessing
+import numpy as np
+import parse_cache
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+BVH_PARSER_VERSION = 1 # increment when read_bvh output changes, to invalidate cached files
+TIP_SUFFIX = '_tip' # End Site joints are named after their parent, with this suffix
+
+
+## CLASSES
+class BVHClip(object):
+    '''
+    Skeleton and motion of a bvh file.
+    names: joint names, parents first. End Sites are named <parent>_tip
+    parents: int array (joints,) of parent index, -1 for root
+    offsets: float array (joints, 3) of rest offsets from parent
+    channels: list of channel names of each joint, e.g. ['Xposition', 'Yposition', 'Zposition', 'Zrotation', 'Xrotation', 'Yrotation']
+              ([] for End Sites)
+    motion: float array (frames, channels), columns in the order of the CHANNELS lines
+    frame_time: seconds between frames
+    '''
+    def __init__(self, names, parents, offsets, channels, motion, frame_time):
+        self.names = list(names)
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+        self.channels = [list(c) for c in channels]
+        self.motion = np.asarray(motion, dtype=np.float64).reshape(-1, self.nb_channels)
+        self.frame_time = float(frame_time)
+        self._name_ids = dict((n, i) for i, n in enumerate(self.names))
+        self._first_column = np.cumsum([0] + [len(c) for c in self.channels]).tolist()
+
+    def __len__(self):
+        return self.motion.shape[0]
+
+    def __repr__(self):
+        return 'BVHClip(frames=%d, joints=%d, channels=%d, rate=%s)' % (len(self), len(self.names), self.nb_channels, self.rate)
+
+    @property
+    def nb_channels(self):
+        return sum(len(c) for c in self.channels)
+
+    @property
+    def rate(self):
+        return 1. / self.frame_time if self.frame_time > 0 else None
+
+    @property
+    def end_sites(self):
+        '''
+        Boolean array (joints,), True for End Sites
+        '''
+        return np.array([n.endswith(TIP_SUFFIX) and not c for n, c in zip(self.names, self.channels)], dtype=bool)
+
+    def index(self, name):
+        '''
+        Joint index of name
+        '''
+        return self._name_ids[name]
+
+    def columns(self, joint):
+        '''
+        Motion columns of the channels of joint (index)
+        '''
+        return slice(self._first_column[joint], self._first_column[joint+1])
+
+    def channel_list(self):
+        '''
+        (joint index, channel name) of each motion column
+        '''
+        return [(j, c) for j, chans in enumerate(self.channels) for c in chans]
+
+    def rotation_order(self, joint):
+        '''
+        Rotation order of joint as written in its CHANNELS line, e.g. 'ZXY', or None without rotation channels
+        '''
+        order = ''.join(c[0] for c in self.channels[joint] if c.endswith('rotation'))
+        return order or None
+
+    def same_hierarchy(self, other):
+        '''
+        True if other has the same joints, parents and channel layout (offsets may differ)
+        '''
+        return self.names == other.names and np.array_equal(self.parents, other.parents) and self.channels == other.channels
+
+    def to_cache(self):
+        '''
+        Arrays and metadata for parse_cache
+        '''
+        return ({'parents': self.parents, 'offsets': self.offsets, 'motion': self.motion},
+                {'names': self.names, 'channels': self.channels, 'frame_time': self.frame_time})
+
+    @classmethod
+    def from_cache(cls, arrays, meta):
+        '''
+        BVHClip from parse_cache arrays and metadata (no copy)
+        '''
+        return cls(meta['names'], arrays['parents'], arrays['offsets'], meta['channels'], arrays['motion'], meta['frame_time'])
+
+
+## FUNCTIONS
+def read_bvh_hierarchy(bvh_file):
+    '''
+    Parse the HIERARCHY section of an open bvh file, up to the Frame Time line
+    The file is left at the first motion line
+    Returns names, parents, offsets, channels, number of frames and frame time
+    '''
+    line = bvh_file.readline()
+    if 'HIERARCHY' not in line:
+        raise ValueError('Not a bvh file: no HIERARCHY line')
+
+    names, parents, offsets, channels = [], [], [], []
+    stack = [] # index of the joints whose bracket is open
+    pending = None # joint declared, bracket not open yet
+    for line in iter(bvh_file.readline, ''):
+        tokens = line.split()
+        if not tokens:
+            continue
+        key = tokens[0]
+        if key in ('ROOT', 'JOINT') or (key == 'End' and len(tokens) > 1 and tokens[1] == 'Site'):
+            parent = stack[-1] if stack else -1
+            if key == 'End':
+                name = names[parent] + TIP_SUFFIX
+            else:
+                name = ' '.join(tokens[1:])
+            names += [name]
+            parents += [parent]
+            offsets += [[0., 0., 0.]]
+            channels += [[]]
+            pending = len(names) - 1
+        elif key == '{':
+            stack += [pending]
+        elif key == '}':
+            stack.pop()
+        elif key == 'OFFSET':
+            offsets[stack[-1]] = [float(v) for v in tokens[1:4]]
+        elif key == 'CHANNELS':
+            channels[stack[-1]] = tokens[2:2+int(tokens[1])]
+        elif key == 'MOTION':
+            break
+
+    # Frames and Frame Time lines (possibly indented), before any motion line
+    nb_frames, frame_time = None, None
+    for line in iter(bvh_file.readline, ''):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('Frames:'):
+            nb_frames = int(line.split(':')[1])
+        elif line.startswith('Frame Time:'):
+            frame_time = float(line.split(':')[1])
+            break
+        else:
+            break
+    if frame_time is None:
+        raise ValueError('Not a bvh file: no Frame Time line after MOTION')
+
+    return names, parents, offsets, channels, nb_frames, frame_time
+
+
+def _parse_motion(bvh_file, nb_channels):
+    '''
+    Parse the motion lines left in an open bvh file into a (frames, nb_channels) float array
+    All lines are parsed in one call (C parser of numpy >= 1.23), whatever the separators (spaces, tabs)
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning) # raised when there is no frame
+        motion = np.loadtxt(bvh_file, dtype=np.float64, ndmin=2)
+    if motion.size == 0:
+        return np.empty((0, nb_channels))
+    if motion.shape[1] != nb_channels:
+        raise ValueError('%d motion values per frame do not fit %d channels' % (motion.shape[1], nb_channels))
+    return motion
+
+
+def _read_bvh(bvh_path):
+    with io.open(bvh_path, 'r', encoding='ISO-8859-1') as bvh_file:
+        names, parents, offsets, channels, _, frame_time = read_bvh_hierarchy(bvh_file)
+        motion = _parse_motion(bvh_file, sum(len(c) for c in channels))
+    return BVHClip(names, parents, offsets, channels, motion, frame_time)
+
+
+def window_rows(nb_frames, start=None, end=None, step=1):
+    '''
+    Motion rows of frames start to end (included), every step frames
+    Frames are numbered from 0, as motion rows. None means first or last frame.
+    '''
+    if step < 1:
+        raise ValueError('step must be >= 1, got %s' % step)
+    start = 0 if start is None else max(start, 0)
+    end = nb_frames - 1 if end is None else min(end, nb_frames - 1)
+    return np.arange(start, end + 1, step)
+
+
+def read_bvh(bvh_path, cache=False):
+    '''
+    Read bvh file: hierarchy first, then the whole motion section at once
+    With cache=True, the result is stored in (or memory-mapped from) the parse_cache folder.
+    Returns a BVHClip
+    '''
+    if cache:
+        parse = lambda: _read_bvh(bvh_path).to_cache()
+        return BVHClip.from_cache(*parse_cache.cached(bvh_path, 'bvh', BVH_PARSER_VERSION, parse))
+    return _read_bvh(bvh_path)
+
+
+def _read_bvh_job(job):
+    '''
+    Worker: parse one bvh, never raises
+    With cache, the clip is left in the parse_cache folder and only its path is sent back
+    '''
+    bvh_path, cache = job
+    try:
+        clip = read_bvh(bvh_path, cache=cache)
+        return bvh_path, None if cache else clip, None
+    except Exception as e:
+        return bvh_path, None, '%s: %s' % (type(e).__name__, e)
+
+
+def read_bvh_batch(bvh_paths, jobs=None, cache=True):
+    '''
+    Parse bvh files in a pool of jobs processes (default: number of CPUs)
+    Workers are spawned, not forked, so that the pool never duplicates the calling process (e.g. Maya).
+    With cache=True, workers write parsed clips to the parse_cache folder, 
+    which are then memory-mapped instead of being copied between processes.
+    If the files would not fit in the cache, arrays are sent back instead, so that no clip is evicted before it is read.
+    Results are collected as they come, each clip being loaded while it is the most recent cache entry.
+    Returns a list of (path, BVHClip or None, error message or None), in input order
+    '''
+    size = sum(os.path.getsize(p) for p in bvh_paths if os.path.isfile(p)) # about the size of the parsed arrays
+    cache = cache and 0 < size <= parse_cache.cache_size_cap()
+    todo = [(bvh_path, cache) for bvh_path in bvh_paths]
+    jobs = min(jobs or multiprocessing.cpu_count(), max(len(todo), 1))
+    pool = multiprocessing.get_context('spawn').Pool(jobs) if jobs > 1 else None
+    clips = []
+    try:
+        results = pool.imap(_read_bvh_job, todo) if pool else map(_read_bvh_job, todo)
+        for bvh_path, clip, error in results:
+            if error is None and clip is None:
+                clip = read_bvh(bvh_path, cache=True) # cache hit
+            clips += [(bvh_path, clip, error)]
+    finally:
+        if pool:
+            pool.terminate()
+    return clips
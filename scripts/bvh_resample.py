@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Resample bvh clips to another frame rate     ##
+    ##################################################
+
+    Rotation channels are converted to quaternions, interpolated with slerp,
+    and converted back to Euler angles in the rotation order of each joint.
+    Euler angles are kept continuous: each one stays within 180° of the linearly interpolated
+    source angle, so that no 360° flip appears between frames.
+    Position channels are interpolated linearly.
+    All frames and all joints with the same rotation order are processed at once.
+    Independent from Maya.
+
+    Usage:
+    from bvh_parser import read_bvh
+    from bvh_resample import resample_clip
+    clip = read_bvh('<your_bvh_file>.bvh')
+    clip_30fps = resample_clip(clip, 30)
+'''
+
+
+## INIT
+import numpy as np
+from bvh_parser import BVHClip
+from bvh_fk import AXES
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## FUNCTIONS
+def quat_multiply(q1, q2):
+    '''
+    Hamilton product of (..., 4) quaternions (w, x, y, z)
+    '''
+    w1, x1, y1, z1 = np.moveaxis(q1, -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(q2, -1, 0)
+    return np.stack([w1*w2 - x1*x2 - y1*y2 - z1*z2,
+                     w1*x2 + x1*w2 + y1*z2 - z1*y2,
+                     w1*y2 - x1*z2 + y1*w2 + z1*x2,
+                     w1*z2 + x1*y2 - y1*x2 + z1*w2], axis=-1)
+
+
+def euler_to_quat(angles, order):
+    '''
+    (..., 4) quaternions from (..., 3) Euler angles in degrees
+    angles are given in the order of the bvh channels, e.g. order='ZXY': q = qz.qx.qy (as R = Rz.Rx.Ry)
+    '''
+    half = np.radians(angles) / 2
+    q = None
+    for a, axis in enumerate(order):
+        qa = np.zeros(half.shape[:-1] + (4,))
+        qa[..., 0] = np.cos(half[..., a])
+        qa[..., 1 + AXES[axis]] = np.sin(half[..., a])
+        q = qa if q is None else quat_multiply(q, qa)
+    return q
+
+
+def quat_to_matrix(q):
+    '''
+    (..., 3, 3) rotation matrices from (..., 4) unit quaternions
+    '''
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    R = [1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y),
+         2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x),
+         2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)]
+    return np.stack(R, axis=-1).reshape(q.shape[:-1] + (3, 3))
+
+
+def matrix_to_euler(R, order):
+    '''
+    (..., 3) Euler angles in degrees, in the order of the bvh channels, from (..., 3, 3) rotation matrices
+    R = Ri(a).Rj(b).Rk(c) for order 'ijk'. The middle angle is in [-90°, 90°]
+    '''
+    i, j, k = [AXES[axis] for axis in order]
+    sign = 1. if (j - i) % 3 == 1 else -1. # cyclic orders (XYZ, YZX, ZXY) or not
+    b = np.arcsin(np.clip(sign * R[..., i, k], -1, 1))
+    a = np.arctan2(-sign * R[..., j, k], R[..., k, k])
+    c = np.arctan2(-sign * R[..., i, j], R[..., i, i])
+    return np.degrees(np.stack([a, b, c], axis=-1))
+
+
+def continuous_euler(angles, reference):
+    '''
+    Among the equivalent Euler triplets of angles, (a, b, c) and (a+180, 180-b, c+180) plus any multiple of 360°,
+    pick the one closest to reference (e.g. the source angles interpolated linearly)
+    '''
+    alternative = angles + np.array([180., 0., 180.])
+    alternative[..., 1] = 180. - angles[..., 1]
+    candidates = []
+    for cand in (angles, alternative):
+        cand = cand + 360. * np.round((reference - cand) / 360.)
+        candidates += [cand]
+    distance = [np.abs(cand - reference).sum(axis=-1) for cand in candidates]
+    return np.where((distance[1] < distance[0])[..., np.newaxis], candidates[1], candidates[0])
+
+
+def slerp(q0, q1, alpha):
+    '''
+    Spherical interpolation between (..., 4) unit quaternions, with (...) weights alpha
+    Takes the shortest path, and falls back on normalized linear interpolation for close quaternions
+    '''
+    dot = (q0 * q1).sum(axis=-1)
+    q1 = np.where((dot < 0)[..., np.newaxis], -q1, q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin_theta = np.sin(theta)
+    close = sin_theta < 1e-6
+    safe = np.where(close, 1., sin_theta)
+    w0 = np.where(close, 1 - alpha, np.sin((1 - alpha) * theta) / safe)
+    w1 = np.where(close, alpha, np.sin(alpha * theta) / safe)
+    q = w0[..., np.newaxis] * q0 + w1[..., np.newaxis] * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def resample_times(nb_frames, frame_time, rate):
+    '''
+    Source frame positions (float, in frames) of the resampled frames, covering the same duration
+    '''
+    if nb_frames == 0:
+        return np.empty(0)
+    duration = (nb_frames - 1) * frame_time
+    nb_out = int(np.floor(duration * rate + 1e-9)) + 1
+    return np.arange(nb_out) / float(rate) / frame_time
+
+
+def resample_motion(clip, rate):
+    '''
+    (frames, channels) motion of clip resampled to rate (frames per second)
+    '''
+    positions = resample_times(len(clip), clip.frame_time, rate)
+    i0 = np.minimum(np.floor(positions).astype(np.int64), max(len(clip) - 2, 0))
+    i1 = np.minimum(i0 + 1, len(clip) - 1)
+    alpha = positions - i0
+
+    # Linear interpolation of all channels: used as is for positions, and as a continuity reference for rotations
+    # (angles are unwrapped first, so that a jump from 179° to -179° is interpolated through 180°)
+    motion = clip.motion
+    unwrapped = np.array(motion)
+    rot_cols = [col for col, (_, c) in enumerate(clip.channel_list()) if c.endswith('rotation')]
+    unwrapped[:, rot_cols] = np.unwrap(motion[:, rot_cols], period=360., axis=0)
+    resampled = unwrapped[i0] + alpha[:, np.newaxis] * (unwrapped[i1] - unwrapped[i0])
+
+    # Rotations: joints grouped by rotation order, slerped at once
+    by_order = {}
+    for j, chans in enumerate(clip.channels):
+        cols = range(clip.nb_channels)[clip.columns(j)]
+        rot = [(c[0], col) for c, col in zip(chans, cols) if c.endswith('rotation')]
+        if len(rot) == 3:
+            order = ''.join(a for a, _ in rot)
+            by_order.setdefault(order, []).append([col for _, col in rot])
+    for order, cols in by_order.items():
+        cols = np.array(cols) # (joints, 3)
+        q = euler_to_quat(motion[:, cols], order) # (frames, joints, 4)
+        q = slerp(q[i0], q[i1], alpha[:, np.newaxis])
+        angles = matrix_to_euler(quat_to_matrix(q), order)
+        resampled[:, cols] = continuous_euler(angles, resampled[:, cols])
+
+    return resampled
+
+
+def resample_clip(clip, rate):
+    '''
+    BVHClip resampled to rate (frames per second), same hierarchy
+    '''
+    if clip.rate is None or len(clip) < 2 or np.isclose(clip.rate, rate):
+        return clip
+    return BVHClip(clip.names, clip.parents, clip.offsets, clip.channels, resample_motion(clip, rate), 1. / rate)
@@ -8,18 +8,36 @@
     ##################################################
     
     Converts c3d files to trc files.
-    Beware that it only allows you to retrieve 3D points, you won't get analog data nor computed data sucha as angles or powers with this code. 
+    Beware that computed data such as angles or powers are not retrieved.
+    Analog data (force plates, EMG) can optionally be written to a chunked analog store (see analog_store.py),
+    in the same pass as the points.
     
     Usage: 
     run c3d2trc -i <input_file>.c3D
     run c3d2trc -i <input_file>.c3D -o <input_file>.trc
+    run c3d2trc -i <input_file>.c3D -p 4
+    run c3d2trc -i <input_file>.c3D -a
+    
+    Batch mode, with directories or globs (files already converted and unchanged are skipped):
+    run c3d2trc -i <capture_day_folder> -j 8
+    run c3d2trc -i "<folder>/*/Trial*.c3d" -d <output_folder> --force
+    A manifest (c3d2trc_manifest.json) keeps track of converted files, so that an interrupted run can be resumed:
+    files missing from it or which failed are converted again. Trc files are written to a temporary file first.
 '''
 
 
 ## INIT
+import os
+import glob
+import json
+import time
 import c3d
 import numpy as np
 import argparse
+import multiprocessing
+import parse_cache
+from motion_clip import MotionClip
+from analog_store import AnalogWriter
 
 
 ## AUTHORSHIP INFORMATION
@@ -33,11 +51,150 @@ __email__ = "contact@david-pagnon.com"
 __status__ = "Development"
 
 
+## CONSTANTS
+C3D_PARSER_VERSION = 1 # increment when read_c3d output changes, to invalidate cached files
+MANIFEST_NAME = 'c3d2trc_manifest.json'
+ANALOG_EXT = '.analog' # analog store folder, next to the trc file
+
+
 ## FUNCTIONS
-def c3d2trc_func(*args):
+def _analog_channels(reader):
+    '''
+    Name, scale, offset, units and description of each analog channel
+    Stored values already have scales and offsets applied, these are kept for reference
+    '''
+    gen_scale, scales, offsets = reader.get_analog_transform_parameters()
+    def strings(key):
+        param = reader.get(key)
+        return [s.strip() for s in param.string_array] if param is not None and param.num_elements > 0 else []
+    labels, units, descriptions = strings('ANALOG:LABELS'), strings('ANALOG:UNITS'), strings('ANALOG:DESCRIPTIONS')
+    channels = []
+    for c in range(reader.analog_used):
+        channels += [{'name': labels[c] if c < len(labels) else 'Analog%d' % (c+1),
+                      'scale': float(scales[c] * gen_scale), 'offset': int(offsets[c]),
+                      'units': units[c] if c < len(units) else '',
+                      'description': descriptions[c] if c < len(descriptions) else ''}]
+    return channels
+
+
+def _read_c3d(c3d_path, analog_path=None):
+    '''
+    Read c3d header, point labels, frame numbers and (frames, points, 3) coordinates
+    If analog_path is given, analog channels are streamed to an analog_store folder in the same pass
+    Returns arrays and metadata as expected by parse_cache
+    '''
+    with open(c3d_path, 'rb') as c3d_file:
+        reader = c3d.Reader(c3d_file)
+        items_header = str(reader.header).split('\n')
+        items_header_list = [item.strip().split(': ') for item in items_header]
+        label_item = [item[0] for item in items_header_list]
+        value_item = [item[1] for item in items_header_list]
+        header_c3d = dict(zip(label_item, value_item))
+        
+        analog_writer = None
+        if analog_path is not None and reader.analog_used > 0:
+            analog_writer = AnalogWriter(analog_path, _analog_channels(reader), float(reader.analog_rate), 
+                                         first_frame=int(reader.first_frame), analog_per_frame=int(reader.analog_per_frame), 
+                                         source=os.path.abspath(c3d_path))
+        
+        # Frames are streamed into one preallocated array, analog samples are flushed to disk by chunks
+        nb_frames = reader.last_frame - reader.first_frame + 1
+        frames = np.empty(nb_frames, dtype=np.int64)
+        points = np.empty((nb_frames, reader.point_used, 3), dtype=np.float32)
+        n = 0
+        for n, (i, pts, analog) in enumerate(reader.read_frames(copy=False), 1):
+            frames[n-1] = i
+            points[n-1] = pts[:, :3]
+            if analog_writer is not None:
+                analog_writer.append(analog)
+        arrays = {'frames': frames[:n], 'points': points[:n]}
+        labels = list(reader.point_labels)
+        if analog_writer is not None:
+            analog_writer.close()
+    
+    return arrays, {'header': header_c3d, 'labels': labels}
+
+
+def read_c3d(c3d_path, cache=False, analog_path=None):
+    '''
+    Read c3d points
+    With cache=True, the result is stored in (or memory-mapped from) the parse_cache folder
+    With analog_path, analog channels are also written to this analog_store folder 
+    (the file is then always read, since the cache only holds points)
+    Returns c3d header dict, point labels, frame numbers and (frames, points, 3) coordinates
+    '''
+    if analog_path is not None:
+        arrays, meta = _read_c3d(c3d_path, analog_path)
+    elif cache:
+        arrays, meta = parse_cache.cached(c3d_path, 'c3d', C3D_PARSER_VERSION, lambda: _read_c3d(c3d_path))
+    else:
+        arrays, meta = _read_c3d(c3d_path)
+    return meta['header'], meta['labels'], arrays['frames'], arrays['points']
+
+
+def marker_indices(labels):
+    '''
+    Indices of point labels which are markers, not computed data (angles, powers, forces, moments, GRF)
+    '''
+    return [i for i, s in enumerate(labels) if 'Angle' not in s and 'Power' not in s and 'Force' not in s and 'Moment' not in s and 'GRF' not in s]
+
+
+def trc_header(header_c3d, nb_markers):
+    '''
+    trc header (DataRate, NumFrames, etc) from c3d header, as strings
+    '''
+    header1 = {}
+    header1['DataRate'] = str(int(float(header_c3d['frame_rate'])))
+    header1['NumFrames'] = str(int(header_c3d['last_frame']) - int(header_c3d['first_frame']) + 1)
+    header1['OrigNumFrames'] = header1['NumFrames']
+    header1['CameraRate'] = header1['DataRate']
+    header1['NumMarkers'] = str(nb_markers)
+    header1['Units'] = 'm'
+    header1['OrigDataStartFrame'] = header_c3d['first_frame']
+    header1['OrigDataRate'] = header1['DataRate']
+    return header1
+
+
+def write_trc_data(trc_o, frames, times, coords, precision=6, chunk_size=1000):
+    '''
+    Write trc data rows: frame, time, then coordinates with precision decimals
+    Rows are formatted by chunks with a single format operation
+    '''
+    row_fmt = '%d\t%.10g\t' + '\t'.join(['%.{}f'.format(precision)]*coords.shape[1]) + '\n'
+    for c in range(0, len(frames), chunk_size):
+        chunk = np.column_stack([frames[c:c+chunk_size], times[c:c+chunk_size], coords[c:c+chunk_size]])
+        trc_o.write((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def trc_times(header_c3d):
+    '''
+    trc time column from c3d header
+    '''
+    t0 = int(float(header_c3d['first_frame'])) / int(float(header_c3d['frame_rate']))
+    tf = int(float(header_c3d['last_frame'])) / int(float(header_c3d['frame_rate']))
+    return np.linspace(t0, tf, num=(int(header_c3d['last_frame']) - int(header_c3d['first_frame']) + 1))
+
+
+def c3d_to_clip(c3d_path, cache=False):
+    '''
+    Read c3d markers straight into a MotionClip, as read_trc would from the converted trc
+    No trc is written, and coordinates keep their float precision
+    '''
+    header_c3d, labels, frames, points = read_c3d(c3d_path, cache=cache)
+    index_labels_markers = marker_indices(labels)
+    labels_markers = [labels[ind].strip() for ind in index_labels_markers]
+    header = dict((k, int(v)) if k != 'Units' else (k, v) for k, v in trc_header(header_c3d, len(labels_markers)).items())
+    return MotionClip(points[:, index_labels_markers], frames, trc_times(header_c3d)[:len(frames)], labels_markers, header)
+
+
+def c3d2trc_func(*args, **kwargs):
     '''
     Convert c3d to trc
-    /!\ Only point data are retrieved. Analog data (force plates, emg) and computed data (angles, powers, etc) will be lost
+    /!\ Computed data (angles, powers, etc) will be lost
+    Pass cache=True to reuse the points parsed during a previous conversion of the same file,
+    precision=<n> to choose the number of decimals of coordinates (default 6),
+    and analog=True to also write analog channels (force plates, emg) to <trc_file>.analog
+    Returns the number of frames written
     '''
     try:
         c3d_path = args[0]['input'] # invoked with argparse
@@ -48,32 +205,27 @@ def c3d2trc_func(*args):
     except:
         c3d_path = args[0][0] # invoked as a function
         trc_path = c3d_path.replace('.c3d', '.trc')
+    try:
+        precision = args[0]['precision'] # invoked with argparse
+    except:
+        precision = kwargs.get('precision', 6)
+    try:
+        analog = args[0]['analog'] # invoked with argparse
+    except:
+        analog = kwargs.get('analog', False)
+    analog_path = os.path.splitext(trc_path)[0] + ANALOG_EXT if analog else None
         
-    # c3d header
-    reader = c3d.Reader(open(c3d_path, 'rb'))
-    items_header = str(reader.header).split('\n')
-    items_header_list = [item.strip().split(': ') for item in items_header]
-    label_item = [item[0] for item in items_header_list]
-    value_item = [item[1] for item in items_header_list]
-    header_c3d = dict(zip(label_item, value_item))
+    # c3d header and data: reads 3D points, and streams analog data to disk if demanded
+    header_c3d, labels, frames, points = read_c3d(c3d_path, cache=kwargs.get('cache', False), analog_path=analog_path)
     
-    # c3d data: reads 3D points (no analog data) and takes off computed data
-    labels = reader.point_labels
-    index_labels_markers = [i for i, s in enumerate(labels) if 'Angle' not in s and 'Power' not in s and 'Force' not in s and 'Moment' not in s and 'GRF' not in s]
+    # takes off computed data
+    index_labels_markers = marker_indices(labels)
     labels_markers = [labels[ind] for ind in index_labels_markers]
     
     # trc header
     header0_str = 'PathFileType\t4\t(X/Y/Z)\t' + trc_path
 
-    header1 = {}
-    header1['DataRate'] = str(int(float(header_c3d['frame_rate'])))
-    header1['NumFrames'] = str(int(header_c3d['last_frame']) - int(header_c3d['first_frame']) + 1)
-    header1['OrigNumFrames'] = header1['NumFrames']
-    header1['CameraRate'] = header1['DataRate']
-    header1['NumMarkers'] = str(len(labels_markers))
-    header1['Units'] = 'm'
-    header1['OrigDataStartFrame'] = header_c3d['first_frame']
-    header1['OrigDataRate'] = header1['DataRate']
+    header1 = trc_header(header_c3d, len(labels_markers))
     header1_str1 = '\t'.join(header1.keys())
     header1_str2 = '\t'.join(header1.values())
 
@@ -82,24 +234,166 @@ def c3d2trc_func(*args):
     
     header_trc = '\n'.join([header0_str, header1_str1, header1_str2, header2_str1, header2_str2])
     
-    with open(trc_path, 'w') as trc_o:
-        trc_o.write(header_trc+'\n')
+    # written to a temporary file first, so that an interrupted conversion never leaves a truncated trc
+    tmp_path = trc_path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as trc_o:
+            trc_o.write(header_trc+'\n')
+        
+        # trc data: computed data filtered out at once as a column mask
+            coords = points[:, index_labels_markers].reshape(len(frames), -1)
+            write_trc_data(trc_o, frames, trc_times(header_c3d)[:len(frames)], coords, precision=precision)
+        os.replace(tmp_path, trc_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return len(frames)
+
+
+def find_c3d(inputs):
+    '''
+    c3d files from a list of files, directories (searched recursively) and glob patterns
+    '''
+    c3d_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                c3d_paths += [os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith('.c3d')]
+        elif glob.has_magic(item):
+            c3d_paths += sorted(f for f in glob.glob(item, recursive=True) if f.lower().endswith('.c3d'))
+        else:
+            c3d_paths += [item]
+    # remove duplicates, keep order
+    seen = set()
+    return [p for p in map(os.path.abspath, c3d_paths) if not (p in seen or seen.add(p))]
+
+
+def _trc_path(c3d_path, output_dir=None):
+    trc_name = os.path.splitext(os.path.basename(c3d_path))[0] + '.trc'
+    return os.path.join(output_dir or os.path.dirname(c3d_path), trc_name)
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest, manifest_path):
+    '''
+    Write manifest atomically, so that an interruption does not corrupt it
+    '''
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def _up_to_date(c3d_path, trc_path, manifest):
+    '''
+    True if the manifest records a successful conversion to trc_path, from this exact c3d or older than the trc
+    Missing or failed entries are converted again, even if a trc exists (it may be left by an interrupted run)
+    '''
+    entry = manifest.get(c3d_path)
+    if entry is None or entry.get('status') != 'done' or entry.get('output') != trc_path or not os.path.isfile(trc_path):
+        return False
+    return entry.get('input') == _fingerprint(c3d_path) or os.path.getmtime(trc_path) >= os.path.getmtime(c3d_path)
+
+
+def _convert_job(job):
+    '''
+    Worker: convert one c3d, never raises
+    Returns c3d path, trc path, number of frames, duration and error message
+    '''
+    c3d_path, trc_path, precision, analog = job
+    t0 = time.time()
+    try:
+        nb_frames = c3d2trc_func({'input': c3d_path, 'output': trc_path, 'precision': precision, 'analog': analog})
+        return c3d_path, trc_path, nb_frames, time.time() - t0, None
+    except Exception as e:
+        return c3d_path, trc_path, 0, time.time() - t0, '%s: %s' % (type(e).__name__, e)
+
+
+def c3d2trc_batch(inputs, output_dir=None, jobs=None, force=False, manifest_path=None, precision=6, analog=False):
+    '''
+    Convert all c3d files from inputs (files, directories, globs) in a process pool of jobs workers
+    With analog=True, analog channels are also written next to each trc file
+    Skips c3d files already converted according to the manifest, if they did not change since (unless force=True)
+    Prints an aggregate throughput summary
+    Returns the manifest dict
+    '''
+    c3d_paths = find_c3d(inputs)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    manifest_path = manifest_path or os.path.join(output_dir or os.getcwd(), MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path)
+    
+    todo, skipped = [], 0
+    for c3d_path in c3d_paths:
+        trc_path = _trc_path(c3d_path, output_dir)
+        if not force and _up_to_date(c3d_path, trc_path, manifest):
+            skipped += 1
+        else:
+            todo += [(c3d_path, trc_path, precision, analog)]
+    
+    jobs = min(jobs or multiprocessing.cpu_count(), max(len(todo), 1))
+    print('%d c3d files: %d to convert, %d up to date (%d workers)' % (len(c3d_paths), len(todo), skipped, jobs))
     
-    # trc data
-        index_data_markers = np.sort(np.concatenate([np.array(index_labels_markers)*3, np.array(index_labels_markers)*3+1, np.array(index_labels_markers)*3+2]))
-        t0 = int(float(header_c3d['first_frame'])) / int(float(header_c3d['frame_rate']))
-        tf = int(float(header_c3d['last_frame'])) / int(float(header_c3d['frame_rate']))
-        trc_time = np.linspace(t0, tf, num=(int(header_c3d['last_frame']) - int(header_c3d['first_frame']) + 1))
-        for n, (i, points, _) in enumerate(list(reader.read_frames())):
-            c3d_line = np.concatenate([item[:3] for item in points])
-            c3d_line_markers = c3d_line[index_data_markers]
-            trc_line = '{i}\t{t}\t'.format(i=i, t=trc_time[n]) + '\t'.join(map(str,c3d_line_markers))
-            trc_o.write(trc_line+'\n')
+    t0 = time.time()
+    nb_frames, nb_bytes, failed = 0, 0, 0
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    try:
+        results = pool.imap_unordered(_convert_job, todo) if pool else map(_convert_job, todo)
+        for n, (c3d_path, trc_path, frames, duration, error) in enumerate(results, 1):
+            if error is None:
+                nb_frames += frames
+                nb_bytes += os.path.getsize(c3d_path)
+                manifest[c3d_path] = {'status': 'done', 'output': trc_path, 'input': _fingerprint(c3d_path), 'frames': frames, 'seconds': round(duration, 3)}
+                print('[%d/%d] %s (%d frames, %.2f s)' % (n, len(todo), trc_path, frames, duration))
+            else:
+                failed += 1
+                manifest[c3d_path] = {'status': 'failed', 'output': trc_path, 'error': error}
+                print('[%d/%d] FAILED %s: %s' % (n, len(todo), c3d_path, error))
+            _save_manifest(manifest, manifest_path)
+    finally:
+        if pool:
+            pool.terminate()
     
+    elapsed = time.time() - t0
+    print('Converted %d files, skipped %d, failed %d in %.1f s' % (len(todo)-failed, skipped, failed, elapsed))
+    if elapsed > 0 and nb_frames:
+        print('Throughput: %.0f frames/s, %.1f MB/s of c3d, %.2f files/s' % (nb_frames/elapsed, nb_bytes/1e6/elapsed, (len(todo)-failed)/elapsed))
+    print('Manifest: ' + manifest_path)
+    return manifest
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input', required = True, help='c3d input file name')
-    parser.add_argument('-o', '--output', required=False, help='trc output file name')
+    parser.add_argument('-i', '--input', required = True, nargs='+', help='c3d input file name(s), folder(s) or glob pattern(s)')
+    parser.add_argument('-o', '--output', required=False, help='trc output file name (single input file only)')
+    parser.add_argument('-p', '--precision', type=int, default=6, help='number of decimals of coordinates')
+    parser.add_argument('-a', '--analog', action='store_true', help='also write analog channels to <trc_file>%s' % ANALOG_EXT)
+    parser.add_argument('-d', '--output_dir', required=False, help='batch mode: trc output folder (default: next to each c3d)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='batch mode: number of worker processes (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true', help='batch mode: convert even if trc files are up to date')
+    parser.add_argument('--manifest', required=False, help='batch mode: manifest file (default: %s in output folder or current folder)' % MANIFEST_NAME)
     args = vars(parser.parse_args())
     
-    c3d2trc_func(args)
\ No newline at end of file
+    inputs = args['input']
+    batch = len(inputs) > 1 or os.path.isdir(inputs[0]) or glob.has_magic(inputs[0]) or args['output_dir'] is not None
+    if not batch:
+        args['input'] = inputs[0]
+        c3d2trc_func(args)
+    elif args['output'] is not None:
+        parser.error('-o/--output only works with a single input file, use -d/--output_dir in batch mode')
+    else:
+        c3d2trc_batch(inputs, output_dir=args['output_dir'], jobs=args['jobs'], force=args['force'], 
+                      manifest_path=args['manifest'], precision=args['precision'], analog=args['analog'])
\ No newline at end of file
@@ -4,10 +4,11 @@
 
 '''
     ##################################################
-    ## Convert c3d files to trc and import them     ##
+    ## Import c3d files                             ##
     ##################################################
     
     /!\ Uses c3d2trc.py
+    Points are read straight from the c3d file. Writing a trc next to it is optional.
     Beware that it only allows you to retrieve 3D points, you won't get analog data from this code. 
     Choose if you only want to display the markers, or also to construct the skeleton.
     
@@ -19,7 +20,7 @@
 
 
 ## INIT
-from c3d2trc import c3d2trc_func
+from c3d2trc import c3d2trc_func, c3d_to_clip
 from maya_trc import *
 import skeletons_config
 from imp import reload
@@ -48,34 +49,39 @@ def print_skeleton():
         
 def c3d_callback(*arg):
     '''
-    Inputs checkbox choices and trc path
-    Converts c3d to trc
-    Reads trc file
+    Inputs c3d path
+    Reads c3d points
     Set markers and skeleon in scene
     '''
     filter = "C3D files (*.c3d);; All Files (*.*)"
     c3d_path = cmds.fileDialog2(fileFilter=filter, dialogStyle=2, cap="Open File", fm=1)[0]
-    trc_path = c3d_path.replace('.c3d', '.trc')
-    
-    c3d2trc_func([c3d_path])
-    
-    _, data = df_from_trc(trc_path)
-    labels, str_cnt, rangeFrames = analyze_data(data)
-    cmds.group(empty=True, name='C3D'+str_cnt)
+    c3d_import_path(c3d_path)
+
+
+def c3d_catalog_callback(*arg):
+    '''
+    Picks c3d files from the catalog of a folder
+    '''
+    catalog_window('c3d', c3d_import_path)
+
+
+def c3d_import_path(c3d_path):
+    '''
+    Inputs checkbox choices
+    Imports c3d points
+    Converts c3d to trc if demanded
+    '''
+    clip = c3d_to_clip(c3d_path, cache=True)
     
     markers_check = cmds.checkBox(markers_box, query=True, value=True)
-    if markers_check == True:
-        set_markers(data, labels, rangeFrames)
-        cmds.group(cmds.ls(labels), n='markers'+str_cnt)
-        cmds.parent('markers'+str_cnt, 'C3D'+str_cnt)
-
     skeleton_check = cmds.checkBox(skeleton_box, query=True, value=True)
     if skeleton_check == True:
-        set_skeleton(data, str_cnt, rangeFrames)
-        cmds.parent(root+str_cnt, 'C3D'+str_cnt)
-        
-    cmds.playbackOptions(minTime=rangeFrames[0], maxTime=rangeFrames[-1])
-    cmds.playbackOptions(playbackSpeed = 1)
+        skel_callback()
+    import_clip(clip, markers=markers_check, skeleton=skeleton_check, group='C3D', skel_root=root if skeleton_check else None)
+    
+    trc_check = cmds.checkBox(trc_box, query=True, value=True)
+    if trc_check == True:
+        c3d2trc_func([c3d_path], cache=True)
 
 
 def skel_callback(*args):
@@ -99,10 +105,12 @@ def c3d_window():
     global markers_box
     global skeleton_box
     global skeleton_choice
+    global trc_box
     
     window = cmds.window(title='Import C3D', width=300)
     cmds.columnLayout( adjustableColumn=True )
     markers_box = cmds.checkBox(label='Display markers', ann='Display markers as locators', value=True)
+    trc_box = cmds.checkBox(label='Also write trc', ann='Convert c3d to a trc file next to it', value=False)
   
     cmds.rowColumnLayout(numberOfColumns=2, columnWidth=[(1,150), (2, 150)])
     skeleton_box = cmds.checkBox(label='Display skeleton', ann='Reconstruct skeleton. Define your custom hierarchy in "skeletons_config.py"', value=True)
@@ -110,12 +118,12 @@ def c3d_window():
     cmds.menuItem(label='body_25b')
     cmds.menuItem(label='body_25')
     cmds.menuItem(label='coco')
-    cmds.menuItem(label='body_135')
     cmds.menuItem(label='custom')
     
     cmds.columnLayout(width=390)
     cmds.rowColumnLayout(numberOfColumns=1, columnWidth=[(1,300)])
-    cmds.button(label='Import c3d', ann='Convert c3d to trc, and import resulting trc', command = c3d_callback)
+    cmds.button(label='Import c3d', ann='Import c3d points', command = c3d_callback)
+    cmds.button(label='Browse catalog', ann='Index a folder and pick c3d files by length, rate or markers', command = c3d_catalog_callback)
     cmds.showWindow(window)
 
 if __name__ == "__main__":
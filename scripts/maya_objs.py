@@ -10,6 +10,7 @@
     Displays a sequence of OBJ files in an "objStreamNode" (uses plug-in `objStreamNode`).
     These OBJ don't need to be coherent in time (e.g. vertex number, etc).
     Assign textures to the meshes.
+    Sequences packed with mesh_sequence.py (.objseq) can be chosen instead of the first OBJ file.
     Uses the plug-in objStreamNode.py
 '''
 
@@ -17,6 +18,7 @@
 ## INIT
 import maya.cmds as cmds
 from maya_utils import *
+from mesh_sequence import is_sequence, SEQUENCE_EXT
 import re
 
 cmds.loadPlugin('objStreamNode')
@@ -40,9 +42,12 @@ def obj_callback(*args):
     Creates objStreamNode
     Assigns texture if demanded
     '''
-    filter = "Obj files (*.obj);; All Files (*.*)"
+    filter = "Obj files (*.obj);; Packed obj sequences (*%s);; All Files (*.*)" % SEQUENCE_EXT
     obj_path = cmds.fileDialog2(fileFilter=filter, dialogStyle=2, cap="Choose the first OBJ file", fm=1)[0]
-    obj_path_seq = re.sub(r'\.[0-9]+\.', '.%05d.', obj_path)
+    if is_sequence(obj_path):
+        obj_path_seq = obj_path # packed sequence, frames are looked up in its index
+    else:
+        obj_path_seq = re.sub(r'\.[0-9]+\.', '.%05d.', obj_path)
     obj_name = increment_name('OBJ')
     
     # Nodes creation and connections
@@ -19,12 +19,17 @@
 ## INIT
 import maya.cmds as cmds
 import numpy as np
-import pandas as pd
-import re
-from anytree import Node, RenderTree
+from anytree import RenderTree
 import skeletons_config
+import motion_clip
+import anim_curves
+from motion_clip import read_trc, skeleton_index, joint_coords
+from anim_curves import build_channels, set_anim_curves
+from maya_utils import catalog_window
 from imp import reload
 reload(skeletons_config)
+reload(motion_clip)
+reload(anim_curves)
 
 
 ## AUTHORSHIP INFORMATION
@@ -38,24 +43,18 @@ __email__ = "contact@david-pagnon.com"
 __status__ = "Development"
 
 
+# Maya attribute and trc axis (Y-up trc -> Maya axes)
+TRC_AXES = [('translateX', 2), ('translateY', 0), ('translateZ', 1)]
+
+
 ## FUNCTIONS
 def df_from_trc(trc_path):
     '''
     Retrieve header and data from trc
+    Kept for compatibility: prefer read_trc, which returns a MotionClip
     '''
-    # DataRate	CameraRate	NumFrames	NumMarkers	Units	OrigDataRate	OrigDataStartFrame	OrigNumFrames
-    df_header = pd.read_csv(trc_path, sep="\t", skiprows=1, header=None, nrows=2, encoding="ISO-8859-1")
-    header = dict(zip(df_header.iloc[0].tolist(), df_header.iloc[1].tolist()))
-    
-    # Label1_X  Label1_Y    Label1_Z    Label2_X    Label2_Y
-    df_lab = pd.read_csv(trc_path, sep="\t", skiprows=3, nrows=1)
-    labels = df_lab.columns.tolist()[2:-1:3]
-    labels_XYZ = np.array([[labels[i]+'_X', labels[i]+'_Y', labels[i]+'_Z'] for i in range(len(labels))], dtype='object').flatten()
-    labels_FTXYZ = np.concatenate((['Frame#','Time'], labels_XYZ))
-    
-    data = pd.read_csv(trc_path, sep="\t", skiprows=5, index_col=False, header=None, names=labels_FTXYZ)
-    
-    return header, data
+    clip = read_trc(trc_path)
+    return clip.header, clip.to_dataframe()
     
     
 def increment_labels(labels):
@@ -74,19 +73,18 @@ def increment_labels(labels):
     return str_cnt, labels_cnt
     
 
-def analyze_data(data):
+def analyze_data(clip):
     '''
     Get frame number, labels, and increment in case of previous imports
+    rangeFrames are the trc frame numbers of the clip (strided if the clip was read with a step)
     '''
-    rangeFrames = range(data['Frame#'].iloc[0], data['Frame#'].iloc[-1]+1)
-    labels_raw = data.columns
-    labels = [labels_raw[2::3][i][:-2] for i in range(len(labels_raw[2::3]))]
-    str_cnt, labels = increment_labels(labels)
+    rangeFrames = clip.frames
+    str_cnt, labels = increment_labels(clip.labels)
     
     return labels, str_cnt, rangeFrames
 
     
-def set_markers(data, labels, rangeFrames):
+def set_markers(clip, labels, rangeFrames):
     '''
     Set markers from trc
     '''
@@ -97,13 +95,10 @@ def set_markers(data, labels, rangeFrames):
             cmds.polySphere(r=.03, sx=20, sy=20, n=labels[j])
         else:
             cmds.instance(labels[0], n=labels[j])
-    # Place markers
-    firstFrame = rangeFrames[0]
-    for i in rangeFrames:
-        for j in range(len(labels)):
-            cmds.setKeyframe(labels[j], t=i, at='translateX', v=data.iloc[i-firstFrame,3*j+2 +2])
-            cmds.setKeyframe(labels[j], t=i, at='translateY', v=data.iloc[i-firstFrame,3*j +2])
-            cmds.setKeyframe(labels[j], t=i, at='translateZ', v=data.iloc[i-firstFrame,3*j+1 +2])
+    # Place markers: one anim curve per channel
+    points = clip.points[:len(rangeFrames)]
+    channels = [(labels[j]+'.'+attr, rangeFrames, points[:,j,axis]) for j in range(len(labels)) for attr, axis in TRC_AXES]
+    set_anim_curves(build_channels(channels))
 
     
 def print_skeleton():
@@ -114,75 +109,132 @@ def print_skeleton():
         print("%s%s" % (pre, node.name))
 
     
-def set_skeleton(data, str_cnt, rangeFrames):
+def set_skeleton(clip, str_cnt, rangeFrames, skel_root=None):
     '''
     Set skeleton from trc
     In case you're not using the model body_25b from openpose, you need to modify the section SKELETON DEFINITION
     If bones are not connecting the joints, uncomment the last line of the function (evaluation manager mode ON)
+    skel_root: skeletons_config hierarchy (default: choice of the trc window)
     '''
     # Create joints
     cmds.select(None)
-    skel_callback()
-    
-    cmds.joint(name = root.name+str_cnt)
-    for _, _, node in RenderTree(root):    
-        if node.name != root.name:
-            cmds.select(node.parent.name+str_cnt)
-            cmds.joint(name = node.name+str_cnt)
-    cmds.select('CHipJ'+str_cnt, hi=True)
-    jointsJ = cmds.ls(sl=1)
-    
-    # Place and orient joints
-    firstFrame = rangeFrames[0]
-    for i in rangeFrames:
-        for j in range(len(jointsJ)): # place joints
-            if j == 0 and not root.name[:-1] in data.columns: #If model has no root, take midpoint of hips
-                RHip, LHip = root.children[0].name[:-1], root.children[1].name[:-1]
-                jointCoordX = np.add(data.loc[i-firstFrame,RHip+'_Z'], data.loc[i-firstFrame,LHip+'_Z']) / 2
-                jointCoordY = np.add(data.loc[i-firstFrame,RHip+'_X'], data.loc[i-firstFrame,LHip+'_X']) / 2
-                jointCoordZ = np.add(data.loc[i-firstFrame,RHip+'_Y'], data.loc[i-firstFrame,LHip+'_Y']) / 2
-            else:
-                jnt =  re.sub(r'[0-9]', '', jointsJ[j])[:-1] # take off numbers + letter J from joint name
-                jointCoordX = data.loc[i-firstFrame,jnt+'_Z']
-                jointCoordY = data.loc[i-firstFrame,jnt+'_X']
-                jointCoordZ = data.loc[i-firstFrame,jnt+'_Y']
-            cmds.move(jointCoordX, jointCoordY, jointCoordZ, jointsJ[j], a=True)
-            cmds.setKeyframe(jointsJ[j], t=i)
-        if i == firstFrame:  # orient joints
-            for j in range(1,len(jointsJ)):
-                cmds.joint(cmds.listRelatives(jointsJ[j], parent=True), e=True, zso=True, oj='xyz', sao='yup')
-                cmds.setKeyframe(jointsJ[j], t=i)
-
-    '''Evaluation mode to DG to make sure bones are connecting the joints (not needed in Maya 2022).
+    if skel_root is None:
+        skel_callback()
+        skel_root = root
+    
+    # Resolve joints to trc markers once
+    names, parents, index = skeleton_index(skel_root, clip.labels)
+    jointsJ = [name+str_cnt for name in names]
+    for j in range(len(jointsJ)):
+        cmds.select(jointsJ[parents[j]] if parents[j] >= 0 else None)
+        cmds.joint(name = jointsJ[j])
+    
+    # Joint trajectories in Maya axes, all joints and frames at once
+    firstFrame = int(rangeFrames[0])
+    coords = joint_coords(clip.points[:len(rangeFrames)], index)[:, :, [axis for _, axis in TRC_AXES]]
+    
+    # Place and orient joints on first frame
+    cmds.currentTime(firstFrame)
+    for j in range(len(jointsJ)):
+        cmds.move(float(coords[0,j,0]), float(coords[0,j,1]), float(coords[0,j,2]), jointsJ[j], a=True)
+    for p in sorted(set(parents[1:])):
+        cmds.joint(jointsJ[p], e=True, zso=True, oj='xyz', sao='yup')
+    
+    # Translations in the (oriented) parent space: local = (world - parent world) . parent_rot^T
+    rots = np.tile(np.eye(3), (len(jointsJ), 1, 1))
+    for j in range(1, len(jointsJ)):
+        rots[j] = np.array(cmds.xform(jointsJ[parents[j]], q=True, ws=True, m=True)).reshape(4,4)[:3,:3]
+    rel = coords - np.where(parents[None,:,None] >= 0, coords[:, parents, :], 0)
+    local = np.einsum('fjk,jlk->fjl', rel, rots)
+    
+    # Key translations: one anim curve per channel
+    channels = [(jointsJ[j]+'.'+attr, rangeFrames, local[:,j,a]) for j in range(len(jointsJ)) for a, (attr, _) in enumerate(TRC_AXES)]
+    set_anim_curves(build_channels(channels))
+
+    '''Evaluation mode to DG to make sure bones are connecting the joints, only before Maya 2022
+    (the parallel evaluation manager is kept otherwise, e.g. for objStreamNode).
     Change it in Windows -> Settings/Preferences -> Preferences -> Animation -> Evaluation mode -> DG'''
-    cmds.evaluationManager(mode="off")
+    if cmds.about(apiVersion=True) < 20220000:
+        cmds.evaluationManager(mode="off")
+
+def import_clip(clip, markers=True, skeleton=True, group='TRC', skel_root=None):
+    '''
+    Set markers and skeleton of a MotionClip in scene
+    Sets playback range to the clip frames
+    '''
+    if len(clip) == 0:
+        cmds.error('No frame to import')
+    labels, str_cnt, rangeFrames = analyze_data(clip)
+    cmds.group(empty=True, name=group+str_cnt)
+    
+    if markers == True:
+        set_markers(clip, labels, rangeFrames)
+        cmds.group(cmds.ls(labels), n='markers'+str_cnt)
+        cmds.parent('markers'+str_cnt, group+str_cnt)
+
+    if skeleton == True:
+        if skel_root is None:
+            skel_callback()
+            skel_root = root
+        set_skeleton(clip, str_cnt, rangeFrames, skel_root=skel_root)
+        cmds.parent(skel_root.name+str_cnt, group+str_cnt)
+        
+    cmds.playbackOptions(minTime=int(rangeFrames[0]), maxTime=int(rangeFrames[-1]))
+    cmds.playbackOptions(playbackSpeed = 1)
+
+
+def import_trc(trc_path, markers=True, skeleton=True, start=None, end=None, step=1, group='TRC', skel_root=None):
+    '''
+    Reads frames start to end of trc file, every step frames
+    Set markers and skeleton in scene
+    skel_root: root of the skeleton (e.g. skeletons_config.root_body_25), None for the choice of the trc window
+    Sets playback range to the imported window
+    '''
+    clip = read_trc(trc_path, start=start, end=end, step=step, cache=True)
+    if len(clip) == 0:
+        cmds.error('No frame between {} and {} in {}'.format(start, end, trc_path))
+    import_clip(clip, markers=markers, skeleton=skeleton, group=group, skel_root=skel_root)
+    
+    return clip
+
+
+def window_range():
+    '''
+    Start frame, end frame and stride from window (0 for first or last frame)
+    '''
+    start = cmds.intField(start_field, query=True, value=True)
+    end = cmds.intField(end_field, query=True, value=True)
+    step = cmds.intField(step_field, query=True, value=True)
+    return (start if start > 0 else None), (end if end > 0 else None), step
+
 
 def trc_callback(*arg):
     '''
-    Inputs checkbox choices and trc path
+    Inputs trc path
     Reads trc file
     Set markers and skeleon in scene
     '''
     filter = "Trc files (*.trc);; All Files (*.*)"
     trc_path = cmds.fileDialog2(fileFilter=filter, dialogStyle=2, cap="Open File", fm=1)[0]
-    
-    _, data = df_from_trc(trc_path)
-    labels, str_cnt, rangeFrames = analyze_data(data)
-    cmds.group(empty=True, name='TRC'+str_cnt)
-    
-    markers_check = cmds.checkBox(markers_box, query=True, value=True)
-    if markers_check == True:
-        set_markers(data, labels, rangeFrames)
-        cmds.group(cmds.ls(labels), n='markers'+str_cnt)
-        cmds.parent('markers'+str_cnt, 'TRC'+str_cnt)
+    trc_import_path(trc_path)
 
+
+def catalog_callback(*arg):
+    '''
+    Picks trc files from the catalog of a folder
+    '''
+    catalog_window('trc', trc_import_path)
+
+
+def trc_import_path(trc_path):
+    '''
+    Inputs checkbox choices and frame range
+    Imports trc file
+    '''
+    markers_check = cmds.checkBox(markers_box, query=True, value=True)
     skeleton_check = cmds.checkBox(skeleton_box, query=True, value=True)
-    if skeleton_check == True:
-        set_skeleton(data, str_cnt, rangeFrames)
-        cmds.parent(root.name+str_cnt, 'TRC'+str_cnt)
-        
-    cmds.playbackOptions(minTime=rangeFrames[0], maxTime=rangeFrames[-1])
-    cmds.playbackOptions(playbackSpeed = 1)
+    start, end, step = window_range()
+    import_trc(trc_path, markers=markers_check, skeleton=skeleton_check, start=start, end=end, step=step)
     
 
 def skel_callback(*args):
@@ -206,6 +258,9 @@ def trc_window():
     global markers_box
     global skeleton_box
     global skeleton_choice
+    global start_field
+    global end_field
+    global step_field
     
     window = cmds.window(title='Import TRC', width=300)
     cmds.columnLayout(adjustableColumn=True)
@@ -218,12 +273,22 @@ def trc_window():
     cmds.menuItem(label='body_25')
     cmds.menuItem(label='coco')
     cmds.menuItem(label='mpi')
-    cmds.menuItem(label='body_135')
     cmds.menuItem(label='custom')
     
+    cmds.setParent('..')
+    cmds.rowColumnLayout(numberOfColumns=6, columnWidth=[(1,35), (2,60), (3,30), (4,60), (5,40), (6,40)])
+    cmds.text(label='Start')
+    start_field = cmds.intField(value=0, minValue=0, ann='First frame to import (0: first frame of the trc)')
+    cmds.text(label='End')
+    end_field = cmds.intField(value=0, minValue=0, ann='Last frame to import (0: last frame of the trc)')
+    cmds.text(label='Stride')
+    step_field = cmds.intField(value=1, minValue=1, ann='Import every n frames')
+    cmds.setParent('..')
+    
     cmds.columnLayout(width=390)
     cmds.rowColumnLayout(numberOfColumns=1, columnWidth=[(1,300)])
     cmds.button(label='Import trc', ann='Import and display trc', command = trc_callback)
+    cmds.button(label='Browse catalog', ann='Index a folder and pick trc files by length, rate or markers', command = catalog_callback)
     cmds.showWindow(window)
 
 if __name__ == "__main__":
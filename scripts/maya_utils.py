@@ -11,6 +11,7 @@
     - increment name to deal with some collisions in Maya names attributions.
     - rename images to make Maya recognize them as a sequence.
     - apply texture to object.
+    - browse the trial catalog of a folder.
 '''
 
 
@@ -23,6 +24,7 @@ import os
 import glob
 import sys
 import re
+import trial_catalog
 
 
 ## AUTHORSHIP INFORMATION
@@ -118,3 +120,46 @@ def retrieveCal(path):
         P[cam] = Kh.dot(H)
         
     return S, D, K, R, T, P
+
+
+def catalog_window(kind, import_command):
+    '''
+    Lets you pick a trial from the catalog of a folder instead of browsing files blind.
+    The catalog is updated first (only new or modified files are scanned).
+    kind: 'trc', 'c3d' or 'bvh'
+    import_command: function called with the path of the selected trial
+    '''
+    folder = cmds.fileDialog2(dialogStyle=2, cap="Choose the folder to index", fm=3)
+    if not folder:
+        return
+    db_path, scanned, unchanged = trial_catalog.update_catalog(folder[0])
+    print('Catalog {}: {} files scanned, {} unchanged'.format(db_path, scanned, unchanged))
+    
+    def refresh(*args):
+        name = cmds.textField(name_field, query=True, text=True)
+        marker = cmds.textField(marker_field, query=True, text=True)
+        min_frames = cmds.intField(frames_field, query=True, value=True)
+        trials[:] = trial_catalog.query_trials(db_path, kind=kind, name=name, marker=marker, min_frames=min_frames)
+        cmds.textScrollList(trial_list, edit=True, removeAll=True)
+        cmds.textScrollList(trial_list, edit=True, append=[trial_catalog.describe(t) for t in trials])
+    
+    def import_selected(*args):
+        selected = cmds.textScrollList(trial_list, query=True, selectIndexedItem=True)
+        for i in selected or []:
+            import_command(trials[i-1]['path'])
+    
+    trials = []
+    window = cmds.window(title='{} catalog: {}'.format(kind.upper(), folder[0]), width=450)
+    cmds.columnLayout(adjustableColumn=True)
+    cmds.rowColumnLayout(numberOfColumns=6, columnWidth=[(1,40), (2,110), (3,50), (4,110), (5,70), (6,60)])
+    cmds.text(label='Name')
+    name_field = cmds.textField(changeCommand=refresh, ann='Only trials whose name contains this')
+    cmds.text(label='Marker')
+    marker_field = cmds.textField(changeCommand=refresh, ann='Only trials with this marker (or joint)')
+    cmds.text(label='Min frames')
+    frames_field = cmds.intField(value=0, minValue=0, changeCommand=refresh)
+    cmds.setParent('..')
+    trial_list = cmds.textScrollList(allowMultiSelection=True, height=300, doubleClickCommand=import_selected)
+    cmds.button(label='Import selected', command=import_selected)
+    cmds.showWindow(window)
+    refresh()
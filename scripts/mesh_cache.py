@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## In-memory cache of parsed obj frames         ##
+    ##################################################
+
+    Keeps the meshes parsed by obj_parser in memory, shared by all objStreamNode nodes of a Maya session,
+    so that scrubbing back to a frame, or two nodes streaming the same sequence, do not read it again.
+    Independent from Maya, and thread-safe: nodes evaluated in parallel and prefetch threads share it.
+
+    Entries are keyed by (resolved file path, modification time).
+    The cache is size-capped, least recently used meshes are evicted first.
+    A file is checked again for modification at most every STAT_INTERVAL seconds.
+
+    Size cap in MB: MAYA_MOCAP_MESH_CACHE_SIZE environment variable (default 2048, 0 disables the cache),
+    or cacheSize attribute of objStreamNode.
+
+    Usage:
+    import mesh_cache
+    mesh = mesh_cache.get_mesh('<your_obj_file>.obj')
+    mesh_cache.cache_info() # {'hits': .., 'misses': .., 'evictions': .., 'entries': .., 'size_MB': .., 'size_cap_MB': ..}
+'''
+
+
+## INIT
+import os
+import time
+import threading
+from collections import OrderedDict
+from obj_parser import read_obj, ObjMesh
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+STAT_INTERVAL = 5. # seconds during which a cached file is not checked for modification again
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_meshes = OrderedDict() # resolved path: [mtime, last check, mesh], least recently used first
+_real_paths = {}
+_size = [0]
+_size_cap = [None] # None: environment variable
+_lock = threading.RLock()
+
+
+## FUNCTIONS
+def cache_size_cap():
+    '''
+    Cache size cap in bytes
+    '''
+    if _size_cap[0] is not None:
+        return _size_cap[0]
+    return int(float(os.environ.get('MAYA_MOCAP_MESH_CACHE_SIZE', 2048)) * 1e6)
+
+
+def set_cache_size(size_MB):
+    '''
+    Set the cache size cap in MB (None or negative: back to the environment variable), and evict if needed
+    '''
+    with _lock:
+        _size_cap[0] = None if size_MB is None or size_MB < 0 else int(size_MB * 1e6)
+        evict()
+
+
+def real_path(path):
+    '''
+    Resolved path (symbolic links, relative paths), remembered for the session
+    '''
+    with _lock:
+        resolved = _real_paths.get(path)
+    if resolved is None:
+        resolved = os.path.realpath(path)
+        with _lock:
+            _real_paths[path] = resolved
+    return resolved
+
+
+def file_mtime(path):
+    '''
+    Modification time of path, None if it does not exist
+    '''
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def evict(size_cap=None):
+    '''
+    Remove least recently used meshes until the cache fits in size_cap bytes
+    '''
+    size_cap = cache_size_cap() if size_cap is None else size_cap
+    with _lock:
+        while _meshes and _size[0] > size_cap:
+            _, (_, _, mesh) = _meshes.popitem(last=False)
+            _size[0] -= mesh.nbytes
+            stats['evictions'] += 1
+
+
+def lookup(path):
+    '''
+    Cached mesh of path, or None if it is not cached or the file changed
+    Does not count hits and misses
+    The file is checked outside of the lock, so that a slow file system does not block other readers
+    '''
+    key = real_path(path)
+    with _lock:
+        entry = _meshes.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if now - entry[1] <= STAT_INTERVAL:
+            _meshes.move_to_end(key)
+            return entry[2]
+    mtime = file_mtime(key)
+    with _lock:
+        if _meshes.get(key) is not entry: # replaced or evicted meanwhile
+            return None
+        if mtime != entry[0]:
+            del _meshes[key]
+            _size[0] -= entry[2].nbytes
+            return None
+        entry[1] = now
+        _meshes.move_to_end(key)
+        return entry[2]
+
+
+def store(path, mesh, mtime=None):
+    '''
+    Add a mesh parsed from path to the cache, and evict old meshes if the cache is too large
+    mtime: modification time of the file when it was read
+    '''
+    size_cap = cache_size_cap()
+    if mesh.nbytes > size_cap:
+        return
+    key = real_path(path)
+    with _lock:
+        previous = _meshes.pop(key, None)
+        if previous is not None:
+            _size[0] -= previous[2].nbytes
+        _meshes[key] = [file_mtime(key) if mtime is None else mtime, time.time(), mesh]
+        _size[0] += mesh.nbytes
+        evict(size_cap)
+
+
+def get_mesh(path):
+    '''
+    Mesh of an obj file, from the cache or read and cached
+    Missing files give an empty mesh, which is not cached
+    '''
+    mesh = lookup(path)
+    if mesh is not None:
+        with _lock:
+            stats['hits'] += 1
+        return mesh
+    mtime = file_mtime(path)
+    if mtime is None:
+        return ObjMesh.empty()
+    with _lock:
+        stats['misses'] += 1
+    mesh = read_obj(path)
+    store(path, mesh, mtime)
+    return mesh
+
+
+def cache_info():
+    '''
+    Hit/miss statistics of this session, number of meshes and size in memory
+    '''
+    with _lock:
+        info = dict(stats)
+        info['entries'] = len(_meshes)
+        info['size_MB'] = _size[0] / 1e6
+    info['size_cap_MB'] = cache_size_cap() / 1e6
+    return info
+
+
+def clear_cache():
+    '''
+    Remove all meshes and reset statistics
+    '''
+    with _lock:
+        _meshes.clear()
+        _real_paths.clear()
+        _size[0] = 0
+        for k in stats:
+            stats[k] = 0
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Levels of detail of obj sequences            ##
+    ##################################################
+
+    Generates decimated versions of each frame of an obj sequence (by default 50%, 10% and 2% of the faces),
+    in a pool of processes. Independent from Maya.
+    Meshes are decimated by vertex clustering: vertices are merged on a regular grid whose cell size is
+    searched to reach the wanted number of triangles. Uvs of the remaining face corners are kept.
+    Frames which share their topology are decimated with the same clusters, so that levels of detail keep
+    a stable topology too (objStreamNode then only updates their points).
+
+    Levels are written beside the source (model_%05d.obj -> model_%05d.lod1.obj, .lod2.obj..),
+    or with --pack, in a .objseq container along with the full resolution frames (see mesh_sequence.py).
+    Choose the level to stream with the lod attribute of objStreamNode (batch renders always use full resolution).
+
+    Usage:
+    python mesh_lod.py -i <folder>/model_%05d.obj
+    python mesh_lod.py -i <folder>/model_00001.obj -f 0.5 0.1 0.02 -j 8 --pack
+'''
+
+
+## INIT
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from obj_parser import read_obj, write_obj, ObjMesh
+from mesh_sequence import sequence_format, sequence_files, lod_format, container_path, write_sequence
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+LOD_FRACTIONS = [0.5, 0.1, 0.02] # fraction of triangles kept at levels 1, 2, 3
+SEARCH_STEPS = 12 # bisection steps of the cell size
+
+
+## FUNCTIONS
+def triangles(mesh):
+    '''
+    Fan triangulation of the faces: vertex indices (triangles, 3) and uv indices (triangles, 3) or None
+    '''
+    counts = mesh.face_counts.astype(np.int64)
+    nb_tris = np.maximum(counts - 2, 0)
+    first = np.cumsum(counts) - counts
+    face_first = np.repeat(first, nb_tris)
+    k = np.arange(nb_tris.sum()) - np.repeat(np.cumsum(nb_tris) - nb_tris, nb_tris) # triangle rank in its face
+    corners = np.column_stack([face_first, face_first + k + 1, face_first + k + 2])
+    return mesh.vertex_ids[corners], None if mesh.uv_ids is None else mesh.uv_ids[corners]
+
+
+def _clusters(positions, cell):
+    '''
+    Cluster index of each vertex on a grid of cell size
+    '''
+    q = np.floor((positions - positions.min(axis=0)) / cell).astype(np.int64)
+    dims = q.max(axis=0) + 1
+    keys = (q[:, 0] * dims[1] + q[:, 1]) * dims[2] + q[:, 2]
+    _, clusters = np.unique(keys, return_inverse=True)
+    return clusters.ravel()
+
+
+def _kept(clusters, tris):
+    '''
+    Triangles which do not collapse once their vertices are clustered, without duplicates
+    '''
+    ct = clusters[tris]
+    keep = np.flatnonzero((ct[:, 0] != ct[:, 1]) & (ct[:, 1] != ct[:, 2]) & (ct[:, 0] != ct[:, 2]))
+    n = clusters.max() + 1 if len(clusters) else 1
+    st = np.sort(ct[keep], axis=1)
+    _, unique = np.unique((st[:, 0] * n + st[:, 1]) * n + st[:, 2], return_index=True)
+    return keep[np.sort(unique)]
+
+
+def decimation_plan(mesh, fraction):
+    '''
+    Vertex clusters and kept triangles to reach about fraction of the triangles of mesh
+    Returns (topology key, clusters, kept triangles), which applies to all meshes of the same topology
+    '''
+    tris, _ = triangles(mesh)
+    positions = mesh.positions.astype(np.float64)
+    target = fraction * len(tris)
+    if fraction >= 1 or len(tris) == 0:
+        return mesh.topology_key(), np.arange(mesh.nb_vertices), np.arange(len(tris))
+
+    # cell size bisection, in log scale between a tiny cell and the whole bounding box
+    size = np.ptp(positions, axis=0).max() or 1.
+    lo, hi = np.log(size * 1e-5), np.log(size)
+    best = None
+    for _ in range(SEARCH_STEPS):
+        cell = np.exp((lo + hi) / 2)
+        clusters = _clusters(positions, cell)
+        ct = clusters[tris]
+        nb_kept = np.count_nonzero((ct[:, 0] != ct[:, 1]) & (ct[:, 1] != ct[:, 2]) & (ct[:, 0] != ct[:, 2]))
+        if best is None or abs(nb_kept - target) < abs(best[0] - target):
+            best = (nb_kept, cell)
+        if nb_kept > target:
+            lo = np.log(cell)
+        else:
+            hi = np.log(cell)
+    clusters = _clusters(positions, best[1])
+    return mesh.topology_key(), clusters, _kept(clusters, tris)
+
+
+def decimate(mesh, plan):
+    '''
+    Decimated ObjMesh of mesh with a decimation plan (see decimation_plan)
+    Vertices are moved to the mean of their cluster, unused uvs are dropped
+    '''
+    _, clusters, kept = plan
+    tris, uv_tris = triangles(mesh)
+    nb_clusters = clusters.max() + 1 if len(clusters) else 0
+    weights = np.bincount(clusters, minlength=nb_clusters).astype(np.float64)
+    positions = np.column_stack([np.bincount(clusters, mesh.positions[:, a], minlength=nb_clusters) for a in range(3)])
+    positions /= np.maximum(weights, 1)[:, np.newaxis]
+
+    # only clusters (and uvs) used by the kept triangles
+    used, vertex_ids = np.unique(clusters[tris[kept]], return_inverse=True)
+    uvs, uv_ids = np.empty((0, 2)), None
+    if uv_tris is not None:
+        used_uvs, uv_ids = np.unique(uv_tris[kept], return_inverse=True)
+        uvs, uv_ids = mesh.uvs[used_uvs], uv_ids.ravel()
+    return ObjMesh(positions[used], uvs, np.full(len(kept), 3), vertex_ids.ravel(), uv_ids)
+
+
+def _topology_job(frames):
+    '''
+    Worker: topology key of consecutive frames (None if a file cannot be read)
+    '''
+    keys = []
+    for frame, obj_path in frames:
+        try:
+            keys += [(frame, read_obj(obj_path).topology_key())]
+        except Exception:
+            keys += [(frame, None)]
+    return keys
+
+
+def _plan_job(job):
+    '''
+    Worker: decimation plans of all levels, from one frame of a topology
+    '''
+    obj_path, fractions = job
+    mesh = read_obj(obj_path)
+    return mesh.topology_key(), [decimation_plan(mesh, fraction) for fraction in fractions]
+
+
+def _lod_job(job):
+    '''
+    Worker: levels of detail of consecutive frames, never raises
+    plans: {topology key: [plan of each level]}, shared by all tasks so that levels keep the same topology
+    across chunks. Frames of another topology (file changed meanwhile) get their own plans
+    Returns (frame, level, mesh or None, error) tuples. Meshes are only sent back when packing
+    '''
+    frames, fname_format, fractions, plans, pack = job
+    results = []
+    for frame, obj_path in frames:
+        try:
+            mesh = read_obj(obj_path)
+            if pack:
+                results += [(frame, 0, mesh, None)]
+            key = mesh.topology_key()
+            if key not in plans:
+                plans[key] = [decimation_plan(mesh, fraction) for fraction in fractions]
+            for level, plan in enumerate(plans[key], 1):
+                lod = decimate(mesh, plan)
+                if pack:
+                    results += [(frame, level, lod, None)]
+                else:
+                    write_obj(lod_format(fname_format, level) % frame, lod)
+                    results += [(frame, level, None, None)]
+        except Exception as e:
+            results += [(frame, None, None, '%s: %s' % (type(e).__name__, e))]
+    return results
+
+
+def make_lods(fname_format, fractions=LOD_FRACTIONS, jobs=None, pack=False, out_path=None, chunk_size=10):
+    '''
+    Generate levels of detail of the obj files of a sequence (e.g. model_%05d.obj, or one of its files)
+    in a pool of jobs processes (default: number of CPUs), chunk_size consecutive frames per task
+    Level n keeps about fractions[n-1] of the triangles.
+    A first pass lists the topologies of the sequence, and one plan per topology is made from its first frame,
+    so that all frames of a topology give the same decimated topology.
+    Written beside the source files, or with pack=True into a container with the full resolution frames
+    Returns the container path with pack=True, or the formats of the levels
+    '''
+    fname_format = sequence_format(fname_format)
+    obj_files = sequence_files(fname_format)
+    if not obj_files:
+        raise ValueError('No file found for %s' % fname_format)
+    chunks = [obj_files[c:c+chunk_size] for c in range(0, len(obj_files), chunk_size)]
+    jobs = min(jobs or multiprocessing.cpu_count(), len(chunks))
+    print('%d obj files: %d levels of detail (%s) with %d workers' % (len(obj_files), len(fractions),
+          ', '.join('%g%%' % (f*100) for f in fractions), jobs))
+
+    t0 = time.time()
+    errors = []
+    def meshes(results):
+        for chunk in results:
+            for frame, level, mesh, error in chunk:
+                if error is not None:
+                    errors.append((frame, error))
+                    print('FAILED frame %d: %s' % (frame, error))
+                elif mesh is not None:
+                    yield frame, mesh, level
+
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    try:
+        pmap = pool.map if pool else lambda func, tasks: list(map(func, tasks))
+        # first pass: one plan per topology, from its first frame
+        keys = [dict(chunk_keys) for chunk_keys in pmap(_topology_job, chunks)]
+        first_frames = {}
+        for chunk, chunk_keys in zip(chunks, keys):
+            for frame, obj_path in chunk:
+                if chunk_keys[frame] is not None:
+                    first_frames.setdefault(chunk_keys[frame], obj_path)
+        plans = dict(pmap(_plan_job, [(obj_path, list(fractions)) for obj_path in first_frames.values()]))
+        print('%d topologies' % len(plans))
+
+        tasks = [(chunk, fname_format, list(fractions), {k: plans[k] for k in set(chunk_keys.values()) if k in plans}, pack)
+                 for chunk, chunk_keys in zip(chunks, keys)]
+        results = pool.imap(_lod_job, tasks) if pool else map(_lod_job, tasks)
+        if pack:
+            out_path = out_path or container_path(fname_format)
+            write_sequence(out_path, meshes(results))
+        else:
+            for _ in meshes(results):
+                pass
+    finally:
+        if pool:
+            pool.terminate()
+
+    print('%d frames done in %.1f s, %d failed' % (len(obj_files) - len(errors), time.time() - t0, len(errors)))
+    if pack:
+        print('Container: ' + out_path)
+        return out_path
+    return [lod_format(fname_format, level) for level in range(1, len(fractions)+1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=True, help='obj sequence: format (e.g. model_%%05d.obj) or any of its files')
+    parser.add_argument('-f', '--fractions', type=float, nargs='+', default=LOD_FRACTIONS, help='fraction of faces kept at each level (default: 0.5 0.1 0.02)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--pack', action='store_true', help='write levels into a .objseq container along with the full resolution frames')
+    parser.add_argument('-o', '--output', required=False, help='container file name with --pack (default: <sequence name>.objseq in the same folder)')
+    args = vars(parser.parse_args())
+
+    make_lods(args['input'], fractions=args['fractions'], jobs=args['jobs'], pack=args['pack'], out_path=args['output'])
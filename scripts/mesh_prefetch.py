@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Read-ahead of obj frames                     ##
+    ##################################################
+
+    Reads and parses the next frames of an obj sequence in a pool of worker threads,
+    into the mesh_cache, while the current frame is displayed.
+    Used by objStreamNode: frames index+1 .. index+N are requested when playing forward,
+    index-1 .. index-N when playing backward.
+    Frames requested and not started yet are dropped when the window of their owner (e.g. a node) moves on,
+    unless another owner still wants them. The pool has as many threads as the largest request of all owners.
+    Independent from Maya.
+
+    Usage:
+    import mesh_prefetch
+    mesh_prefetch.prefetch(['model_00002.obj', 'model_00003.obj'], threads=2, owner='objStreamNode1')
+    mesh = mesh_prefetch.get_mesh('model_00002.obj') # only waits if the frame is still being read
+    mesh_prefetch.prefetch_info() # {'prefetched': .., 'waits': .., 'dropped': ..}
+'''
+
+
+## INIT
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import mesh_cache
+from obj_parser import read_obj
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+stats = {'prefetched': 0, 'waits': 0, 'dropped': 0}
+_pool = [None, 0] # executor, number of threads
+_pending = {} # path: future
+_owners = {} # owner: [wanted paths, number of threads]
+_lock = threading.RLock()
+
+
+## FUNCTIONS
+def _executor(threads):
+    '''
+    Shared pool of threads, created again if the number of threads changes
+    (pending reads are kept, they run on the former pool)
+    '''
+    with _lock:
+        if _pool[0] is None or _pool[1] != threads:
+            if _pool[0] is not None:
+                _pool[0].shutdown(wait=False)
+            _pool[0] = ThreadPoolExecutor(max_workers=threads)
+            _pool[1] = threads
+        return _pool[0]
+
+
+def _load(path):
+    '''
+    Worker: read and cache one frame, never raises
+    '''
+    try:
+        if mesh_cache.lookup(path) is None:
+            mtime = mesh_cache.file_mtime(path)
+            if mtime is not None:
+                mesh_cache.store(path, read_obj(path), mtime)
+                with _lock:
+                    stats['prefetched'] += 1
+    except Exception:
+        pass
+    finally:
+        with _lock:
+            _pending.pop(path, None)
+
+
+def prefetch(paths, threads=2, owner=None):
+    '''
+    Read paths in the background, in this order, unless they are cached or being read
+    Pending reads previously requested by owner and not wanted anymore (by any owner) are dropped
+    threads: threads wanted by owner, the pool is sized for the largest request
+    '''
+    if threads < 1 or mesh_cache.cache_size_cap() <= 0:
+        paths, threads = [], 0
+    paths = [p for p in paths if mesh_cache.lookup(p) is None]
+    with _lock:
+        stale = _owners[owner][0] - set(paths) if owner in _owners else set()
+        if paths:
+            _owners[owner] = [set(paths), threads]
+        else:
+            _owners.pop(owner, None)
+        wanted = set().union(*[w for w, _ in _owners.values()])
+        for path in stale - wanted:
+            future = _pending.get(path)
+            if future is not None and future.cancel():
+                del _pending[path]
+                stats['dropped'] += 1
+        if not paths:
+            return
+        executor = _executor(max(t for _, t in _owners.values()))
+        for path in paths:
+            if path not in _pending:
+                _pending[path] = executor.submit(_load, path)
+
+
+def get_mesh(path):
+    '''
+    Mesh of an obj file, waiting for its read if it was prefetched and is not finished
+    '''
+    with _lock:
+        future = _pending.get(path)
+    if future is not None and not future.done():
+        with _lock:
+            stats['waits'] += 1
+        try:
+            future.result()
+        except Exception: # cancelled meanwhile
+            pass
+    return mesh_cache.get_mesh(path)
+
+
+def window(index, last_index, size):
+    '''
+    Frame indices to prefetch after index (before it when playing backward, i.e. index < last_index)
+    '''
+    step = -1 if last_index is not None and index < last_index else 1
+    return [index + step*i for i in range(1, size+1)]
+
+
+def prefetch_info():
+    '''
+    Number of frames prefetched, waited for and dropped in this session
+    '''
+    with _lock:
+        return dict(stats, pending=len(_pending), threads=_pool[1], owners=len(_owners))
+
+
+def release(owner):
+    '''
+    Drop the pending reads of owner which no other owner wants
+    '''
+    prefetch([], 0, owner)
+
+
+def shutdown():
+    '''
+    Drop pending reads and stop the threads
+    '''
+    with _lock:
+        for future in _pending.values():
+            future.cancel()
+        _pending.clear()
+        _owners.clear()
+        if _pool[0] is not None:
+            _pool[0].shutdown(wait=False)
+        _pool[0], _pool[1] = None, 0
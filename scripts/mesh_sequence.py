@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Binary obj sequence container                ##
+    ##################################################
+
+    Packs a sequence of obj files (e.g. model_%05d.obj) into one binary file (.objseq),
+    which objStreamNode memory-maps instead of parsing text: a frame is a set of array views
+    into the file, with no copy.
+    Frames are parsed in parallel processes. Independent from Maya.
+
+    File layout (little-endian):
+    - header: magic, version, number of frames, offset of the frame index
+    - frame blocks, each array aligned on 16 bytes: positions (float32, vertices*3), uvs (float32, uvs*2),
+      face counts (int32), vertex indices (int32), uv indices (int32, if any)
+    - frame index (int64, frames*8): frame number, block offset, vertices, uvs, faces, face vertices, has uv indices,
+      level of detail (0: full resolution, see mesh_lod.py. Absent in version 1 files)
+
+    Usage:
+    python mesh_sequence.py -i <folder>/model_%05d.obj
+    python mesh_sequence.py -i <folder>/model_00001.obj -o <folder>/model.objseq -j 8
+    from mesh_sequence import MeshSequence
+    mesh = MeshSequence('<folder>/model.objseq').frame(12)
+'''
+
+
+## INIT
+import os
+import re
+import time
+import struct
+import argparse
+import threading
+import multiprocessing
+import numpy as np
+from obj_parser import read_obj, ObjMesh
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+SEQUENCE_EXT = '.objseq'
+MAGIC = b'MOBJSEQ\x00'
+SEQUENCE_VERSION = 2 # 2: level of detail column
+HEADER = struct.Struct('<8sIIQ') # magic, version, number of frames, index offset
+INDEX_COLUMNS = 8 # frame, offset, vertices, uvs, faces, face vertices, has uv indices, level of detail
+LOD_SUFFIX = '.lod%d' # level of detail files: model_%05d.lod1.obj
+ALIGN = 16
+STAT_INTERVAL = 5. # seconds during which an open container is not checked for modification again
+RANGE_MODES = ['none', 'clamp', 'loop', 'pingPong'] # outside of start..end: as is, held, looped, back and forth
+_sequences = {} # resolved path: [mtime, last check, MeshSequence]
+_listings = {} # sequence format: sorted frame numbers
+_lock = threading.Lock()
+
+
+## CLASSES
+class MeshSequence(object):
+    '''
+    Memory-mapped .objseq container
+    frames: int array of the frame numbers it holds
+    levels: int array of the levels of detail it holds (0: full resolution)
+    frame(n, lod): ObjMesh of frame n, whose arrays are views into the file (empty mesh if n is not in the container)
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, nb_frames, index_offset = HEADER.unpack_from(self._data[:HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError('Not an obj sequence container: %s' % path)
+        if version > SEQUENCE_VERSION:
+            raise ValueError('%s was written by a newer version (%d)' % (path, version))
+        columns = INDEX_COLUMNS if version > 1 else INDEX_COLUMNS - 1
+        index_size = nb_frames * columns * 8
+        self.index = self._data[index_offset:index_offset+index_size].view('<i8').reshape(nb_frames, columns)
+        lods = self.index[:, 7] if version > 1 else np.zeros(nb_frames, dtype=np.int64)
+        self.frames = np.unique(self.index[:, 0])
+        self.levels = np.unique(lods)
+        self._rows = dict(((int(f), int(l)), r) for r, (f, l) in enumerate(zip(self.index[:, 0], lods)))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, frame):
+        return (frame, 0) in self._rows
+
+    def __repr__(self):
+        return 'MeshSequence(%s, frames=%d)' % (self.path, len(self))
+
+    def frame(self, frame, lod=0):
+        '''
+        Mesh of frame at level of detail lod, or at the closest finer level held for this frame
+        '''
+        for level in range(lod, -1, -1):
+            row = self._rows.get((frame, level))
+            if row is not None:
+                break
+        else:
+            return ObjMesh.empty()
+        _, offset, nb_vertices, nb_uvs, nb_faces, nb_face_vertices, has_uv_ids = self.index[row].tolist()[:7]
+        arrays = []
+        for dtype, count in (('<f4', nb_vertices*3), ('<f4', nb_uvs*2), ('<i4', nb_faces),
+                             ('<i4', nb_face_vertices), ('<i4', nb_face_vertices if has_uv_ids else 0)):
+            arrays.append(self._data[offset:offset+count*4].view(dtype))
+            offset += _padded(count*4)
+        positions, uvs, face_counts, vertex_ids, uv_ids = arrays
+        return ObjMesh(positions, uvs, face_counts, vertex_ids, uv_ids if has_uv_ids else None)
+
+
+## FUNCTIONS
+def _padded(nbytes):
+    return -(-nbytes // ALIGN) * ALIGN
+
+
+def is_sequence(path):
+    '''
+    True if path is an obj sequence container (by its extension)
+    '''
+    return path.lower().endswith(SEQUENCE_EXT)
+
+
+def open_sequence(path):
+    '''
+    MeshSequence of path, kept open for the session and opened again if the file changed
+    '''
+    key = os.path.realpath(path)
+    now = time.time()
+    with _lock:
+        entry = _sequences.get(key)
+        if entry is not None and now - entry[1] <= STAT_INTERVAL:
+            return entry[2]
+        mtime = os.stat(key).st_mtime
+        if entry is None or entry[0] != mtime:
+            entry = _sequences[key] = [mtime, now, MeshSequence(key)]
+        entry[1] = now
+        return entry[2]
+
+
+def sequence_format(path):
+    '''
+    Format of the sequence of an obj file: the last number of its name is replaced by %0Nd
+    Paths which already hold a format are returned as is
+    '''
+    folder, base = os.path.split(path)
+    if re.search(r'%0?\d*d', base):
+        return path
+    numbers = list(re.finditer(r'\d+', base))
+    if not numbers:
+        raise ValueError('No frame number in %s' % path)
+    m = numbers[-1]
+    return os.path.join(folder, base[:m.start()] + '%%0%dd' % len(m.group()) + base[m.end():])
+
+
+def sequence_files(fname_format):
+    '''
+    (frame, path) of the existing files of a sequence like model_%05d.obj, sorted by frame,
+    from one listing of their folder
+    '''
+    folder, base = os.path.split(fname_format)
+    m = re.search(r'%0?\d*d', base)
+    if m is None:
+        raise ValueError('No frame format (e.g. %%05d) in %s' % fname_format)
+    pattern = re.compile('^' + re.escape(base[:m.start()]) + r'(-?\d+)' + re.escape(base[m.end():]) + '$')
+    files = []
+    for name in os.listdir(folder or '.'):
+        match = pattern.match(name)
+        if match and base % int(match.group(1)) == name:
+            files += [(int(match.group(1)), os.path.join(folder, name))]
+    return sorted(files)
+
+
+def available_frames(fname_format, refresh=False):
+    '''
+    Sorted frame numbers of a sequence (format like model_%05d.obj, or .objseq container)
+    Folders are only listed once per session, unless refresh=True
+    '''
+    if is_sequence(fname_format):
+        try:
+            return open_sequence(fname_format).frames
+        except (IOError, OSError, ValueError):
+            return np.empty(0, dtype=np.int64)
+    with _lock:
+        frames = _listings.get(fname_format)
+    if frames is None or refresh:
+        try:
+            frames = np.array([frame for frame, _ in sequence_files(fname_format)], dtype=np.int64)
+        except (OSError, ValueError): # no folder, or no frame format
+            frames = np.empty(0, dtype=np.int64)
+        with _lock:
+            _listings[fname_format] = frames
+    return frames
+
+
+def clear_listings():
+    '''
+    Forget folder listings, e.g. after new frames were written
+    '''
+    with _lock:
+        _listings.clear()
+
+
+def remap_frame(index, frames, offset=0, stride=1, start=0, end=-1, mode='none', hold=False):
+    '''
+    Frame number to display at index (e.g. current time), or None if there is none
+    frames: sorted available frame numbers (see available_frames)
+    frame = index * stride + offset, then brought back between start and end according to mode (RANGE_MODES)
+    (end < start: first and last available frames)
+    hold: a missing frame is replaced by the last available one before it
+    '''
+    frame = index * stride + offset
+    if end < start:
+        if not len(frames):
+            return None
+        start, end = int(frames[0]), int(frames[-1])
+    length = end - start + 1
+    if mode == 'clamp':
+        frame = min(max(frame, start), end)
+    elif mode == 'loop':
+        frame = start + (frame - start) % length
+    elif mode == 'pingPong':
+        period = max(2 * (length - 1), 1)
+        phase = (frame - start) % period
+        frame = start + (phase if phase < length else period - phase)
+
+    i = np.searchsorted(frames, frame, side='right') - 1 # last available frame <= frame
+    if i >= 0 and frames[i] == frame:
+        return frame
+    if hold and i >= 0:
+        return int(frames[i])
+    return None
+
+
+def lod_format(fname_format, lod):
+    '''
+    Format of the level of detail lod of a sequence: model_%05d.obj -> model_%05d.lod1.obj (lod 0: fname_format)
+    '''
+    if lod <= 0:
+        return fname_format
+    root, ext = os.path.splitext(fname_format)
+    return root + LOD_SUFFIX % lod + ext
+
+
+def container_path(fname_format):
+    '''
+    Default container of a sequence: model_%05d.obj -> model.objseq in the same folder
+    '''
+    folder, base = os.path.split(fname_format)
+    return os.path.join(folder, re.sub(r'%0?\d*d', '', os.path.splitext(base)[0]).strip('_.-') or 'sequence') + SEQUENCE_EXT
+
+
+def write_sequence(out_path, frames):
+    '''
+    Write (frame number, ObjMesh) or (frame number, ObjMesh, level of detail) tuples to an obj sequence container
+    Returns the number of meshes written
+    '''
+    index = []
+    with open(out_path, 'wb') as seq_o:
+        seq_o.write(HEADER.pack(MAGIC, SEQUENCE_VERSION, 0, 0))
+        seq_o.write(b'\x00' * (_padded(HEADER.size) - HEADER.size))
+        for item in frames:
+            frame, mesh, lod = item if len(item) > 2 else tuple(item) + (0,)
+            offset = seq_o.tell()
+            has_uv_ids = mesh.uv_ids is not None
+            for array, dtype in ((mesh.positions, '<f4'), (mesh.uvs, '<f4'), (mesh.face_counts, '<i4'),
+                                 (mesh.vertex_ids, '<i4'), (mesh.uv_ids if has_uv_ids else np.empty(0), '<i4')):
+                block = np.ascontiguousarray(array, dtype=dtype).tobytes()
+                seq_o.write(block + b'\x00' * (_padded(len(block)) - len(block)))
+            index += [[frame, offset, mesh.nb_vertices, len(mesh.uvs), mesh.nb_faces, len(mesh.vertex_ids), has_uv_ids, lod]]
+        index_offset = seq_o.tell()
+        seq_o.write(np.array(index, dtype='<i8').reshape(-1, INDEX_COLUMNS).tobytes())
+        seq_o.seek(0)
+        seq_o.write(HEADER.pack(MAGIC, SEQUENCE_VERSION, len(index), index_offset))
+    return len(index)
+
+
+def _read_obj_job(job):
+    '''
+    Worker: parse one obj frame
+    '''
+    frame, obj_path = job
+    return frame, read_obj(obj_path)
+
+
+def _read_speed(obj_files, seq_path, nb_samples=10):
+    '''
+    Seconds per frame to get the arrays of a frame, from obj files and from the container
+    The container arrays are copied, so that their pages are actually read
+    '''
+    samples = [obj_files[i] for i in np.unique(np.linspace(0, len(obj_files)-1, nb_samples).astype(int))]
+    t0 = time.perf_counter()
+    for _, obj_path in samples:
+        read_obj(obj_path)
+    t_obj = (time.perf_counter() - t0) / len(samples)
+    seq = MeshSequence(seq_path)
+    t0 = time.perf_counter()
+    for frame, _ in samples:
+        mesh = seq.frame(frame)
+        for array in (mesh.positions, mesh.uvs, mesh.face_counts, mesh.vertex_ids, mesh.uv_ids):
+            if array is not None:
+                np.array(array)
+    t_seq = (time.perf_counter() - t0) / len(samples)
+    return t_obj, t_seq
+
+
+def pack_sequence(fname_format, out_path=None, jobs=None):
+    '''
+    Pack the obj files of a sequence (e.g. model_%05d.obj, or one of its files) into an .objseq container,
+    parsing them in a pool of jobs processes (default: number of CPUs)
+    Prints the compression ratio and the read speed gain
+    Returns the container path
+    '''
+    fname_format = sequence_format(fname_format)
+    obj_files = sequence_files(fname_format)
+    if not obj_files:
+        raise ValueError('No file found for %s' % fname_format)
+    out_path = out_path or container_path(fname_format)
+
+    jobs = min(jobs or multiprocessing.cpu_count(), len(obj_files))
+    print('%d obj files: packing into %s (%d workers)' % (len(obj_files), out_path, jobs))
+    t0 = time.time()
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    try:
+        frames = pool.imap(_read_obj_job, obj_files, chunksize=1) if pool else map(_read_obj_job, obj_files)
+        write_sequence(out_path, frames)
+    finally:
+        if pool:
+            pool.terminate()
+
+    obj_size = sum(os.path.getsize(obj_path) for _, obj_path in obj_files)
+    seq_size = os.path.getsize(out_path)
+    t_obj, t_seq = _read_speed(obj_files, out_path)
+    print('Packed %d frames in %.1f s' % (len(obj_files), time.time() - t0))
+    print('Size: %.1f MB of obj, %.1f MB packed (compression ratio x%.1f)' % (obj_size/1e6, seq_size/1e6, obj_size/float(seq_size)))
+    print('Read: %.1f ms per obj frame, %.2f ms per packed frame (x%.0f faster)' % (t_obj*1e3, t_seq*1e3, t_obj/max(t_seq, 1e-9)))
+    return out_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input', required=True, help='obj sequence: format (e.g. model_%%05d.obj) or any of its files')
+    parser.add_argument('-o', '--output', required=False, help='container file name (default: <sequence name>%s in the same folder)' % SEQUENCE_EXT)
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    args = vars(parser.parse_args())
+
+    pack_sequence(args['input'], out_path=args['output'], jobs=args['jobs'])
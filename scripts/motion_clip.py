@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Read trc files into arrays                   ##
+    ##################################################
+
+    Single-pass trc reader, independent from Maya.
+    Returns a MotionClip: a contiguous float32 (frames, markers, 3) array,
+    frame and time vectors, marker labels, and the trc header.
+
+    Usage:
+    from motion_clip import read_trc
+    clip = read_trc('<your_trc_file>.trc')
+    clip = read_trc('<your_trc_file>.trc', start=1000, end=5000, step=2)
+    clip.points[:, clip.index('RHip'), :]
+'''
+
+
+## INIT
+import io
+import itertools
+import warnings
+import numpy as np
+import parse_cache
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+CHUNK_SIZE = 10000 # trc rows parsed at once
+TRC_PARSER_VERSION = 1 # increment when read_trc output changes, to invalidate cached files
+
+
+## CLASSES
+class MotionClip(object):
+    '''
+    Marker trajectories of a trial.
+    points: float32 array (frames, markers, 3), in file axis order (X, Y, Z)
+    frames: int array (frames,) of trc frame numbers
+    times: float array (frames,) in seconds
+    labels: list of marker names
+    header: dict of trc header (DataRate, Units, OrigDataStartFrame, etc)
+    '''
+    def __init__(self, points, frames, times, labels, header=None):
+        self.points = np.ascontiguousarray(points, dtype=np.float32)
+        self.frames = np.asarray(frames, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.float64)
+        self.labels = list(labels)
+        self.header = dict(header) if header is not None else {}
+        self._label_ids = dict((l, i) for i, l in enumerate(self.labels))
+
+    def __len__(self):
+        return self.points.shape[0]
+
+    def __repr__(self):
+        return 'MotionClip(frames=%d, markers=%d, rate=%s)' % (len(self), len(self.labels), self.rate)
+
+    @property
+    def rate(self):
+        return self.header.get('DataRate')
+
+    @property
+    def units(self):
+        return self.header.get('Units')
+
+    def index(self, label):
+        '''
+        Marker index of label
+        '''
+        return self._label_ids[label]
+
+    def marker(self, label):
+        '''
+        (frames, 3) trajectory of marker label
+        '''
+        return self.points[:, self._label_ids[label], :]
+
+    def to_cache(self):
+        '''
+        Arrays and metadata for parse_cache
+        '''
+        return {'points': self.points, 'frames': self.frames, 'times': self.times}, {'labels': self.labels, 'header': self.header}
+
+    @classmethod
+    def from_cache(cls, arrays, meta):
+        '''
+        MotionClip from parse_cache arrays and metadata (no copy)
+        '''
+        return cls(arrays['points'], arrays['frames'], arrays['times'], meta['labels'], meta['header'])
+
+    def to_dataframe(self):
+        '''
+        Former df_from_trc layout: Frame#, Time, Label1_X, Label1_Y, Label1_Z, ...
+        '''
+        labels_XYZ = [l+ax for l in self.labels for ax in ('_X', '_Y', '_Z')]
+        data = pd.DataFrame(self.points.reshape(len(self), -1).astype(np.float64), columns=labels_XYZ)
+        data.insert(0, 'Time', self.times)
+        data.insert(0, 'Frame#', self.frames)
+        return data
+
+
+## FUNCTIONS
+def _header_value(value):
+    '''
+    Convert trc header value to int or float when possible
+    '''
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _readline(trc_file):
+    '''
+    Next line of a trc file opened in text or binary mode
+    '''
+    line = trc_file.readline()
+    if isinstance(line, bytes):
+        line = line.decode('ISO-8859-1')
+    return line.rstrip('\r\n')
+
+
+def read_trc_header(trc_file):
+    '''
+    Read the 5 header lines of an open trc file
+    Returns header dict and marker labels
+    '''
+    _readline(trc_file) # PathFileType	4	(X/Y/Z)	path
+    keys = _readline(trc_file).split('\t')
+    values = _readline(trc_file).split('\t')
+    header = dict((k.strip(), _header_value(v.strip())) for k, v in zip(keys, values) if k.strip())
+
+    # Frame#	Time	Label1			Label2
+    labels = [l.strip() for l in _readline(trc_file).split('\t')[2:] if l.strip()]
+    _readline(trc_file) # X1	Y1	Z1	X2
+
+    return header, labels
+
+
+def _parse_rows_numpy(text, ncols):
+    '''
+    Parse data lines into a (rows, ncols) float64 array
+    Tries a bulk parse first, and falls back on a per-line parse when fields are missing
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning) # raised when a field is empty
+        values = np.fromstring(text, dtype=np.float64, sep=' ')
+    rows = [l for l in text.split('\n') if l.strip()]
+    if values.size == len(rows) * ncols:
+        return values.reshape(len(rows), ncols)
+
+    # Missing markers leave empty fields: parse them as nan
+    data = np.full((len(rows), ncols), np.nan)
+    for r, line in enumerate(rows):
+        fields = line.rstrip('\r').split('\t')[:ncols]
+        data[r, :len(fields)] = [float(f) if f.strip() else np.nan for f in fields]
+    return data
+
+
+def _skip_to_frame(trc_file, start):
+    '''
+    Move an open binary trc file to the first data line with frame number >= start
+    Skipped lines are not parsed
+    '''
+    while True:
+        pos = trc_file.tell()
+        line = trc_file.readline()
+        if not line:
+            return
+        field = line.split(b'\t', 1)[0].strip()
+        if field and int(float(field)) >= start:
+            trc_file.seek(pos)
+            return
+
+
+def _iter_chunks(trc_file, ncols, chunk_size):
+    '''
+    Parse the data lines left in an open binary trc file, chunk_size rows at a time
+    Yields frames, times, and (rows, ncols-2) float32 arrays of coordinates
+    Uses the C parser of pandas when available (empty fields are read as nan)
+    '''
+    if pd is None:
+        while True:
+            lines = list(itertools.islice(trc_file, chunk_size))
+            if not lines:
+                return
+            data = _parse_rows_numpy(b''.join(lines).decode('ISO-8859-1'), ncols)
+            yield data[:, 0], data[:, 1], data[:, 2:].astype(np.float32)
+    
+    dtypes = dict((c, np.float32) for c in range(2, ncols))
+    dtypes[0], dtypes[1] = np.float64, np.float64
+    try:
+        reader = pd.read_csv(trc_file, sep='\t', header=None, index_col=False, usecols=range(ncols), dtype=dtypes, 
+                            encoding='ISO-8859-1', chunksize=chunk_size)
+    except pd.errors.EmptyDataError: # no frame left
+        return
+    for df in reader:
+        yield df[0].to_numpy(), df[1].to_numpy(), df.iloc[:, 2:].to_numpy(dtype=np.float32)
+
+
+def read_trc(trc_path, start=None, end=None, step=1, chunk_size=CHUNK_SIZE, cache=False):
+    '''
+    Read trc file in a single pass
+    Only keeps frames start to end (included), every step frames. 
+    The file is streamed by chunks of chunk_size rows, so that only the requested window is held in memory.
+    With cache=True, the result is stored in (or memory-mapped from) the parse_cache folder.
+    Returns a MotionClip
+    '''
+    if step < 1:
+        raise ValueError('step must be >= 1, got %s' % step)
+    if cache:
+        options = {'start': start, 'end': end, 'step': step}
+        parse = lambda: read_trc(trc_path, start, end, step, chunk_size).to_cache()
+        return MotionClip.from_cache(*parse_cache.cached(trc_path, 'trc', TRC_PARSER_VERSION, parse, options))
+    
+    frames, times, coords = [], [], []
+    with io.open(trc_path, 'rb') as trc_file:
+        header, labels = read_trc_header(trc_file)
+        if start is not None:
+            _skip_to_frame(trc_file, start)
+        for f, t, c in _iter_chunks(trc_file, 2 + 3*len(labels), chunk_size):
+            if start is None and len(f):
+                start = int(f[0])
+            keep = (f >= start) & ((f - start) % step == 0)
+            if end is not None:
+                keep &= f <= end
+            frames += [f[keep]]
+            times += [t[keep]]
+            coords += [c[keep]]
+            if end is not None and len(f) and f[-1] >= end:
+                break
+    
+    if not frames:
+        frames, times, coords = [np.empty(0)], [np.empty(0)], [np.empty((0, 3*len(labels)), dtype=np.float32)]
+    coords = np.concatenate(coords)
+    points = coords.reshape(len(coords), len(labels), 3)
+    return MotionClip(points, np.concatenate(frames), np.concatenate(times), labels, header)
+
+
+def skeleton_index(root, labels):
+    '''
+    Resolve each joint of a skeletons_config hierarchy to marker indices, once
+    Joint name = marker label + letter J. A root without marker takes the midpoint of its first two children (hips).
+    Returns joint names in hierarchy order (parents first), parent index of each joint (-1 for root), 
+    and a (joints, 2) array of the 2 markers to average for each joint (twice the same for real markers)
+    '''
+    label_ids = dict((l, i) for i, l in enumerate(labels))
+    names, parents, index = [], [], []
+    stack = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        label = node.name[:-1]
+        if label in label_ids:
+            index += [[label_ids[label]]*2]
+        elif parent == -1 and len(node.children) >= 2: # If model has no root, take midpoint of hips
+            index += [[label_ids[node.children[0].name[:-1]], label_ids[node.children[1].name[:-1]]]]
+        else:
+            raise KeyError('No marker %s for joint %s' % (label, node.name))
+        names += [node.name]
+        parents += [parent]
+        stack += [(child, len(names)-1) for child in reversed(node.children)]
+    
+    return names, np.array(parents, dtype=np.int64), np.array(index, dtype=np.int64).reshape(-1, 2)
+
+
+def joint_coords(points, index):
+    '''
+    (frames, joints, 3) joint trajectories from (frames, markers, 3) points and skeleton_index table
+    All joints and frames at once
+    '''
+    return (points[:, index[:,0], :] + points[:, index[:,1], :]) / 2
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Read obj files into arrays                   ##
+    ##################################################
+
+    Obj reader, independent from Maya, used by the objStreamNode plug-in.
+    The file is read at once and tokenized with numpy: lines are sorted by keyword,
+    then all vertex, uv and face values are parsed in one call per keyword.
+    Faces can have any number of vertices, and corners any obj form (v, v/vt, v//vn, v/vt/vn),
+    with absolute or negative (relative) indices.
+    Other keywords (vn, o, g, s, usemtl, comments..) are ignored.
+
+    write_obj writes an ObjMesh back (v, vt and f lines).
+
+    Usage:
+    from obj_parser import read_obj
+    mesh = read_obj('<your_obj_file>.obj')
+    mesh.positions, mesh.uvs, mesh.face_counts, mesh.vertex_ids, mesh.uv_ids
+    write_obj('<your_new_obj_file>.obj', mesh)
+'''
+
+
+## INIT
+import os
+import re
+import hashlib
+import numpy as np
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon", "Lionel Reveret"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+SPACE, TAB, CR, LF, SLASH = [ord(c) for c in ' \t\r\n/']
+
+
+## CLASSES
+class ObjMesh(object):
+    '''
+    Polygon mesh of an obj file, in the layout of MFnMesh.create.
+    positions: float32 array (vertices, 3)
+    uvs: float32 array (uvs, 2)
+    face_counts: int32 array (faces,) of number of vertices of each face
+    vertex_ids: int32 array (face vertices,) of 0-based vertex index of each face corner
+    uv_ids: int32 array (face vertices,) of 0-based uv index of each face corner,
+            None if some corners have no uv
+    '''
+    def __init__(self, positions, uvs, face_counts, vertex_ids, uv_ids=None):
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.uvs = np.asarray(uvs, dtype=np.float32).reshape(-1, 2)
+        self.face_counts = np.asarray(face_counts, dtype=np.int32)
+        self.vertex_ids = np.asarray(vertex_ids, dtype=np.int32)
+        self.uv_ids = None if uv_ids is None else np.asarray(uv_ids, dtype=np.int32)
+        self._keys = {}
+
+    def __repr__(self):
+        return 'ObjMesh(vertices=%d, faces=%d, uvs=%d)' % (self.nb_vertices, self.nb_faces, len(self.uvs))
+
+    @property
+    def nb_vertices(self):
+        return len(self.positions)
+
+    @property
+    def nb_faces(self):
+        return len(self.face_counts)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.positions, self.uvs, self.face_counts, self.vertex_ids, self.uv_ids) if a is not None)
+
+    def topology_key(self):
+        '''
+        Fingerprint of the connectivity: number of vertices and uvs, face counts, vertex and uv indices
+        Meshes with the same key only differ by their vertex positions and uv values
+        '''
+        key = self._keys.get('topology')
+        if key is None:
+            key = self._keys['topology'] = (self.nb_vertices, len(self.uvs), _digest(self.face_counts, self.vertex_ids, self.uv_ids))
+        return key
+
+    def uvs_key(self):
+        '''
+        Fingerprint of the uv values
+        '''
+        key = self._keys.get('uvs')
+        if key is None:
+            key = self._keys['uvs'] = _digest(self.uvs)
+        return key
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty((0, 3)), np.empty((0, 2)), np.empty(0), np.empty(0))
+
+
+## FUNCTIONS
+def _digest(*arrays):
+    '''
+    Hash of the content of arrays (None counts as empty)
+    '''
+    h = hashlib.sha1()
+    for a in arrays:
+        h.update(b'' if a is None else np.ascontiguousarray(a).data)
+        h.update(b'|')
+    return h.hexdigest()
+
+
+def _token_starts(chars):
+    '''
+    Positions of the first character of each whitespace-separated token
+    '''
+    blank = (chars == SPACE) | (chars == TAB) | (chars == CR) | (chars == LF)
+    starts = ~blank
+    starts[1:] &= blank[:-1]
+    return np.flatnonzero(starts)
+
+
+def _lines_text(data, line_starts, line_mask):
+    '''
+    Lines of data selected by line_mask (newlines included), as one byte string
+    Consecutive selected lines are sliced at once
+    '''
+    edges = np.diff(np.concatenate([[0], line_mask.view(np.int8), [0]]))
+    bounds = np.append(line_starts, len(data))
+    return b''.join([data[bounds[a]:bounds[b]] for a, b in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))])
+
+
+def _line_of(positions, text_chars):
+    '''
+    Line number of each character position of a text
+    '''
+    return np.searchsorted(np.flatnonzero(text_chars == LF), positions)
+
+
+def _parse_values(text, nb_lines, nb_values, dtype):
+    '''
+    (nb_lines, nb_values) array of the first nb_values numbers of each line of text
+    Missing values are 0
+    '''
+    chars = np.frombuffer(text, dtype=np.uint8)
+    counts = np.bincount(_line_of(_token_starts(chars), chars), minlength=nb_lines)[:nb_lines]
+    values = np.fromstring(text, dtype=dtype, sep=' ') if len(text) else np.empty(0, dtype)
+    if len(values) != counts.sum():
+        raise ValueError('Could not parse %d values, got %d' % (counts.sum(), len(values)))
+    if np.all(counts == nb_values):
+        return values.reshape(nb_lines, nb_values)
+    out = np.zeros((nb_lines, nb_values), dtype)
+    first = np.cumsum(counts) - counts
+    for c in range(nb_values):
+        out[counts > c, c] = values[first[counts > c] + c]
+    return out
+
+
+def _parse_faces(text, nb_faces):
+    '''
+    Face counts, and vertex and uv indices (1-based, negative if relative, 0 if missing) of each face corner
+    '''
+    text = text.replace(b'//', b'/0/') # v//vn
+    chars = np.frombuffer(text, dtype=np.uint8).copy()
+    starts = _token_starts(chars)
+    slashes = np.flatnonzero(chars == SLASH)
+    fields = np.bincount(np.searchsorted(starts, slashes, side='right') - 1, minlength=len(starts)) + 1 # numbers per corner
+    face_counts = np.bincount(_line_of(starts, chars), minlength=nb_faces)[:nb_faces]
+
+    chars[slashes] = SPACE
+    values = np.fromstring(chars.tobytes(), dtype=np.int64, sep=' ') if len(starts) else np.empty(0, np.int64)
+    if len(values) != fields.sum():
+        raise ValueError('Could not parse face indices')
+    if np.all(fields == fields[:1]): # same form for all corners
+        values = values.reshape(-1, max(len(fields) and fields[0], 1))
+        return face_counts, values[:, 0], values[:, 1] if values.shape[1] > 1 else np.zeros(len(values), np.int64)
+    first = np.cumsum(fields) - fields
+    uv_ids = np.zeros(len(first), np.int64)
+    uv_ids[fields > 1] = values[first[fields > 1] + 1]
+    return face_counts, values[first], uv_ids
+
+
+def _absolute(ids, nb_before):
+    '''
+    0-based indices from obj indices (1-based, or negative relative to the elements defined so far)
+    '''
+    if not len(ids) or ids.min() > 0:
+        return ids - 1
+    return np.where(ids > 0, ids - 1, ids + nb_before())
+
+
+def parse_obj(data):
+    '''
+    ObjMesh from the content (bytes) of an obj file
+    '''
+    if not data or data.isspace():
+        return ObjMesh.empty()
+
+    # Comments are blanked out
+    if b'#' in data:
+        data = re.sub(rb'#[^\n]*', b'', data)
+
+    # Line keywords from their first characters (indented lines are ignored)
+    chars = np.frombuffer(data + b'  ', dtype=np.uint8)
+    line_starts = np.concatenate([[0], np.flatnonzero(chars[:-3] == LF) + 1])
+    c0, c1, c2 = chars[line_starts], chars[line_starts + 1], chars[line_starts + 2]
+    blank1 = (c1 == SPACE) | (c1 == TAB)
+    blank2 = (c2 == SPACE) | (c2 == TAB)
+    is_v = (c0 == ord('v')) & blank1
+    is_vt = (c0 == ord('v')) & (c1 == ord('t')) & blank2
+    is_f = (c0 == ord('f')) & blank1
+
+    # Keywords are skipped (replaced by spaces), so that each line only holds its numbers
+    texts = []
+    for mask, keyword in ((is_v, b'v'), (is_vt, b'vt'), (is_f, b'f')):
+        text = _lines_text(data, line_starts, mask)
+        texts.append(text.replace(b'\n' + keyword, b'\n' + b' '*len(keyword))[len(keyword):] if text else text)
+
+    positions = _parse_values(texts[0], int(is_v.sum()), 3, np.float32)
+    uvs = _parse_values(texts[1], int(is_vt.sum()), 2, np.float32)
+    face_counts, vertex_ids, uv_ids = _parse_faces(texts[2], int(is_f.sum()))
+
+    # Relative indices count the elements defined before the face line
+    face_lines = lambda: np.repeat(np.flatnonzero(is_f), face_counts)
+    vertex_ids = _absolute(vertex_ids, lambda: np.cumsum(is_v)[face_lines()])
+    if len(uvs) and len(uv_ids) and np.all(uv_ids != 0):
+        uv_ids = _absolute(uv_ids, lambda: np.cumsum(is_vt)[face_lines()])
+    else:
+        uv_ids = None
+    return ObjMesh(positions, uvs, face_counts, vertex_ids, uv_ids)
+
+
+def read_obj(obj_path):
+    '''
+    Read an obj file at once
+    Returns an ObjMesh (empty if the file does not exist)
+    '''
+    if not os.path.isfile(obj_path):
+        return ObjMesh.empty()
+    with open(obj_path, 'rb') as obj_file:
+        return parse_obj(obj_file.read())
+
+
+def _write_rows(obj_o, row_fmt, values, chunk_size=10000):
+    '''
+    Write values (rows, n) with one format operation per chunk of rows
+    '''
+    for c in range(0, len(values), chunk_size):
+        chunk = values[c:c+chunk_size]
+        obj_o.write((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def write_obj(obj_path, mesh, precision=6):
+    '''
+    Write an ObjMesh to an obj file
+    Faces with the same number of vertices are formatted by chunks
+    '''
+    corners = mesh.vertex_ids.astype(np.int64) + 1
+    if mesh.uv_ids is not None:
+        corners = np.column_stack([corners, mesh.uv_ids.astype(np.int64) + 1])
+    corner_fmt = '%d/%d' if mesh.uv_ids is not None else '%d'
+    corners = corners.reshape(len(mesh.vertex_ids), -1)
+
+    with open(obj_path, 'w') as obj_o:
+        _write_rows(obj_o, ' '.join(['v'] + ['%.{}f'.format(precision)]*3) + '\n', mesh.positions)
+        _write_rows(obj_o, ' '.join(['vt'] + ['%.{}f'.format(precision)]*2) + '\n', mesh.uvs)
+        counts = mesh.face_counts
+        if len(counts) and np.all(counts == counts[0]):
+            _write_rows(obj_o, ' '.join(['f'] + [corner_fmt]*int(counts[0])) + '\n', corners.reshape(len(counts), -1))
+        else:
+            first = np.cumsum(counts) - counts
+            for f, n in zip(first.tolist(), counts.tolist()):
+                _write_rows(obj_o, ' '.join(['f'] + [corner_fmt]*n) + '\n', corners[f:f+n].reshape(1, -1))
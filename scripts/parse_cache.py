@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## On-disk cache of parsed mocap files          ##
+    ##################################################
+
+    Stores the arrays parsed from trc, c3d and bvh files as .npy files,
+    so that re-importing the same take does not parse it again.
+    Independent from Maya.
+
+    Entries are keyed by (file path, size, modification time, parser name, parser version, parser options).
+    Cache hits return read-only memory-mapped arrays (no copy).
+    The cache is size-capped, least recently used entries are evicted first.
+
+    Cache folder: MAYA_MOCAP_CACHE_DIR environment variable (default ~/.maya_mocap_cache)
+    Size cap in MB: MAYA_MOCAP_CACHE_SIZE environment variable (default 2048, 0 disables the cache)
+
+    Usage:
+    python parse_cache.py --stats
+    python parse_cache.py --clear
+'''
+
+
+## INIT
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import argparse
+import numpy as np
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+META_FILE = 'meta.json'
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+## FUNCTIONS
+def cache_dir():
+    '''
+    Cache folder
+    '''
+    return os.environ.get('MAYA_MOCAP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.maya_mocap_cache'))
+
+
+def cache_size_cap():
+    '''
+    Cache size cap in bytes
+    '''
+    return int(float(os.environ.get('MAYA_MOCAP_CACHE_SIZE', 2048)) * 1e6)
+
+
+def cache_key(path, parser, version, options=None):
+    '''
+    Hash of (path, size, mtime, parser, version, options)
+    '''
+    st = os.stat(path)
+    key = [os.path.abspath(path), st.st_size, st.st_mtime, parser, version, sorted((options or {}).items())]
+    return hashlib.sha1(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+
+
+def _entry_size(entry_dir):
+    return sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+
+
+def _entries():
+    '''
+    (last access time, size, folder) of each cache entry
+    '''
+    root = cache_dir()
+    if not os.path.isdir(root):
+        return []
+    entries = []
+    for name in os.listdir(root):
+        entry_dir = os.path.join(root, name)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        if os.path.isfile(meta_path):
+            entries += [(os.path.getmtime(meta_path), _entry_size(entry_dir), entry_dir)]
+    return entries
+
+
+def load_entry(key):
+    '''
+    Arrays (memory-mapped) and metadata of a cache entry, or None if not cached
+    '''
+    entry_dir = os.path.join(cache_dir(), key)
+    meta_path = os.path.join(entry_dir, META_FILE)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        arrays = dict((name, np.load(os.path.join(entry_dir, name+'.npy'), mmap_mode='r')) for name in meta['arrays'])
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    os.utime(meta_path, None) # last access for LRU eviction
+    return arrays, meta['meta']
+
+
+def save_entry(key, arrays, meta):
+    '''
+    Write arrays as .npy files and metadata as json, then evict old entries if the cache is too large
+    '''
+    root = cache_dir()
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    entry_dir = os.path.join(root, key)
+    tmp_dir = tempfile.mkdtemp(dir=root, prefix='.tmp_')
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, name+'.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump({'arrays': list(arrays.keys()), 'meta': meta}, f)
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+    except (IOError, OSError):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    evict()
+
+
+def evict(size_cap=None):
+    '''
+    Remove least recently used entries until the cache fits in size_cap bytes
+    '''
+    size_cap = cache_size_cap() if size_cap is None else size_cap
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_dir in entries:
+        if total <= size_cap:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        stats['evictions'] += 1
+
+
+def cached(path, parser, version, parse_func, options=None):
+    '''
+    Return parse_func() from cache, or run it and store its result
+    parse_func returns (dict of numpy arrays, json serializable metadata)
+    options are the parser arguments which change its result
+    '''
+    if cache_size_cap() <= 0:
+        return parse_func()
+    key = cache_key(path, parser, version, options)
+    entry = load_entry(key)
+    if entry is not None:
+        stats['hits'] += 1
+        return entry
+    stats['misses'] += 1
+    arrays, meta = parse_func()
+    save_entry(key, arrays, meta)
+    return arrays, meta
+
+
+def cache_info():
+    '''
+    Hit/miss statistics of this session, and number of entries and size on disk
+    '''
+    entries = _entries()
+    info = dict(stats)
+    info['entries'] = len(entries)
+    info['size_MB'] = sum(size for _, size, _ in entries) / 1e6
+    info['size_cap_MB'] = cache_size_cap() / 1e6
+    info['folder'] = cache_dir()
+    return info
+
+
+def clear_cache():
+    '''
+    Remove all cache entries and reset statistics
+    '''
+    root = cache_dir()
+    if os.path.isdir(root):
+        shutil.rmtree(root, ignore_errors=True)
+    for k in stats:
+        stats[k] = 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clear', action='store_true', help='remove all cached files')
+    parser.add_argument('--stats', action='store_true', help='print cache statistics')
+    args = vars(parser.parse_args())
+
+    if args['clear']:
+        clear_cache()
+        print('Cache cleared: ' + cache_dir())
+    if args['stats'] or not args['clear']:
+        for k, v in sorted(cache_info().items()):
+            print('%s: %s' % (k, v))
@@ -1,5 +1,4 @@
-from maya_utils import *
-from anytree import Node, RenderTree
+from anytree import Node
 
 
 # CUSTOM SKELETON
@@ -138,5 +137,5 @@ root_mpi = Node("CHipJ", id=14, children=[
     ]),
 ])
 
-# BODY_135
-root_body_135 = Node("")
\ No newline at end of file
+# BODY_135 (placeholder: define it from the body_135 marker list before offering it in the trc and c3d windows)
+root_body_135 = Node("")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Catalog of trc, c3d and bvh trials           ##
+    ##################################################
+
+    Builds a SQLite index of the trials of a directory tree, reading only file headers:
+    - trc: the 5 header lines (DataRate, NumFrames, Units, marker labels)
+    - c3d: c3d.Reader header and point labels
+    - bvh: HIERARCHY joint names, Frames and Frame Time lines
+    Each entry records frames, rate, units, marker or joint names and a file fingerprint.
+    Re-runs are incremental: only new or modified files are scanned again.
+    Catalogs are stored per user (MAYA_MOCAP_CATALOG_DIR, default ~/.maya_mocap_catalogs), one per indexed folder,
+    so that read-only archives can be indexed too.
+    Independent from Maya.
+
+    Usage:
+    python trial_catalog.py <folder>
+    python trial_catalog.py <folder> --list
+    python trial_catalog.py <folder> --list --kind trc --marker RHip --min_frames 1000
+'''
+
+
+## INIT
+import os
+import io
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from motion_clip import read_trc_header
+from bvh_parser import read_bvh_hierarchy, TIP_SUFFIX
+
+
+## AUTHORSHIP INFORMATION
+__author__ = "David Pagnon"
+__copyright__ = "Copyright 2021, Maya-Mocap"
+__credits__ = ["David Pagnon"]
+__license__ = "BSD 3-Clause License"
+__version__ = "0.1"
+__maintainer__ = "David Pagnon"
+__email__ = "contact@david-pagnon.com"
+__status__ = "Development"
+
+
+## CONSTANTS
+CATALOG_EXT = '.sqlite'
+EXTENSIONS = {'.trc': 'trc', '.c3d': 'c3d', '.bvh': 'bvh'}
+SCHEMA = '''CREATE TABLE IF NOT EXISTS trials (
+    path TEXT PRIMARY KEY, kind TEXT, name TEXT, size INTEGER, mtime REAL, fingerprint TEXT,
+    frames INTEGER, rate REAL, units TEXT, labels TEXT, nb_labels INTEGER, scanned REAL, error TEXT)'''
+COLUMNS = ['path', 'kind', 'name', 'size', 'mtime', 'fingerprint', 'frames', 'rate', 'units', 'labels', 'nb_labels', 'scanned', 'error']
+
+
+## FUNCTIONS
+def fingerprint(path, block=65536):
+    '''
+    Quick file fingerprint: hash of size and first block
+    '''
+    h = hashlib.sha1(str(os.path.getsize(path)).encode('utf-8'))
+    with open(path, 'rb') as f:
+        h.update(f.read(block))
+    return h.hexdigest()
+
+
+def scan_trc(path):
+    '''
+    Frames, rate, units and marker labels from trc header
+    '''
+    with io.open(path, 'rb') as trc_file:
+        header, labels = read_trc_header(trc_file)
+    return header.get('NumFrames'), header.get('DataRate'), header.get('Units'), labels
+
+
+def scan_c3d(path):
+    '''
+    Frames, rate, units and point labels from c3d header (frames are not read)
+    '''
+    import c3d
+    with open(path, 'rb') as c3d_file:
+        reader = c3d.Reader(c3d_file)
+        try:
+            units = reader.get('POINT:UNITS').string_value.strip()
+        except (AttributeError, KeyError, TypeError):
+            units = None
+        labels = [l.strip() for l in reader.point_labels]
+        return int(reader.last_frame - reader.first_frame + 1), float(reader.point_rate), units, labels
+
+
+def scan_bvh(path):
+    '''
+    Frames, rate and joint names from bvh HIERARCHY and Frames lines (motion is not read)
+    '''
+    with io.open(path, 'r', encoding='ISO-8859-1') as bvh_file:
+        names, _, _, channels, frames, frame_time = read_bvh_hierarchy(bvh_file)
+    joints = [n for n, c in zip(names, channels) if not (n.endswith(TIP_SUFFIX) and not c)]
+    return frames, 1. / frame_time if frame_time > 0 else None, None, joints
+
+
+SCANNERS = {'trc': scan_trc, 'c3d': scan_c3d, 'bvh': scan_bvh}
+
+
+def catalog_dir():
+    '''
+    Catalogs folder
+    '''
+    return os.environ.get('MAYA_MOCAP_CATALOG_DIR', os.path.join(os.path.expanduser('~'), '.maya_mocap_catalogs'))
+
+
+def catalog_path(folder):
+    '''
+    Default catalog of a folder, in the catalogs folder, named after the folder and the hash of its resolved path
+    '''
+    real_folder = os.path.realpath(folder)
+    key = hashlib.sha1(real_folder.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(catalog_dir(), '%s_%s%s' % (os.path.basename(real_folder.rstrip(os.sep)) or 'root', key, CATALOG_EXT))
+
+
+def connect(db_path):
+    '''
+    Open (or create) catalog database
+    '''
+    folder = os.path.dirname(os.path.abspath(db_path))
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    db = sqlite3.connect(db_path)
+    db.execute(SCHEMA)
+    return db
+
+
+def update_catalog(folder, db_path=None, verbose=False):
+    '''
+    Scan trc, c3d and bvh headers of folder (recursively) into the catalog
+    Only files whose size or modification time changed are scanned again, removed files are dropped
+    db_path: catalog file (default: catalog_path(folder), outside of the folder)
+    Returns db path, number of scanned files and number of unchanged files
+    '''
+    db_path = db_path or catalog_path(folder)
+    db = connect(db_path)
+    known = dict((row[0], (row[1], row[2])) for row in db.execute('SELECT path, size, mtime FROM trials'))
+
+    seen, scanned, unchanged = set(), 0, 0
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in sorted(filenames):
+            kind = EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+            if kind is None:
+                continue
+            path = os.path.abspath(os.path.join(dirpath, filename))
+            seen.add(path)
+            st = os.stat(path)
+            if known.get(path) == (st.st_size, st.st_mtime):
+                unchanged += 1
+                continue
+
+            frames = rate = units = None
+            labels, error = [], None
+            try:
+                frames, rate, units, labels = SCANNERS[kind](path)
+            except Exception as e:
+                error = '%s: %s' % (type(e).__name__, e)
+            row = [path, kind, os.path.splitext(filename)[0], st.st_size, st.st_mtime, fingerprint(path),
+                   frames, rate, units, json.dumps(labels), len(labels), time.time(), error]
+            db.execute('INSERT OR REPLACE INTO trials VALUES (%s)' % ','.join('?'*len(COLUMNS)), row)
+            scanned += 1
+            if verbose:
+                print('%s: %s' % (path, error or '%s frames, %s Hz, %d labels' % (frames, rate, len(labels))))
+
+    removed = [p for p in known if p not in seen]
+    db.executemany('DELETE FROM trials WHERE path = ?', [(p,) for p in removed])
+    db.commit()
+    db.close()
+    return db_path, scanned, unchanged
+
+
+def _like(text):
+    '''
+    LIKE pattern matching text literally (with ESCAPE '\\')
+    '''
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def query_trials(db_path, kind=None, name=None, marker=None, min_frames=None):
+    '''
+    Trials of the catalog, as a list of dicts (labels as lists)
+    Filters: kind ('trc', 'c3d', 'bvh'), name substring, marker or joint name, minimum number of frames
+    '''
+    where, params = ['error IS NULL'], []
+    if kind:
+        where += ['kind = ?']
+        params += [kind]
+    if name:
+        where += ["name LIKE ? ESCAPE '\\'"]
+        params += ['%'+_like(name)+'%']
+    if marker:
+        where += ["labels LIKE ? ESCAPE '\\'"]
+        params += ['%'+_like(json.dumps(marker))+'%']
+    if min_frames:
+        where += ['frames >= ?']
+        params += [min_frames]
+    db = connect(db_path)
+    rows = db.execute('SELECT %s FROM trials WHERE %s ORDER BY path' % (','.join(COLUMNS), ' AND '.join(where)), params).fetchall()
+    db.close()
+    trials = [dict(zip(COLUMNS, row)) for row in rows]
+    for t in trials:
+        t['labels'] = json.loads(t['labels'])
+    return trials
+
+
+def describe(trial):
+    '''
+    One line description of a trial
+    '''
+    rate = '%g Hz' % trial['rate'] if trial['rate'] else '? Hz'
+    return '%s | %s frames | %s | %d %s' % (trial['name'], trial['frames'], rate, trial['nb_labels'], 'joints' if trial['kind'] == 'bvh' else 'markers')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', help='folder to index (recursively)')
+    parser.add_argument('--db', required=False, help='catalog file (default: in %s, named after the folder)' % catalog_dir())
+    parser.add_argument('--list', action='store_true', help='list indexed trials')
+    parser.add_argument('--kind', choices=['trc', 'c3d', 'bvh'], help='only list this file type')
+    parser.add_argument('--name', help='only list trials whose name contains this')
+    parser.add_argument('--marker', help='only list trials with this marker or joint')
+    parser.add_argument('--min_frames', type=int, help='only list trials with at least this many frames')
+    args = vars(parser.parse_args())
+
+    db_path, scanned, unchanged = update_catalog(args['folder'], args['db'])
+    print('%s: %d files scanned, %d unchanged' % (db_path, scanned, unchanged))
+    if args['list']:
+        for trial in query_trials(db_path, args['kind'], args['name'], args['marker'], args['min_frames']):
+            print('[%s] %s' % (trial['kind'], describe(trial)))
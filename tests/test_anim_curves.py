@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+'''
+    ##################################################
+    ## Tests of anim curve key building             ##
+    ##################################################
+
+    Key building of anim_curves.py, without Maya.
+
+    Usage:
+    python -m pytest tests
+'''
+
+
+## INIT
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from anim_curves import channel_keys, build_channels
+
+
+## FUNCTIONS
+def test_channel_keys_drops_nan():
+    times, values = channel_keys([1, 2, 3, 4], [0.5, np.nan, 1.5, np.nan])
+    assert times.tolist() == [1., 3.]
+    assert values.tolist() == [0.5, 1.5]
+    assert times.dtype == values.dtype == np.float64
+
+
+def test_channel_keys_keeps_complete_channels():
+    times, values = channel_keys(np.arange(5), np.linspace(0, 1, 5))
+    assert times.tolist() == [0., 1., 2., 3., 4.]
+    assert np.allclose(values, np.linspace(0, 1, 5))
+    assert times.flags['C_CONTIGUOUS'] and values.flags['C_CONTIGUOUS']
+
+
+def test_channel_keys_all_nan():
+    times, values = channel_keys([1, 2], [np.nan, np.nan])
+    assert len(times) == len(values) == 0
+
+
+def test_channel_keys_rejects_mismatched_shapes():
+    with pytest.raises(ValueError):
+        channel_keys([1, 2, 3], [0., 1.])
+
+
+def test_build_channels_keeps_order():
+    channels = [('b.translateX', [1, 2], [0., 1.]),
+                ('a.translateY', [1, 2], [np.nan, 2.]),
+                ('c.rotateZ', [5], [3.])]
+    built = build_channels(channels)
+    assert [node_attr for node_attr, _, _ in built] == ['b.translateX', 'a.translateY', 'c.rotateZ']
+    assert built[1][1].tolist() == [2.] and built[1][2].tolist() == [2.]
+    assert built[2][1].tolist() == [5.] and built[2][2].tolist() == [3.]
+
+
+def test_build_channels_rejects_mismatched_shapes():
+    with pytest.raises(ValueError):
+        build_channels([('a.translateX', [1, 2], [0.])])